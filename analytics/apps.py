@@ -7,5 +7,4 @@ class AnalyticsConfig(AppConfig):
     verbose_name = 'Analytics e IA'
     
     def ready(self):
-        # Importar signals si los creamos
-        pass
+        import analytics.signals
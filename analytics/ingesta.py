@@ -0,0 +1,275 @@
+"""
+Ingesta en buffer de eventos de comportamiento.
+
+Los beacons de tracking no escriben en la base en el request: el evento se
+encola en un buffer en memoria del proceso y un hilo de fondo lo vuelca con
+`bulk_create` cada `ANALYTICS_BUFFER_EVENTOS` eventos o cada
+`ANALYTICS_BUFFER_MS` milisegundos, lo que ocurra primero.
+
+En el mismo volcado se suman los contadores por usuario de
+`CarritoInteligente` (vistas, carritos, compras, comparaciones) y se
+recalcula el score de intención a partir de ellos, sin contar filas de
+`UsuarioComportamiento`. Cada volcado hace una cantidad fija de consultas
+sin importar cuántos eventos tenga.
+
+Los eventos de productos o usuarios que ya no existen se descartan al
+volcar. Un volcado que falla se reintenta con espera creciente y, después
+de `MAX_REINTENTOS_VOLCADO` intentos, se descarta para no frenar al resto.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+
+from tienda.models import Producto
+from .models import UsuarioComportamiento, CarritoInteligente
+
+logger = logging.getLogger(__name__)
+
+EVENTOS_POR_VOLCADO = getattr(settings, 'ANALYTICS_BUFFER_EVENTOS', 200)
+INTERVALO_VOLCADO_MS = getattr(settings, 'ANALYTICS_BUFFER_MS', 1000)
+MAX_CONTADORES_EN_MEMORIA = 10000
+# Tope de eventos retenidos si la base falla: se descartan los más viejos
+MAX_EVENTOS_EN_MEMORIA = 20000
+# Intentos de un volcado fallido antes de descartarlo (la espera se duplica)
+MAX_REINTENTOS_VOLCADO = 5
+
+ACCIONES_VALIDAS = {accion for accion, _ in UsuarioComportamiento._meta.get_field('accion').choices}
+# Acción -> contador de `CarritoInteligente` ('search' no suma al score)
+CONTADORES = {
+    'view': 'vistas',
+    'cart': 'carritos',
+    'buy': 'compras',
+    'compare': 'comparaciones',
+}
+CAMPOS_CONTADORES = list(CONTADORES.values())
+
+
+class BufferEventos:
+    """Buffer de eventos por proceso con volcado en segundo plano"""
+
+    def __init__(self, max_eventos=EVENTOS_POR_VOLCADO, intervalo_ms=INTERVALO_VOLCADO_MS):
+        self.max_eventos = max_eventos
+        self.intervalo = intervalo_ms / 1000
+        self._eventos = []
+        self._primer_evento = None
+        self._reintentos = 0
+        # user_id -> {campo: valor} ya guardado en la base más lo pendiente
+        self._contadores = {}
+        self._condicion = threading.Condition()
+        self._volcando = threading.Lock()
+        self._hilo = None
+
+    # -- Productor ---------------------------------------------------------
+
+    def registrar(self, user_id, producto_id, accion, tiempo=0):
+        """
+        Encola un evento y devuelve el score de intención estimado del usuario.
+        Solo consulta la base la primera vez que ve a un usuario.
+        """
+        if accion not in ACCIONES_VALIDAS:
+            raise ValueError(f'Acción inválida: {accion}')
+        producto_id = int(producto_id)
+        tiempo = max(int(tiempo or 0), 0)
+
+        contadores = self._contadores.get(user_id)
+        if contadores is None:
+            contadores = self._contadores_guardados(user_id)
+
+        with self._condicion:
+            contadores = self._contadores.setdefault(user_id, contadores)
+            campo = CONTADORES.get(accion)
+            if campo:
+                contadores[campo] += 1
+            self._eventos.append((user_id, producto_id, accion, tiempo))
+            if self._primer_evento is None:
+                self._primer_evento = time.monotonic()
+            if len(self._eventos) >= self.max_eventos:
+                self._condicion.notify()
+            score = CarritoInteligente.score_por_eventos(**contadores)
+
+        self._asegurar_hilo()
+        return score
+
+    def _contadores_guardados(self, user_id):
+        guardados = CarritoInteligente.objects.filter(user_id=user_id).values(*CAMPOS_CONTADORES).first()
+        return guardados or dict.fromkeys(CAMPOS_CONTADORES, 0)
+
+    # -- Consumidor --------------------------------------------------------
+
+    def _asegurar_hilo(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._condicion:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._loop, name='analytics-ingesta', daemon=True)
+                self._hilo.start()
+
+    def _loop(self):
+        while True:
+            with self._condicion:
+                while not self._listo_para_volcar():
+                    espera = self.intervalo
+                    if self._primer_evento is not None:
+                        espera = max(self._primer_evento + self.intervalo - time.monotonic(), 0.001)
+                    self._condicion.wait(espera)
+            self.flush()
+
+    def _listo_para_volcar(self):
+        if not self._eventos:
+            return False
+        vencido = time.monotonic() - self._primer_evento >= self.intervalo
+        # Después de un fallo se respeta la espera aunque el buffer se llene
+        if self._reintentos:
+            return vencido
+        return len(self._eventos) >= self.max_eventos or vencido
+
+    def flush(self):
+        """Vuelca los eventos pendientes. Devuelve cuántos se guardaron."""
+        with self._volcando:
+            with self._condicion:
+                eventos, self._eventos = self._eventos, []
+                self._primer_evento = None
+            if not eventos:
+                return 0
+
+            close_old_connections()
+            try:
+                guardados, contadores, descartados = self._guardar(eventos)
+            except Exception:
+                self._reintentos += 1
+                if self._reintentos >= MAX_REINTENTOS_VOLCADO:
+                    logger.exception(
+                        f'Se descartan {len(eventos)} eventos de comportamiento '
+                        f'tras {self._reintentos} intentos fallidos'
+                    )
+                    self._reintentos = 0
+                    with self._condicion:
+                        self._olvidar_contadores(eventos)
+                    return 0
+                logger.exception(f'No se pudieron guardar {len(eventos)} eventos de comportamiento; se reintentan')
+                self._reencolar(eventos)
+                return 0
+
+            self._reintentos = 0
+            self._sincronizar_contadores(contadores, descartados)
+            return guardados
+
+    def _reencolar(self, eventos):
+        """Devuelve al buffer los eventos de un volcado fallido, con tope"""
+        with self._condicion:
+            self._eventos = eventos + self._eventos
+            descartados = self._eventos[:-MAX_EVENTOS_EN_MEMORIA]
+            if descartados:
+                self._eventos = self._eventos[-MAX_EVENTOS_EN_MEMORIA:]
+                logger.error(f'Buffer de eventos lleno: se descartan {len(descartados)} eventos')
+                self._olvidar_contadores(descartados)
+            # El próximo intento espera un intervalo, el doble en cada fallo seguido
+            self._primer_evento = time.monotonic() + self.intervalo * (2 ** (self._reintentos - 1) - 1)
+
+    def _olvidar_contadores(self, eventos):
+        """Contadores en memoria que ya no coinciden con la base: se releen al volver a verlos"""
+        for user_id, *_ in eventos:
+            self._contadores.pop(user_id, None)
+
+    def _guardar(self, eventos):
+        """
+        Guarda los eventos y suma los contadores. Devuelve cuántos se
+        guardaron, los contadores finales y los usuarios con eventos descartados.
+        """
+        # Un producto o usuario borrado haría fallar todo el bulk_create (en
+        # PostgreSQL la FK se verifica al commit) y el lote se reintentaría siempre
+        productos = set(
+            Producto.objects.filter(id__in={e[1] for e in eventos}).values_list('id', flat=True)
+        )
+        usuarios = set(
+            get_user_model().objects.filter(id__in={e[0] for e in eventos}).values_list('id', flat=True)
+        )
+        validos = [e for e in eventos if e[0] in usuarios and e[1] in productos]
+        descartados = {e[0] for e in eventos if e[0] not in usuarios or e[1] not in productos}
+        eventos = validos
+
+        deltas = defaultdict(Counter)
+        for user_id, _, accion, _ in eventos:
+            campo = CONTADORES.get(accion)
+            if campo:
+                deltas[user_id][campo] += 1
+
+        with transaction.atomic():
+            UsuarioComportamiento.objects.bulk_create(
+                [
+                    UsuarioComportamiento(user_id=u, producto_id=p, accion=a, tiempo_en_pagina=t)
+                    for u, p, a, t in eventos
+                ],
+                batch_size=1000,
+            )
+            contadores = self._sumar_contadores(deltas)
+        return len(eventos), contadores, descartados
+
+    def _sumar_contadores(self, deltas):
+        """Suma los deltas a `CarritoInteligente` y devuelve los valores finales"""
+        if not deltas:
+            return {}
+        # Se crean vacías las filas que faltan; si otro proceso la crea en
+        # paralelo, la restricción única la deja pasar una sola vez
+        existentes = set(
+            CarritoInteligente.objects.filter(user_id__in=deltas.keys()).values_list('user_id', flat=True)
+        )
+        CarritoInteligente.objects.bulk_create(
+            [CarritoInteligente(user_id=user_id) for user_id in deltas.keys() - existentes],
+            ignore_conflicts=True,
+        )
+
+        carritos = {
+            carrito.user_id: carrito
+            for carrito in CarritoInteligente.objects.select_for_update().filter(user_id__in=deltas.keys())
+        }
+        for user_id, delta in deltas.items():
+            carrito = carritos[user_id]
+            for campo, cantidad in delta.items():
+                setattr(carrito, campo, getattr(carrito, campo) + cantidad)
+            carrito.score_intencion_compra = CarritoInteligente.score_por_eventos(
+                **{campo: getattr(carrito, campo) for campo in CAMPOS_CONTADORES}
+            )
+
+        CarritoInteligente.objects.bulk_update(
+            carritos.values(), CAMPOS_CONTADORES + ['score_intencion_compra'], batch_size=500
+        )
+        return {
+            user_id: {campo: getattr(carritos[user_id], campo) for campo in CAMPOS_CONTADORES}
+            for user_id in deltas
+        }
+
+    def _sincronizar_contadores(self, contadores, descartados=()):
+        """
+        Alinea los contadores en memoria con la base (más lo aún pendiente).
+        Los de usuarios con eventos descartados y sin nada guardado se olvidan.
+        """
+        with self._condicion:
+            for user_id in set(descartados) - contadores.keys():
+                self._contadores.pop(user_id, None)
+            pendientes = defaultdict(Counter)
+            for user_id, _, accion, _ in self._eventos:
+                campo = CONTADORES.get(accion)
+                if campo:
+                    pendientes[user_id][campo] += 1
+            for user_id, guardados in contadores.items():
+                self._contadores[user_id] = {
+                    campo: valor + pendientes[user_id][campo] for campo, valor in guardados.items()
+                }
+            if len(self._contadores) > MAX_CONTADORES_EN_MEMORIA:
+                self._contadores = {u: c for u, c in self._contadores.items() if u in pendientes}
+
+
+buffer_eventos = BufferEventos()
+atexit.register(buffer_eventos.flush)
+
+
+def registrar_evento(user, producto_id, accion, tiempo=0):
+    """Encola un evento de comportamiento. Devuelve el score de intención estimado."""
+    return buffer_eventos.registrar(user.pk, producto_id, accion, tiempo)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from analytics.models import ComparacionPrecios
+
+
+class Command(BaseCommand):
+    help = 'Recalcula en lote las comparaciones de precios de todos los productos activos'
+
+    def handle(self, *args, **options):
+        self.stdout.write('💲 Recalculando comparaciones de precios...')
+
+        actualizadas = ComparacionPrecios.actualizar_en_lote()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ {actualizadas} comparaciones actualizadas')
+        )
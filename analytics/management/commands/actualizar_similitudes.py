@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from analytics.similitud import K_MAX, actualizar_similitudes
+
+
+class Command(BaseCommand):
+    help = 'Actualiza la matriz de similitud item-item con los eventos nuevos de comportamiento'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo',
+            action='store_true',
+            help='Reconstruir la matriz desde cero en lugar de procesar solo los eventos nuevos',
+        )
+        parser.add_argument(
+            '--k',
+            type=int,
+            default=K_MAX,
+            help=f'Cantidad de similares guardados por producto (default: {K_MAX})',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('🧮 Actualizando similitudes entre productos...')
+
+        recalculados = actualizar_similitudes(completo=options['completo'], k=options['k'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ {recalculados} productos recalculados')
+        )
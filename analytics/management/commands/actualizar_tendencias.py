@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from analytics.tendencias import actualizar_tendencias
+
+
+class Command(BaseCommand):
+    help = 'Agrega los eventos nuevos en buckets horarios y actualiza la ventana de tendencias (correr cada hora)'
+
+    def handle(self, *args, **options):
+        self.stdout.write('📈 Actualizando tendencias...')
+
+        ranking = actualizar_tendencias()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ {len(ranking)} productos en tendencia')
+        )
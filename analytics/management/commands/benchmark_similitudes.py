@@ -0,0 +1,94 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from analytics.models import SimilitudProducto
+from analytics.similitud import (
+    PESOS_ACCION, K_MAX, construir_matriz, coocurrencias, similar_products, top_k_similares,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la construcción de la matriz item-item sobre eventos sintéticos y '
+        'la lectura real de similar_products() contra la base'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--filas',
+            type=int,
+            nargs='+',
+            default=[10_000, 100_000, 1_000_000],
+            help='Cantidades de eventos a simular',
+        )
+        parser.add_argument('--usuarios', type=int, default=20_000)
+        parser.add_argument('--productos', type=int, default=2_000)
+        parser.add_argument('--k', type=int, default=K_MAX)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--consultas',
+            type=int,
+            default=1000,
+            help='Llamadas a similar_products() sobre productos con similitudes guardadas (0 para omitir)',
+        )
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        n_usuarios, n_productos, k = options['usuarios'], options['productos'], options['k']
+
+        # Popularidad tipo Zipf: pocos productos concentran la mayoría de eventos
+        popularidad = 1.0 / np.arange(1, n_productos + 1)
+        popularidad /= popularidad.sum()
+        pesos_accion = np.array(list(PESOS_ACCION.values()))
+
+        self.stdout.write(f'{"eventos":>10} {"matriz":>9} {"XᵀX":>9} {"top-k":>9}')
+        for filas in options['filas']:
+            usuarios = rng.integers(0, n_usuarios, filas)
+            productos = rng.choice(n_productos, filas, p=popularidad)
+            pesos = rng.choice(pesos_accion, filas)
+
+            t0 = time.perf_counter()
+            X = construir_matriz(usuarios, productos, pesos, shape=(n_usuarios, n_productos))
+            t1 = time.perf_counter()
+            C = coocurrencias(X)
+            t2 = time.perf_counter()
+            top_k = top_k_similares(C, range(n_productos), k)
+            t3 = time.perf_counter()
+
+            self.stdout.write(f'{filas:>10,} {t1 - t0:>8.3f}s {t2 - t1:>8.3f}s {t3 - t2:>8.3f}s')
+
+        if options['consultas']:
+            self._medir_lectura(rng, options['consultas'])
+
+    def _medir_lectura(self, rng, cantidad):
+        """Lo que paga un request: la consulta de similar_products() a la base"""
+        productos = list(
+            SimilitudProducto.objects.order_by().values_list('producto_id', flat=True).distinct()
+        )
+        if not productos:
+            self.stdout.write(self.style.WARNING(
+                '⚠️ No hay similitudes guardadas: correr actualizar_similitudes para medir la lectura'
+            ))
+            return
+
+        consultas = rng.choice(productos, cantidad)
+        # Primera llamada aparte: calienta la conexión y cuenta las consultas
+        with CaptureQueriesContext(connection) as queries:
+            similar_products(int(consultas[0]))
+        latencias = []
+        for producto in consultas:
+            inicio = time.perf_counter()
+            similar_products(int(producto))
+            latencias.append(time.perf_counter() - inicio)
+        latencias = np.array(latencias) * 1000
+
+        self.stdout.write(
+            f'similar_products() sobre {len(productos)} productos ({connection.vendor}): '
+            f'p50 {np.percentile(latencias, 50):.2f}ms  p95 {np.percentile(latencias, 95):.2f}ms  '
+            f'p99 {np.percentile(latencias, 99):.2f}ms  '
+            f'{len(queries.captured_queries)} consulta(s) por llamada'
+        )
@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from analytics.recomendaciones import TOP_N, precalcular_recomendaciones
+
+
+class Command(BaseCommand):
+    help = (
+        'Precalcula el top-N de recomendaciones de los usuarios con actividad '
+        'cuyo top-N falta o venció'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=TOP_N,
+            help=f'Cantidad de recomendaciones por usuario (default: {TOP_N})',
+        )
+        parser.add_argument(
+            '--usuario',
+            action='append',
+            dest='usuarios',
+            help='Username a procesar (se puede repetir). Por defecto, los que tienen el top-N vencido',
+        )
+        parser.add_argument(
+            '--todos',
+            action='store_true',
+            help='Recalcula todos los usuarios con actividad, aunque su top-N esté vigente',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('🤖 Precalculando recomendaciones...')
+
+        usuarios = None
+        if options['usuarios']:
+            usuarios = get_user_model().objects.filter(username__in=options['usuarios'])
+        elif options['todos']:
+            usuarios = get_user_model().objects.filter(comportamientos__isnull=False).distinct()
+
+        procesados = precalcular_recomendaciones(usuarios, limit=options['top'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Recomendaciones actualizadas para {procesados} usuarios')
+        )
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('tienda', '0012_producto_tienda_prod_created_e07239_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recomendacionia',
+            options={'ordering': ['user', 'posicion']},
+        ),
+        migrations.AddField(
+            model_name='recomendacionia',
+            name='posicion',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='recomendacionia',
+            name='producto_origen',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='recomendaciones_origen', to='tienda.producto'),
+        ),
+        migrations.AddIndex(
+            model_name='recomendacionia',
+            index=models.Index(fields=['user', 'posicion'], name='analytics_r_user_id_f7101f_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_alter_recomendacionia_options_and_more'),
+        ('tienda', '0012_producto_tienda_prod_created_e07239_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilitudProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similitudes', to='tienda.producto')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tienda.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['producto', '-score'], name='analytics_s_product_74ff53_idx')],
+                'unique_together': {('producto', 'similar')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_similitudproducto'),
+        ('tienda', '0012_producto_tienda_prod_created_e07239_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActividadProductoHora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora', models.DateTimeField()),
+                ('vistas', models.PositiveIntegerField(default=0)),
+                ('carritos', models.PositiveIntegerField(default=0)),
+                ('compras', models.PositiveIntegerField(default=0)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actividad_horaria', to='tienda.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hora'], name='analytics_a_hora_95ca2c_idx')],
+                'unique_together': {('producto', 'hora')},
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:57
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+CONTADORES = {'vistas': 'view', 'carritos': 'cart', 'compras': 'buy', 'comparaciones': 'compare'}
+
+
+def inicializar_contadores(apps, schema_editor):
+    """Carga los contadores con los eventos ya registrados (una consulta agregada)"""
+    UsuarioComportamiento = apps.get_model('analytics', 'UsuarioComportamiento')
+    CarritoInteligente = apps.get_model('analytics', 'CarritoInteligente')
+
+    totales = {
+        fila.pop('user'): fila
+        for fila in UsuarioComportamiento.objects.order_by().values('user').annotate(**{
+            campo: Count('id', filter=Q(accion=accion)) for campo, accion in CONTADORES.items()
+        })
+    }
+    carritos = list(CarritoInteligente.objects.filter(user__in=totales.keys()))
+    for carrito in carritos:
+        for campo, valor in totales[carrito.user_id].items():
+            setattr(carrito, campo, valor)
+    CarritoInteligente.objects.bulk_update(carritos, list(CONTADORES), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_actividadproductohora'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carritointeligente',
+            name='carritos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='carritointeligente',
+            name='comparaciones',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='carritointeligente',
+            name='compras',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='carritointeligente',
+            name='vistas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(inicializar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:34
+
+from django.db import migrations
+from django.db.models import Count, Q
+
+CONTADORES = {'vistas': 'view', 'carritos': 'cart', 'compras': 'buy', 'comparaciones': 'compare'}
+
+
+def _score(vistas, carritos, compras, comparaciones):
+    # Copia fija de CarritoInteligente.score_por_eventos
+    return min(min(vistas * 0.05, 0.3) + carritos * 0.2 + compras * 0.4 + comparaciones * 0.1, 1.0)
+
+
+def unificar_carritos(apps, schema_editor):
+    """
+    Deja una fila por usuario y recalcula los contadores desde los eventos
+    guardados. Fusiona los duplicados de volcados concurrentes y crea las
+    filas de usuarios con eventos que 0005 salteó por no tener carrito.
+    """
+    UsuarioComportamiento = apps.get_model('analytics', 'UsuarioComportamiento')
+    CarritoInteligente = apps.get_model('analytics', 'CarritoInteligente')
+
+    duplicados = (
+        CarritoInteligente.objects.filter(user__isnull=False).order_by()
+        .values('user').annotate(filas=Count('id')).filter(filas__gt=1)
+        .values_list('user', flat=True)
+    )
+    for user_id in list(duplicados):
+        filas = list(CarritoInteligente.objects.filter(user_id=user_id).order_by('id'))
+        conservado, sobrantes = filas[0], filas[1:]
+        for carrito in sobrantes:
+            for campo in ('productos_sugeridos', 'productos_abandonados'):
+                valores = getattr(conservado, campo)
+                valores.extend(v for v in getattr(carrito, campo) if v not in valores)
+            if carrito.ultimo_recordatorio and (
+                not conservado.ultimo_recordatorio or carrito.ultimo_recordatorio > conservado.ultimo_recordatorio
+            ):
+                conservado.ultimo_recordatorio = carrito.ultimo_recordatorio
+        conservado.save()
+        CarritoInteligente.objects.filter(id__in=[c.id for c in sobrantes]).delete()
+
+    totales = {
+        fila.pop('user'): fila
+        for fila in UsuarioComportamiento.objects.order_by().values('user').annotate(**{
+            campo: Count('id', filter=Q(accion=accion)) for campo, accion in CONTADORES.items()
+        })
+    }
+    con_carrito = set(
+        CarritoInteligente.objects.filter(user__in=totales.keys()).values_list('user_id', flat=True)
+    )
+    CarritoInteligente.objects.bulk_create(
+        [CarritoInteligente(user_id=user_id) for user_id in totales.keys() - con_carrito], batch_size=500
+    )
+    carritos = list(CarritoInteligente.objects.filter(user__in=totales.keys()))
+    for carrito in carritos:
+        for campo, valor in totales[carrito.user_id].items():
+            setattr(carrito, campo, valor)
+        carrito.score_intencion_compra = _score(**totales[carrito.user_id])
+    CarritoInteligente.objects.bulk_update(
+        carritos, list(CONTADORES) + ['score_intencion_compra'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0005_carritointeligente_contadores'),
+    ]
+
+    operations = [
+        migrations.RunPython(unificar_carritos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separada de 0006: en PostgreSQL no se puede alterar la tabla en la
+    # misma transacción que modificó sus filas (FKs diferidas)
+
+    dependencies = [
+        ('analytics', '0006_unificar_carritointeligente'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='carritointeligente',
+            constraint=models.UniqueConstraint(fields=('user',), name='carrito_inteligente_user_unico'),
+        ),
+    ]
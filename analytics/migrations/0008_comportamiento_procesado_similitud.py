@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0007_carritointeligente_user_unico'),
+        ('tienda', '0018_imagenes_locales'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuariocomportamiento',
+            name='procesado_similitud',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='usuariocomportamiento',
+            index=models.Index(condition=models.Q(('procesado_similitud', False)), fields=['id'], name='comportamiento_pendiente_idx'),
+        ),
+    ]
@@ -19,26 +19,52 @@ class UsuarioComportamiento(models.Model):
     ])
     timestamp = models.DateTimeField(auto_now_add=True)
     tiempo_en_pagina = models.IntegerField(default=0)  # segundos
+    # Ya sumado a la matriz de similitudes (ver analytics/similitud.py)
+    procesado_similitud = models.BooleanField(default=False, editable=False)
     
     class Meta:
         ordering = ['-timestamp']
         indexes = [
             models.Index(fields=['user', '-timestamp']),
             models.Index(fields=['producto', 'accion']),
+            # Parcial: solo los pocos eventos pendientes de la próxima corrida
+            models.Index(
+                fields=['id'], condition=models.Q(procesado_similitud=False),
+                name='comportamiento_pendiente_idx',
+            ),
         ]
 
 
 class RecomendacionIA(models.Model):
-    """Almacena recomendaciones generadas por IA"""
+    """Almacena recomendaciones generadas por IA (precalculadas por usuario)"""
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    producto_origen = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="recomendaciones_origen")
+    # Producto que motivó la recomendación; vacío para las de tendencia
+    producto_origen = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="recomendaciones_origen", null=True, blank=True)
     producto_recomendado = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="recomendaciones_destino")
     score_confianza = models.FloatField()  # 0.0 a 1.0
     razon = models.CharField(max_length=100)
+    posicion = models.PositiveSmallIntegerField(default=0)  # Orden dentro del top-N del usuario
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         unique_together = ['user', 'producto_origen', 'producto_recomendado']
+        ordering = ['user', 'posicion']
+        indexes = [
+            models.Index(fields=['user', 'posicion']),
+        ]
+
+
+class SimilitudProducto(models.Model):
+    """Top-k de productos similares (item-item) precalculado desde el comportamiento"""
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="similitudes")
+    similar = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()  # Similitud coseno, 0.0 a 1.0
+    
+    class Meta:
+        unique_together = ['producto', 'similar']
+        indexes = [
+            models.Index(fields=['producto', '-score']),
+        ]
 
 
 class ComparacionPrecios(models.Model):
@@ -53,28 +79,89 @@ class ComparacionPrecios(models.Model):
     
     def actualizar_comparacion(self):
         """Lógica IA para determinar si es una buena oferta"""
-        productos_similares = Producto.objects.filter(
-            marca=self.producto.marca,
-            active=True
-        ).exclude(id=self.producto.id)
+        ComparacionPrecios.actualizar_en_lote(marcas=[self.producto.marca])
+        self.refresh_from_db()
+    
+    @staticmethod
+    def _evaluar_oferta(comparacion, precio, suma, cantidad, minimo, maximo):
+        """Compara el precio contra el resto de su marca (excluyéndose a sí mismo)"""
+        if cantidad <= 1:
+            comparacion.precio_promedio_mercado = None
+            comparacion.precio_minimo = None
+            comparacion.precio_maximo = None
+            comparacion.es_oferta = False
+            comparacion.porcentaje_ahorro = 0.0
+            return
+        
+        comparacion.precio_promedio_mercado = ((suma - precio) / (cantidad - 1)).quantize(Decimal('0.01'))
+        comparacion.precio_minimo = minimo
+        comparacion.precio_maximo = maximo
+        
+        # IA simple: si está 15% por debajo del promedio, es oferta
+        umbral_oferta = comparacion.precio_promedio_mercado * Decimal('0.85')
+        if precio < umbral_oferta:
+            comparacion.es_oferta = True
+            diferencia = comparacion.precio_promedio_mercado - precio
+            comparacion.porcentaje_ahorro = float((diferencia / comparacion.precio_promedio_mercado) * 100)
+        else:
+            comparacion.es_oferta = False
+            comparacion.porcentaje_ahorro = 0.0
+    
+    @classmethod
+    def actualizar_en_lote(cls, marcas=None):
+        """
+        Refresca las comparaciones de todos los productos activos (o solo de
+        las marcas dadas) con un único agregado Sum/Count por marca. Para el
+        mínimo y el máximo sin el producto se guardan los dos precios más
+        bajos y los dos más altos de cada marca.
+        """
+        import heapq
+        from django.db.models import Count, Sum
+        from django.utils import timezone
+        
+        productos = Producto.objects.filter(active=True)
+        if marcas is not None:
+            productos = productos.filter(marca__in=marcas)
+        
+        estadisticas = {
+            fila['marca']: fila
+            for fila in productos.order_by().values('marca').annotate(suma=Sum('price'), cantidad=Count('id'))
+        }
+        filas = list(productos.values_list('id', 'marca', 'price'))
+        precios_por_marca = {}
+        for _, marca, precio in filas:
+            precios_por_marca.setdefault(marca, []).append(precio)
+        for marca, precios in precios_por_marca.items():
+            estadisticas[marca]['bajos'] = heapq.nsmallest(2, precios)
+            estadisticas[marca]['altos'] = heapq.nlargest(2, precios)
+        existentes = {
+            c.producto_id: c
+            for c in cls.objects.filter(producto__in=productos)
+        }
         
-        if productos_similares.exists():
-            precios = [p.price for p in productos_similares]
-            self.precio_promedio_mercado = sum(precios) / len(precios)
-            self.precio_minimo = min(precios)
-            self.precio_maximo = max(precios)
-            
-            # IA simple: si está 15% por debajo del promedio, es oferta
-            umbral_oferta = self.precio_promedio_mercado * Decimal('0.85')
-            if self.producto.price < umbral_oferta:
-                self.es_oferta = True
-                diferencia = self.precio_promedio_mercado - self.producto.price
-                self.porcentaje_ahorro = float((diferencia / self.precio_promedio_mercado) * 100)
+        ahora = timezone.now()
+        nuevas, actualizadas = [], []
+        for producto_id, marca, precio in filas:
+            comparacion = existentes.get(producto_id)
+            if comparacion is None:
+                comparacion = cls(producto_id=producto_id)
+                nuevas.append(comparacion)
             else:
-                self.es_oferta = False
-                self.porcentaje_ahorro = 0.0
+                actualizadas.append(comparacion)
+            e = estadisticas[marca]
+            # Si el producto es el extremo, el extremo del resto es el siguiente
+            minimo = e['bajos'][-1] if precio == e['bajos'][0] else e['bajos'][0]
+            maximo = e['altos'][-1] if precio == e['altos'][0] else e['altos'][0]
+            cls._evaluar_oferta(comparacion, precio, e['suma'], e['cantidad'], minimo, maximo)
+            comparacion.last_updated = ahora
         
-        self.save()
+        cls.objects.bulk_create(nuevas, batch_size=500)
+        cls.objects.bulk_update(
+            actualizadas,
+            ['precio_promedio_mercado', 'precio_minimo', 'precio_maximo', 'es_oferta', 'porcentaje_ahorro', 'last_updated'],
+            batch_size=500,
+        )
+        return len(nuevas) + len(actualizadas)
 
 
 class CarritoInteligente(models.Model):
@@ -84,10 +171,30 @@ class CarritoInteligente(models.Model):
     productos_sugeridos = models.JSONField(default=list)  # IDs de productos sugeridos por IA
     productos_abandonados = models.JSONField(default=list)  # Productos que quitó del carrito
     score_intencion_compra = models.FloatField(default=0.0)  # 0.0 a 1.0
+    # Contadores incrementales de eventos (ver analytics/ingesta.py)
+    vistas = models.PositiveIntegerField(default=0)
+    carritos = models.PositiveIntegerField(default=0)
+    compras = models.PositiveIntegerField(default=0)
+    comparaciones = models.PositiveIntegerField(default=0)
     ultimo_recordatorio = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
+
+    class Meta:
+        constraints = [
+            # Una fila por usuario (las de sesión anónima tienen user NULL)
+            models.UniqueConstraint(fields=['user'], name='carrito_inteligente_user_unico'),
+        ]
+
+    @staticmethod
+    def score_por_eventos(vistas, carritos, compras, comparaciones):
+        """Score de intención a partir de los contadores de eventos"""
+        score = min(vistas * 0.05, 0.3)  # Máximo 0.3 por vistas
+        score += carritos * 0.2  # 0.2 por cada item agregado al carrito
+        score += compras * 0.4   # 0.4 por cada compra
+        score += comparaciones * 0.1  # 0.1 por cada comparación
+        return min(score, 1.0)
+
     def calcular_score_intencion(self):
         """IA para calcular probabilidad de compra"""
         from django.utils import timezone
@@ -115,6 +222,21 @@ class CarritoInteligente(models.Model):
         return self.score_intencion_compra
 
 
+class ActividadProductoHora(models.Model):
+    """Rollup horario de vistas/carritos/compras por producto (ver analytics/tendencias.py)"""
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="actividad_horaria")
+    hora = models.DateTimeField()  # Inicio de la hora
+    vistas = models.PositiveIntegerField(default=0)
+    carritos = models.PositiveIntegerField(default=0)
+    compras = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['producto', 'hora']
+        indexes = [
+            models.Index(fields=['hora']),
+        ]
+
+
 class TendenciaMercado(models.Model):
     """IA que analiza tendencias del mercado"""
     categoria = models.CharField(max_length=100)
@@ -129,20 +251,6 @@ class TendenciaMercado(models.Model):
     
     @classmethod
     def analizar_tendencias(cls):
-        """IA que analiza automáticamente las tendencias"""
-        from django.db.models import Count, Avg
-        from datetime import datetime, timedelta
-        
-        # Análisis de productos más vistos en última semana
-        fecha_limite = datetime.now() - timedelta(days=7)
-        productos_populares = UsuarioComportamiento.objects.filter(
-            timestamp__gte=fecha_limite,
-            accion__in=['view', 'cart', 'buy']
-        ).values('producto').annotate(
-            popularidad=Count('id')
-        ).order_by('-popularidad')[:10]
-        
-        for categoria in ['Electrónicos', 'Ropa', 'Hogar', 'Deportes', 'Pesca']:
-            tendencia, created = cls.objects.get_or_create(categoria=categoria)
-            tendencia.productos_trending = [p['producto'] for p in productos_populares]
-            tendencia.save()
\ No newline at end of file
+        """IA que analiza las tendencias (rollup incremental, correr en forma programada)"""
+        from .tendencias import actualizar_tendencias
+        return actualizar_tendencias()
@@ -0,0 +1,178 @@
+"""
+Precálculo de recomendaciones por usuario.
+
+El cálculo pesado (historial de compras, co-ocurrencias y tendencias) corre
+offline con ``manage.py precalcular_recomendaciones`` (cron horario, ver
+render.yaml) y se guarda en `RecomendacionIA`; cada corrida recalcula los
+usuarios cuyo top-N venció (`RECOMENDACIONES_TTL`). Las vistas solo leen el
+top-N ya calculado con una consulta indexada por (user, posicion).
+"""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from tienda.models import Producto
+from .models import UsuarioComportamiento, RecomendacionIA, SimilitudProducto
+from .tendencias import ids_trending
+
+TOP_N = 12
+RECOMENDACIONES_TTL = timedelta(hours=6)
+
+RAZON_HISTORIAL = 'Similar a tus compras'
+RAZON_JUNTOS = 'Otros usuarios también compraron'
+RAZON_TENDENCIA = 'Tendencia del mercado'
+
+
+def _visibles():
+    return Producto.objects.filter(active=True, stock__gt=0)
+
+
+def productos_populares(limit=TOP_N):
+    """Productos en tendencia para usuarios anónimos (solo lectura de cache)"""
+    ids = ids_trending(limit)
+    productos = _visibles().in_bulk(ids)
+    resultado = [productos[i] for i in ids if i in productos]
+    if len(resultado) < limit:
+        resultado.extend(
+            _visibles().exclude(id__in=ids).order_by('-created_at')[:limit - len(resultado)]
+        )
+    return resultado
+
+
+def _recomendaciones_historial(user, limit):
+    compras = list(
+        UsuarioComportamiento.objects.filter(user=user, accion='buy')
+        .values_list('producto', 'producto__marca', 'producto__seller')
+    )
+    if not compras:
+        return []
+
+    comprados = {p for p, _, _ in compras}
+    origen_por_marca = {marca: p for p, marca, _ in compras}
+    origen_por_seller = {seller: p for p, _, seller in compras}
+
+    similares = _visibles().filter(
+        Q(marca__in=origen_por_marca.keys()) | Q(seller__in=origen_por_seller.keys())
+    ).exclude(id__in=comprados).values_list('id', 'marca', 'seller')[:limit]
+
+    return [
+        (pid, origen_por_marca.get(marca) or origen_por_seller.get(seller), 0.8, RAZON_HISTORIAL)
+        for pid, marca, seller in similares
+    ]
+
+
+def _recomendaciones_juntos(user, limit):
+    """Suma las similitudes item-item de lo que el usuario agregó o compró"""
+    mis_productos = UsuarioComportamiento.objects.filter(
+        user=user, accion__in=['buy', 'cart']
+    ).values('producto')
+
+    relacionados = list(
+        SimilitudProducto.objects.filter(
+            producto__in=mis_productos,
+            similar__active=True, similar__stock__gt=0,
+        ).exclude(similar__in=mis_productos).values('similar').annotate(
+            score=Sum('score')
+        ).order_by('-score')[:limit]
+    )
+    if not relacionados:
+        return []
+
+    maximo = relacionados[0]['score']
+    return [
+        (r['similar'], None, 0.5 + 0.3 * r['score'] / maximo, RAZON_JUNTOS)
+        for r in relacionados
+    ]
+
+
+def calcular_recomendaciones(user, limit=TOP_N, populares=None):
+    """
+    Calcula el top-N de un usuario como tuplas
+    (producto_id, producto_origen_id, score, razon), sin escribir nada.
+    """
+    candidatos = []
+    candidatos.extend(_recomendaciones_historial(user, limit // 2))
+    candidatos.extend(_recomendaciones_juntos(user, limit // 2))
+
+    if populares is None:
+        populares = ids_trending(limit)
+    candidatos.extend((pid, None, 0.3, RAZON_TENDENCIA) for pid in populares)
+
+    vistos = set()
+    recomendaciones = []
+    for candidato in candidatos:
+        if candidato[0] not in vistos:
+            vistos.add(candidato[0])
+            recomendaciones.append(candidato)
+
+    if len(recomendaciones) < limit:
+        recientes = _visibles().exclude(id__in=vistos).order_by('-created_at').values_list('id', flat=True)
+        recomendaciones.extend(
+            (pid, None, 0.1, RAZON_TENDENCIA) for pid in recientes[:limit - len(recomendaciones)]
+        )
+
+    return recomendaciones[:limit]
+
+
+def guardar_recomendaciones(user, recomendaciones):
+    """Reemplaza el top-N guardado del usuario"""
+    with transaction.atomic():
+        RecomendacionIA.objects.filter(user=user).delete()
+        RecomendacionIA.objects.bulk_create([
+            RecomendacionIA(
+                user=user,
+                producto_recomendado_id=producto_id,
+                producto_origen_id=origen_id,
+                score_confianza=score,
+                razon=razon,
+                posicion=posicion,
+            )
+            for posicion, (producto_id, origen_id, score, razon) in enumerate(recomendaciones)
+        ])
+
+
+def usuarios_vencidos():
+    """Usuarios con actividad sin recomendaciones o con recomendaciones más viejas que el TTL"""
+    desde = timezone.now() - RECOMENDACIONES_TTL
+    frescos = RecomendacionIA.objects.filter(created_at__gte=desde).values('user')
+    return (
+        get_user_model().objects.filter(comportamientos__isnull=False)
+        .exclude(id__in=frescos).distinct()
+    )
+
+
+def precalcular_recomendaciones(usuarios=None, limit=TOP_N):
+    """
+    Precalcula las recomendaciones de los usuarios dados (por defecto, los
+    de `usuarios_vencidos()`). Devuelve cuántos procesó.
+    """
+    if usuarios is None:
+        usuarios = usuarios_vencidos()
+
+    populares = ids_trending(limit)
+    procesados = 0
+    for user in usuarios.iterator():
+        guardar_recomendaciones(user, calcular_recomendaciones(user, limit, populares))
+        procesados += 1
+    return procesados
+
+
+def obtener_recomendaciones_guardadas(user, limit=TOP_N):
+    """
+    Lectura del top-N precalculado, aunque esté vencido: nunca recalcula ni
+    escribe, eso queda para ``precalcular_recomendaciones`` (cron). Si no hay
+    nada visible guardado devuelve los productos populares.
+    """
+    guardadas = list(
+        RecomendacionIA.objects.filter(
+            user=user,
+            producto_recomendado__active=True,
+            producto_recomendado__stock__gt=0,
+        ).select_related('producto_recomendado').order_by('posicion')[:limit]
+    )
+    if guardadas:
+        return [r.producto_recomendado for r in guardadas]
+    return productos_populares(limit)
@@ -0,0 +1,32 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from tienda.models import Producto
+from .models import ComparacionPrecios
+
+
+@receiver(pre_save, sender=Producto)
+def detectar_cambio_precio(sender, instance, update_fields=None, **kwargs):
+    """Guarda qué marcas hay que recalcular si cambia precio, marca o estado"""
+    instance._marcas_a_recalcular = set()
+    if not instance.pk:
+        instance._marcas_a_recalcular.add(instance.marca)
+        return
+    # Contra lo leído de la base (ver Producto.from_db), sin otra consulta
+    campos = [campo for campo in ('marca', 'price', 'active') if update_fields is None or campo in update_fields]
+    if campos and instance.cambiaron(*campos):
+        instance._marcas_a_recalcular.update({instance.cargado('marca'), instance.marca})
+
+
+@receiver(post_save, sender=Producto)
+def recalcular_comparaciones(sender, instance, **kwargs):
+    marcas = getattr(instance, '_marcas_a_recalcular', None)
+    if marcas:
+        transaction.on_commit(lambda: ComparacionPrecios.actualizar_en_lote(marcas=list(marcas)))
+
+
+@receiver(post_delete, sender=Producto)
+def recalcular_comparaciones_al_eliminar(sender, instance, **kwargs):
+    marca = instance.marca
+    transaction.on_commit(lambda: ComparacionPrecios.actualizar_en_lote(marcas=[marca]))
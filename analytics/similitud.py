@@ -0,0 +1,262 @@
+"""
+Similitud item-item ("comprados juntos") a partir de `UsuarioComportamiento`.
+
+Se arma una matriz dispersa usuario×producto ponderada por acción y se
+mantiene la matriz de co-ocurrencias C = Xᵀ·X (producto×producto) en disco.
+Cada corrida incremental solo procesa los usuarios con eventos nuevos:
+resta su aporte anterior, suma el actual y recalcula el top-k de los
+productos afectados. El resultado queda en `SimilitudProducto`, así que
+`similar_products()` es una lectura indexada de k filas.
+
+Los eventos nuevos son los que tienen ``procesado_similitud=False``, no los
+de id mayor al último visto: un evento que se confirma tarde con un id más
+bajo igual se procesa. El lote aplicado se guarda junto con la matriz y se
+marca después; si la corrida se corta entre las dos cosas, la siguiente
+termina de marcarlo antes de empezar.
+
+Los índices de las matrices son directamente los ids de la base.
+"""
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.db import transaction
+
+from tienda.models import Producto
+from .models import UsuarioComportamiento, SimilitudProducto
+
+logger = logging.getLogger(__name__)
+
+PESOS_ACCION = {
+    'view': 1.0,
+    'search': 0.5,
+    'compare': 1.5,
+    'cart': 3.0,
+    'buy': 5.0,
+}
+K_MAX = 20
+LOTE_MARCADO = 10000
+ESTADO_PATH = Path(getattr(settings, 'ANALYTICS_DATA_DIR', settings.BASE_DIR / 'var' / 'analytics')) / 'coocurrencias.npz'
+
+
+# ---------------------------------------------------------------------------
+# Álgebra (sin base de datos; también la usa el benchmark)
+# ---------------------------------------------------------------------------
+
+def construir_matriz(usuarios, productos, pesos, shape=None):
+    """
+    Matriz CSR usuario×producto. Las interacciones repetidas se suman y se
+    amortiguan con log1p para que mil vistas no pesen mil veces más.
+    """
+    if shape is None:
+        shape = (int(usuarios.max(initial=-1)) + 1, int(productos.max(initial=-1)) + 1)
+    X = sparse.coo_matrix((pesos, (usuarios, productos)), shape=shape, dtype=np.float64).tocsr()
+    X.sum_duplicates()
+    np.log1p(X.data, out=X.data)
+    return X
+
+
+def coocurrencias(X):
+    return (X.T @ X).tocsr()
+
+
+def _igualar_forma(M, n):
+    if M.shape != (n, n):
+        M = M.tocsr(copy=True)
+        M.resize((n, n))
+    return M
+
+
+def top_k_similares(C, filas, k=K_MAX):
+    """
+    Coseno item-item a partir de C para las filas dadas.
+    Devuelve {producto_id: (ids_similares, scores)} ordenado por score.
+    """
+    normas = np.sqrt(np.maximum(C.diagonal(), 0.0))
+    resultado = {}
+    for i in filas:
+        inicio, fin = C.indptr[i], C.indptr[i + 1]
+        vecinos = C.indices[inicio:fin]
+        valores = C.data[inicio:fin]
+        mascara = (vecinos != i) & (normas[vecinos] > 0)
+        vecinos, valores = vecinos[mascara], valores[mascara]
+        if not len(vecinos) or normas[i] == 0:
+            resultado[i] = (vecinos[:0], valores[:0])
+            continue
+        scores = valores / (normas[i] * normas[vecinos])
+        if len(scores) > k:
+            mejores = np.argpartition(-scores, k)[:k]
+            vecinos, scores = vecinos[mejores], scores[mejores]
+        orden = np.argsort(-scores, kind='stable')
+        resultado[i] = (vecinos[orden], scores[orden])
+    return resultado
+
+
+# ---------------------------------------------------------------------------
+# Persistencia de la matriz de co-ocurrencias
+# ---------------------------------------------------------------------------
+
+def cargar_estado(path=ESTADO_PATH):
+    """
+    Devuelve (C, ids del último lote aplicado) o None si no existe o es de
+    un formato anterior (se reconstruye desde cero)
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as datos:
+        if 'lote' not in datos:
+            return None
+        C = sparse.csr_matrix(
+            (datos['data'], datos['indices'], datos['indptr']), shape=tuple(datos['shape'])
+        )
+        return C, datos['lote']
+
+
+def guardar_estado(C, lote, path=ESTADO_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.npz')
+    os.close(fd)
+    np.savez_compressed(
+        tmp, data=C.data, indices=C.indices, indptr=C.indptr,
+        shape=np.array(C.shape), lote=np.asarray(lote, dtype=np.int64),
+    )
+    os.replace(tmp, path)
+
+
+# ---------------------------------------------------------------------------
+# Lectura de eventos
+# ---------------------------------------------------------------------------
+
+def _pendientes():
+    """Ids de los eventos que todavía no entraron en la matriz"""
+    return np.fromiter(
+        UsuarioComportamiento.objects.filter(procesado_similitud=False)
+        .order_by().values_list('id', flat=True).iterator(chunk_size=10000),
+        dtype=np.int64,
+    )
+
+
+def _marcar_procesados(ids):
+    ids = [int(i) for i in ids]
+    for inicio in range(0, len(ids), LOTE_MARCADO):
+        UsuarioComportamiento.objects.filter(
+            id__in=ids[inicio:inicio + LOTE_MARCADO], procesado_similitud=False
+        ).update(procesado_similitud=True)
+
+
+def _eventos(queryset):
+    """(ids, usuarios, productos, pesos, procesados) como arrays a partir de un queryset de eventos"""
+    filas = queryset.order_by().values_list('id', 'user_id', 'producto_id', 'accion', 'procesado_similitud')
+    ids, usuarios, productos, pesos, procesados = [], [], [], [], []
+    for evento_id, user_id, producto_id, accion, procesado in filas.iterator(chunk_size=10000):
+        ids.append(evento_id)
+        usuarios.append(user_id)
+        productos.append(producto_id)
+        pesos.append(PESOS_ACCION.get(accion, 0.0))
+        procesados.append(procesado)
+    return (
+        np.asarray(ids, dtype=np.int64),
+        np.asarray(usuarios, dtype=np.int64),
+        np.asarray(productos, dtype=np.int64),
+        np.asarray(pesos, dtype=np.float64),
+        np.asarray(procesados, dtype=bool),
+    )
+
+
+def _guardar_top_k(top_k, completo=False):
+    """Reemplaza las filas de `SimilitudProducto` de los productos recalculados"""
+    # Los eventos de productos borrados pueden seguir en la matriz
+    candidatos = {int(i) for i in top_k} | {int(j) for vecinos, _ in top_k.values() for j in vecinos}
+    ids_validos = set(Producto.objects.filter(id__in=candidatos).values_list('id', flat=True))
+    nuevas = [
+        SimilitudProducto(producto_id=int(i), similar_id=int(j), score=float(s))
+        for i, (vecinos, scores) in top_k.items() if i in ids_validos
+        for j, s in zip(vecinos, scores) if int(j) in ids_validos
+    ]
+    with transaction.atomic():
+        if completo:
+            SimilitudProducto.objects.all().delete()
+        else:
+            SimilitudProducto.objects.filter(producto_id__in=[int(i) for i in top_k]).delete()
+        SimilitudProducto.objects.bulk_create(nuevas, batch_size=1000)
+    return len(nuevas)
+
+
+# ---------------------------------------------------------------------------
+# API pública
+# ---------------------------------------------------------------------------
+
+def actualizar_similitudes(completo=False, k=K_MAX):
+    """
+    Procesa los eventos pendientes (o todo, si `completo` o no hay estado
+    guardado). Devuelve la cantidad de productos recalculados.
+    """
+    estado = None if completo else cargar_estado()
+    completo = estado is None
+
+    if completo:
+        ids, usuarios, productos, pesos, _ = _eventos(UsuarioComportamiento.objects.all())
+        C = coocurrencias(construir_matriz(usuarios, productos, pesos))
+        filas = np.unique(productos)
+        # Solo los leídos: los que llegaron durante la lectura quedan para la próxima
+        lote = np.intersect1d(_pendientes(), ids)
+    else:
+        C, lote_anterior = estado
+        pendientes = _pendientes()
+        # Lote guardado en la matriz pero sin marcar (corrida interrumpida)
+        sin_marcar = np.isin(pendientes, lote_anterior)
+        _marcar_procesados(pendientes[sin_marcar])
+        lote = pendientes[~sin_marcar]
+        if not len(lote):
+            return 0
+
+        afectados = UsuarioComportamiento.objects.filter(procesado_similitud=False).values('user_id').distinct()
+        ids, usuarios, productos, pesos, procesados = _eventos(
+            UsuarioComportamiento.objects.filter(user_id__in=afectados)
+        )
+        # Aporte anterior: lo ya procesado. Actual: eso más el lote. Lo que
+        # llegue mientras tanto no está en ninguno de los dos.
+        en_lote = np.isin(ids, lote)
+        anteriores = (usuarios[procesados], productos[procesados], pesos[procesados])
+        actuales = procesados | en_lote
+        nuevos = (usuarios[actuales], productos[actuales], pesos[actuales])
+
+        n_usuarios = int(usuarios.max(initial=-1)) + 1
+        n_productos = max(C.shape[0], int(productos.max(initial=-1)) + 1)
+        forma = (n_usuarios, n_productos)
+        delta = (
+            coocurrencias(construir_matriz(*nuevos, shape=forma))
+            - coocurrencias(construir_matriz(*anteriores, shape=forma))
+        )
+        C = _igualar_forma(C, n_productos) + delta
+        # Restar y sumar deja residuos de punto flotante donde debería haber 0
+        C.data[np.abs(C.data) < 1e-9] = 0.0
+        C.eliminate_zeros()
+
+        # Cambió la fila de cada producto tocado y, por la norma, también
+        # el score que sus vecinos tienen con él
+        tocados = np.unique(delta.nonzero()[0])
+        vecinos = C[tocados].nonzero()[1] if len(tocados) else tocados
+        filas = np.union1d(tocados, vecinos)
+
+    top_k = top_k_similares(C, filas, k)
+    guardadas = _guardar_top_k(top_k, completo)
+    guardar_estado(C, lote)
+    _marcar_procesados(lote)
+    logger.info(f"Similitudes actualizadas: {len(filas)} productos, {len(lote)} eventos, {guardadas} filas")
+    return len(filas)
+
+
+def similar_products(producto_id, k=6):
+    """Top-k de productos similares (activos y con stock) precalculados"""
+    similitudes = SimilitudProducto.objects.filter(
+        producto_id=producto_id,
+        similar__active=True,
+        similar__stock__gt=0,
+    ).select_related('similar').order_by('-score')[:k]
+    return [s.similar for s in similitudes]
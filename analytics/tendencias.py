@@ -0,0 +1,154 @@
+"""
+Tendencias de mercado como rollup incremental.
+
+``manage.py actualizar_tendencias`` (cron horario, ver render.yaml) agrega los
+eventos nuevos de `UsuarioComportamiento` en buckets horarios por producto,
+descarta los buckets fuera de la ventana y fusiona los últimos 7 días en
+`TendenciaMercado`: una fila 'General' y una por categoría de producto
+(`Producto.categoria`). Los lectores usan `ids_trending()`, que solo lee cache
+o la fila guardada: nunca dispara el cálculo.
+"""
+import logging
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import UsuarioComportamiento, ActividadProductoHora, TendenciaMercado
+
+logger = logging.getLogger(__name__)
+
+VENTANA = timedelta(days=7)
+TOP_TRENDING = 20
+CATEGORIA_GENERAL = 'General'
+TRENDING_CACHE_KEY = 'analytics:trending'
+TRENDING_TIMEOUT = 60 * 60 * 2
+
+PESO_VISTA, PESO_CARRITO, PESO_COMPRA = 1, 3, 5
+
+
+def _acumular_eventos(desde):
+    """Recalcula los buckets horarios desde `desde` (upsert idempotente)"""
+    filas = (
+        UsuarioComportamiento.objects.filter(
+            timestamp__gte=desde, accion__in=['view', 'cart', 'buy']
+        )
+        .order_by()
+        .annotate(hora=TruncHour('timestamp'))
+        .values('producto', 'hora')
+        .annotate(
+            vistas=Count('id', filter=Q(accion='view')),
+            carritos=Count('id', filter=Q(accion='cart')),
+            compras=Count('id', filter=Q(accion='buy')),
+        )
+    )
+    buckets = [
+        ActividadProductoHora(
+            producto_id=f['producto'], hora=f['hora'],
+            vistas=f['vistas'], carritos=f['carritos'], compras=f['compras'],
+        )
+        for f in filas
+    ]
+    ActividadProductoHora.objects.bulk_create(
+        buckets,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['producto', 'hora'],
+        update_fields=['vistas', 'carritos', 'compras'],
+    )
+    return len(buckets)
+
+
+def _puntaje(filtro=None):
+    return Sum(
+        F('vistas') * PESO_VISTA + F('carritos') * PESO_CARRITO + F('compras') * PESO_COMPRA,
+        filter=filtro,
+    )
+
+
+def _demanda(total_ventana, total_dia):
+    """Actividad de las últimas 24h contra el promedio diario de la ventana"""
+    promedio_diario = (total_ventana or 0) / VENTANA.days
+    return (total_dia or 0) / promedio_diario if promedio_diario else 0.0
+
+
+def _cache_key(categoria):
+    return TRENDING_CACHE_KEY if categoria == CATEGORIA_GENERAL else f'{TRENDING_CACHE_KEY}:{categoria}'
+
+
+def actualizar_tendencias():
+    """Procesa los eventos nuevos y actualiza la ventana de 7 días"""
+    ahora = timezone.now()
+    inicio_ventana = ahora - VENTANA
+
+    # La última hora guardada puede estar incompleta: se vuelve a agregar
+    ultima_hora = ActividadProductoHora.objects.aggregate(m=Max('hora'))['m']
+    desde = max(ultima_hora, inicio_ventana) if ultima_hora else inicio_ventana
+    buckets = _acumular_eventos(desde)
+
+    ActividadProductoHora.objects.filter(hora__lt=inicio_ventana - timedelta(hours=1)).delete()
+
+    en_ventana = ActividadProductoHora.objects.filter(hora__gte=inicio_ventana)
+
+    # Puntaje por producto visible (ya ordenado): de acá salen el ranking
+    # general y el de cada categoría sin otra consulta por categoría
+    puntajes = (
+        en_ventana.filter(producto__active=True, producto__stock__gt=0)
+        .values('producto', 'producto__categoria').annotate(puntaje=_puntaje())
+        .order_by('-puntaje', 'producto')
+    )
+    ranking = []
+    rankings = {}
+    for fila in puntajes.iterator():
+        if len(ranking) < TOP_TRENDING:
+            ranking.append(fila['producto'])
+        por_categoria = rankings.setdefault(fila['producto__categoria'], [])
+        if len(por_categoria) < TOP_TRENDING:
+            por_categoria.append(fila['producto'])
+
+    totales = {
+        f['producto__categoria']: f
+        for f in en_ventana.order_by().values('producto__categoria').annotate(
+            ventana=_puntaje(), dia=_puntaje(Q(hora__gte=ahora - timedelta(days=1))),
+        )
+    }
+    demanda = _demanda(
+        sum(t['ventana'] or 0 for t in totales.values()),
+        sum(t['dia'] or 0 for t in totales.values()),
+    )
+
+    filas = {CATEGORIA_GENERAL: (ranking, demanda)}
+    for categoria in totales.keys() | rankings.keys():
+        total = totales.get(categoria, {})
+        filas[categoria] = (
+            rankings.get(categoria, []), _demanda(total.get('ventana'), total.get('dia'))
+        )
+
+    for categoria, (ids, demanda_categoria) in filas.items():
+        TendenciaMercado.objects.update_or_create(
+            categoria=categoria,
+            defaults={'productos_trending': ids, 'demanda_score': demanda_categoria},
+        )
+        cache.set(_cache_key(categoria), ids, TRENDING_TIMEOUT)
+    # Categorías sin actividad en la ventana
+    TendenciaMercado.objects.exclude(categoria__in=filas.keys()).delete()
+
+    logger.info(f"Tendencias actualizadas: {buckets} buckets, {len(ranking)} productos en tendencia")
+    return ranking
+
+
+def ids_trending(limit=TOP_TRENDING, categoria=CATEGORIA_GENERAL):
+    """
+    Ids de productos en tendencia (cache o última fila guardada), en general
+    o de una categoría de producto (`Producto.categoria`)
+    """
+    clave = _cache_key(categoria)
+    ids = cache.get(clave)
+    if ids is None:
+        ids = TendenciaMercado.objects.filter(
+            categoria=categoria
+        ).values_list('productos_trending', flat=True).first() or []
+        cache.set(clave, ids, TRENDING_TIMEOUT)
+    return ids[:limit]
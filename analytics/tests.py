@@ -0,0 +1,57 @@
+"""
+Ingesta en buffer de eventos de comportamiento.
+
+Los tests llaman a `flush()` directamente: el hilo de volcado no se inicia.
+"""
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from tienda.models import Producto
+from .ingesta import MAX_REINTENTOS_VOLCADO, BufferEventos
+from .models import CarritoInteligente, UsuarioComportamiento
+
+
+class BufferEventosTests(TestCase):
+    def setUp(self):
+        parche = mock.patch.object(BufferEventos, '_asegurar_hilo')
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.buffer = BufferEventos(max_eventos=1000, intervalo_ms=60000)
+        self.user = User.objects.create_user('comprador')
+        self.producto = Producto.objects.create(seller=self.user, title='Reel', price=10, stock=3)
+
+    def test_usuario_borrado_no_frena_el_volcado(self):
+        borrado = User.objects.create_user('borrado')
+        self.buffer.registrar(self.user.pk, self.producto.pk, 'view')
+        self.buffer.registrar(borrado.pk, self.producto.pk, 'cart')
+        borrado_id = borrado.pk
+        borrado.delete()
+
+        self.assertEqual(self.buffer.flush(), 1)
+
+        self.assertEqual(UsuarioComportamiento.objects.get().user_id, self.user.pk)
+        self.assertEqual(CarritoInteligente.objects.get(user=self.user).vistas, 1)
+        self.assertNotIn(borrado_id, self.buffer._contadores)
+        self.assertEqual(self.buffer._eventos, [])
+
+    def test_volcado_fallido_se_reintenta_y_luego_se_descarta(self):
+        self.buffer.registrar(self.user.pk, self.producto.pk, 'view')
+
+        falla = mock.patch.object(BufferEventos, '_guardar', side_effect=RuntimeError('base caída'))
+        with falla, self.assertLogs('analytics.ingesta', 'ERROR') as logs:
+            for _ in range(MAX_REINTENTOS_VOLCADO - 1):
+                self.assertEqual(self.buffer.flush(), 0)
+                self.assertEqual(len(self.buffer._eventos), 1)
+                # Espera creciente: no está listo aunque el buffer se llene
+                self.buffer.max_eventos = 1
+                self.assertFalse(self.buffer._listo_para_volcar())
+            self.buffer.flush()
+
+        self.assertIn('Se descartan 1 eventos', logs.output[-1])
+        self.assertEqual(self.buffer._eventos, [])
+        self.assertNotIn(self.user.pk, self.buffer._contadores)
+        # Lo que llega después se guarda normalmente
+        self.buffer.registrar(self.user.pk, self.producto.pk, 'view')
+        self.assertEqual(self.buffer.flush(), 1)
@@ -8,12 +8,15 @@ from django.views.generic import TemplateView
 import json
 import random
 from datetime import datetime, timedelta
-from django.db.models import Count, Q, Avg, Sum
+from django.db.models import Avg, Sum
 from django.contrib.auth.models import User
 from django.utils import timezone
 
-from .models import UsuarioComportamiento, RecomendacionIA, ComparacionPrecios, CarritoInteligente, TendenciaMercado
+from .models import UsuarioComportamiento, RecomendacionIA, ComparacionPrecios, CarritoInteligente
 from tienda.models import Producto
+from .recomendaciones import obtener_recomendaciones_guardadas, productos_populares
+from .similitud import similar_products
+from .ingesta import registrar_evento
 
 
 class InteligenciaArtificial:
@@ -21,62 +24,37 @@ class InteligenciaArtificial:
     
     @staticmethod
     def obtener_recomendaciones(user, producto_actual=None, limit=6):
-        """IA que genera recomendaciones personalizadas"""
-        recomendaciones = []
-        
+        """IA que genera recomendaciones personalizadas (lee el top-N precalculado)"""
         if not user.is_authenticated:
-            # Para usuarios anónimos: productos más populares
-            populares = Producto.objects.filter(active=True, stock__gt=0).annotate(
-                popularidad=Count('usuariocomportamiento')
-            ).order_by('-popularidad')[:limit]
-            return populares
+            # Para usuarios anónimos: productos más populares (cacheados)
+            return productos_populares(limit)
         
-        # 1. Productos basados en historial de compras
-        compras_pasadas = UsuarioComportamiento.objects.filter(
-            user=user, accion='buy'
-        ).values_list('producto', flat=True)
-        
-        if compras_pasadas:
-            # Buscar productos similares por marca/categoría
-            productos_similares = Producto.objects.filter(
-                Q(marca__in=Producto.objects.filter(id__in=compras_pasadas).values_list('marca', flat=True)) |
-                Q(seller__in=Producto.objects.filter(id__in=compras_pasadas).values_list('seller', flat=True))
-            ).exclude(id__in=compras_pasadas).filter(active=True, stock__gt=0)[:3]
-            recomendaciones.extend(productos_similares)
+        recomendaciones = []
         
-        # 2. Productos que otros usuarios compraron juntos
+        # Productos que otros usuarios compraron junto al actual (item-item precalculado)
         if producto_actual:
-            usuarios_similares = UsuarioComportamiento.objects.filter(
-                producto=producto_actual, accion__in=['buy', 'cart']
-            ).values_list('user', flat=True)
-            
-            productos_relacionados = UsuarioComportamiento.objects.filter(
-                user__in=usuarios_similares, accion__in=['buy', 'cart']
-            ).exclude(producto=producto_actual).values('producto').annotate(
-                score=Count('id')
-            ).order_by('-score')[:3]
-            
-            for p in productos_relacionados:
-                producto = Producto.objects.get(id=p['producto'])
-                if producto.active and producto.stock > 0:
-                    recomendaciones.append(producto)
+            recomendaciones.extend(similar_products(producto_actual.id, k=3))
         
-        # 3. Completar con productos trending
-        trending = TendenciaMercado.analizar_tendencias()
-        productos_trending = Producto.objects.filter(
-            active=True, stock__gt=0
-        ).exclude(id__in=[r.id for r in recomendaciones])[:limit-len(recomendaciones)]
-        recomendaciones.extend(productos_trending)
+        # Completar con el top-N precalculado del usuario
+        ya_incluidos = {p.id for p in recomendaciones}
+        for producto in obtener_recomendaciones_guardadas(user):
+            if len(recomendaciones) >= limit:
+                break
+            if producto.id not in ya_incluidos:
+                recomendaciones.append(producto)
         
         return recomendaciones[:limit]
     
     @staticmethod
-    def analizar_precio_inteligente(producto):
-        """IA que analiza si un precio es buena oferta"""
-        comparacion, created = ComparacionPrecios.objects.get_or_create(
-            producto=producto
-        )
-        comparacion.actualizar_comparacion()
+    def resultado_analisis(comparacion):
+        """Arma el análisis a partir de la comparación guardada (o None)"""
+        if comparacion is None:
+            return {
+                'es_oferta': False,
+                'porcentaje_ahorro': 0,
+                'precio_promedio': 0.0,
+                'recomendacion': 'Precio regular',
+            }
         
         resultado = {
             'es_oferta': comparacion.es_oferta,
@@ -91,6 +69,24 @@ class InteligenciaArtificial:
             resultado['recomendacion'] = '✨ Buen precio, recomendado'
         
         return resultado
+    
+    @staticmethod
+    def analizar_precio_inteligente(producto):
+        """IA que analiza si un precio es buena oferta (lee la comparación precalculada)"""
+        comparacion = ComparacionPrecios.objects.filter(producto=producto).first()
+        return InteligenciaArtificial.resultado_analisis(comparacion)
+    
+    @staticmethod
+    def analizar_precios(productos):
+        """Análisis de varios productos con una sola consulta: {producto_id: análisis}"""
+        comparaciones = {
+            c.producto_id: c
+            for c in ComparacionPrecios.objects.filter(producto__in=[p.id for p in productos])
+        }
+        return {
+            p.id: InteligenciaArtificial.resultado_analisis(comparaciones.get(p.id))
+            for p in productos
+        }
 
 
 @login_required
@@ -103,11 +99,7 @@ def obtener_recomendaciones_ajax(request):
         try:
             producto_actual = Producto.objects.get(id=producto_id)
             # Registrar que el usuario vio este producto
-            UsuarioComportamiento.objects.create(
-                user=request.user,
-                producto=producto_actual,
-                accion='view'
-            )
+            registrar_evento(request.user, producto_actual.id, 'view')
         except Producto.DoesNotExist:
             pass
     
@@ -115,9 +107,10 @@ def obtener_recomendaciones_ajax(request):
         request.user, producto_actual
     )
     
+    analisis_precios = InteligenciaArtificial.analizar_precios(recomendaciones)
     data = []
     for producto in recomendaciones:
-        analisis_precio = InteligenciaArtificial.analizar_precio_inteligente(producto)
+        analisis_precio = analisis_precios[producto.id]
         data.append({
             'id': producto.id,
             'title': producto.title,
@@ -131,28 +124,6 @@ def obtener_recomendaciones_ajax(request):
     return JsonResponse({'recomendaciones': data})
 
 
-@csrf_exempt
-def registrar_comportamiento(request):
-    """Registra comportamiento del usuario para IA"""
-    if request.method == 'POST':
-        data = json.loads(request.body)
-        
-        if request.user.is_authenticated:
-            try:
-                producto = Producto.objects.get(id=data['producto_id'])
-                UsuarioComportamiento.objects.create(
-                    user=request.user,
-                    producto=producto,
-                    accion=data['accion'],
-                    tiempo_en_pagina=data.get('tiempo', 0)
-                )
-                return JsonResponse({'status': 'success'})
-            except:
-                pass
-    
-    return JsonResponse({'status': 'error'})
-
-
 def comparar_precios(request, producto_id):
     """Vista para comparación inteligente de precios"""
     try:
@@ -165,12 +136,12 @@ def comparar_precios(request, producto_id):
             active=True
         ).exclude(id=producto.id)[:5]
         
+        analisis_similares = InteligenciaArtificial.analizar_precios(productos_similares)
         comparaciones = []
         for p in productos_similares:
-            analisis_similar = InteligenciaArtificial.analizar_precio_inteligente(p)
             comparaciones.append({
                 'producto': p,
-                'analisis': analisis_similar
+                'analisis': analisis_similares[p.id]
             })
         
         context = {
@@ -202,15 +173,15 @@ class DashboardIA(TemplateView):
         carrito_inteligente, created = CarritoInteligente.objects.get_or_create(user=user)
         context['carrito_inteligente'] = carrito_inteligente
         
-        # Productos en oferta detectados por IA
+        # Productos en oferta detectados por IA (comparaciones precalculadas)
         ofertas_ia = []
-        comparaciones = ComparacionPrecios.objects.filter(es_oferta=True)[:6]
+        comparaciones = ComparacionPrecios.objects.filter(
+            es_oferta=True, producto__active=True
+        ).select_related('producto')[:6]
         for comp in comparaciones:
-            ia = InteligenciaArtificial()
-            analisis = ia.analizar_precio_inteligente(comp.producto)
             ofertas_ia.append({
                 'producto': comp.producto,
-                'analisis': analisis
+                'analisis': InteligenciaArtificial.resultado_analisis(comp)
             })
         context['ofertas_ia'] = ofertas_ia
         
@@ -236,48 +207,12 @@ def registrar_comportamiento(request):
         accion = data.get('accion', 'view')
         tiempo = data.get('tiempo', 0)
         
-        producto = get_object_or_404(Producto, id=producto_id)
-        
-        # Registrar o actualizar comportamiento
-        comportamiento, created = UsuarioComportamiento.objects.get_or_create(
-            user=request.user,
-            producto=producto,
-            accion=accion,
-            defaults={'tiempo_en_pagina': tiempo}
-        )
-        
-        if not created:
-            # Actualizar comportamiento existente si es la misma acción
-            comportamiento.tiempo_en_pagina += tiempo
-            comportamiento.save()
-        
-        # Actualizar carrito inteligente
-        carrito, _ = CarritoInteligente.objects.get_or_create(
-            user=request.user,
-            defaults={'score_intencion_compra': 0.0}
-        )
-        
-        # Recalcular score de intención de compra basado en comportamientos
-        total_comportamientos = UsuarioComportamiento.objects.filter(user=request.user)
-        score = 0.0
-        
-        # Algoritmo simple de scoring
-        views = total_comportamientos.filter(accion='view').count()
-        carts = total_comportamientos.filter(accion='cart').count()
-        buys = total_comportamientos.filter(accion='buy').count()
-        compares = total_comportamientos.filter(accion='compare').count()
-        
-        score += min(views * 0.05, 0.3)  # Máximo 0.3 por vistas
-        score += carts * 0.2  # 0.2 por cada item agregado al carrito
-        score += buys * 0.4   # 0.4 por cada compra
-        score += compares * 0.1  # 0.1 por cada comparación
-        
-        carrito.score_intencion_compra = min(score, 1.0)
-        carrito.save()
+        # Se encola: el volcado a la base y los contadores los maneja analytics/ingesta.py
+        score = registrar_evento(request.user, producto_id, accion, tiempo)
         
         return JsonResponse({
             'success': True,
-            'score_actualizado': carrito.score_intencion_compra
+            'score_actualizado': score
         })
         
     except Exception as e:
@@ -288,9 +223,8 @@ def comparar_precios(request, producto_id):
     """Vista para mostrar comparación detallada de precios"""
     producto = get_object_or_404(Producto, id=producto_id)
     
-    # Obtener o crear análisis de precios
-    ia = InteligenciaArtificial()
-    analisis = ia.analizar_precio_inteligente(producto, request.user if request.user.is_authenticated else None)
+    # Análisis de precios precalculado
+    analisis = InteligenciaArtificial.analizar_precio_inteligente(producto)
     
     # Productos similares por marca (ya que no hay categoría)
     productos_similares = Producto.objects.filter(
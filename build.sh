@@ -24,4 +24,22 @@ python manage.py setup_oauth
 echo "👤 Configurando datos iniciales..."
 python manage.py setup_database
 
+# Categorías de productos cargados sin save() (bulk_create, update)
+echo "🏷️ Recalculando categorías de productos..."
+python manage.py actualizar_categorias
+
+# Comparaciones de precios iniciales (luego se mantienen con signals)
+echo "💲 Recalculando comparaciones de precios..."
+python manage.py actualizar_comparaciones
+
+# Variantes locales de las imágenes: el disco del servicio es efímero, con
+# --todos se regeneran los archivos que falten en cada deploy
+echo "🖼️ Generando imágenes de productos..."
+python manage.py generar_imagenes --todos
+
+# Tendencias iniciales: hasta la primera corrida del cron (render.yaml)
+# los "más populares" quedarían vacíos
+echo "📈 Calculando tendencias..."
+python manage.py actualizar_tendencias
+
 echo "✅ Deployment completado!"
\ No newline at end of file
@@ -0,0 +1,214 @@
+"""
+Cliente HTTP saliente compartido del proyecto.
+
+Las llamadas a APIs externas pasan por `get()`:
+
+- una `requests.Session` por host, con su pool de conexiones keep-alive;
+- reintentos acotados ante errores de conexión y respuestas 429/502/503/504,
+  con backoff exponencial y jitter. Los timeouts no se reintentan: ya
+  consumieron el tiempo de espera completo;
+- un circuit breaker por proveedor: tras `UMBRAL_FALLAS` fallas seguidas se
+  rechazan las llamadas durante `APERTURA` segundos con `CircuitoAbierto`,
+  sin tocar la red, y después pasa una sola llamada de prueba;
+- métricas por proveedor en memoria del proceso (`metricas()`).
+
+El proveedor es un nombre lógico (``'worldtides'``); si no se indica se usa
+el host de la URL. Las respuestas 4xx se devuelven tal cual: son errores
+del pedido, no del proveedor. Telegram no pasa por acá: python-telegram-bot
+ya usa su propio pool (ver telegram_bot/sender.py).
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+TAMANO_POOL = 10
+TIMEOUT_CONEXION = 3
+TIMEOUT_LECTURA = 10
+REINTENTOS = 2
+BACKOFF_BASE = 0.2
+BACKOFF_MAX = 2
+STATUS_REINTENTABLES = {429, 502, 503, 504}
+UMBRAL_FALLAS = 5
+APERTURA = 30
+MUESTRAS_LATENCIA = 200
+
+
+class ErrorHTTP(requests.RequestException):
+    """Error de red o timeout hablando con un proveedor"""
+
+
+class CircuitoAbierto(ErrorHTTP):
+    """El proveedor está marcado como caído: se rechaza sin llamar"""
+
+
+class Proveedor:
+    """Circuit breaker y métricas de un proveedor"""
+
+    def __init__(self, nombre, umbral=UMBRAL_FALLAS, apertura=APERTURA):
+        self.nombre = nombre
+        self.umbral = umbral
+        self.apertura = apertura
+        self._fallas = 0
+        self._abierto_hasta = 0.0
+        self._probando = False
+        self._lock = threading.Lock()
+        self.llamadas = 0
+        self.errores = 0
+        self.reintentos = 0
+        self.rechazadas = 0
+        self._latencias = deque(maxlen=MUESTRAS_LATENCIA)
+
+    def _estado(self):
+        if self._fallas < self.umbral:
+            return 'cerrado'
+        if time.monotonic() < self._abierto_hasta:
+            return 'abierto'
+        return 'semiabierto'
+
+    def permitir(self):
+        with self._lock:
+            estado = self._estado()
+            if estado == 'cerrado':
+                return True
+            if estado == 'semiabierto' and not self._probando:
+                # Una sola llamada de prueba; el resto sigue rechazándose
+                self._probando = True
+                return True
+            self.rechazadas += 1
+            return False
+
+    def restante(self):
+        return max(0.0, self._abierto_hasta - time.monotonic())
+
+    def reintento(self):
+        with self._lock:
+            self.reintentos += 1
+
+    def registrar(self, latencia, error):
+        with self._lock:
+            self.llamadas += 1
+            self._latencias.append(latencia)
+            self._probando = False
+            if not error:
+                if self._fallas >= self.umbral:
+                    logger.info(f"Circuito {self.nombre} cerrado")
+                self._fallas = 0
+                return
+            self.errores += 1
+            self._fallas += 1
+            if self._fallas >= self.umbral:
+                if self._estado() != 'abierto':
+                    logger.warning(
+                        f"Circuito {self.nombre} abierto por {self.apertura}s "
+                        f"tras {self._fallas} fallas seguidas"
+                    )
+                self._abierto_hasta = time.monotonic() + self.apertura
+
+    def liberar(self):
+        """La llamada terminó por un error ajeno al proveedor"""
+        with self._lock:
+            self._probando = False
+
+    def metricas(self):
+        with self._lock:
+            latencias = sorted(self._latencias)
+            estado = self._estado()
+
+        def percentil(p):
+            if not latencias:
+                return None
+            return round(latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000, 1)
+
+        return {
+            'estado': estado,
+            'llamadas': self.llamadas,
+            'errores': self.errores,
+            'reintentos': self.reintentos,
+            'rechazadas': self.rechazadas,
+            'latencia_p50_ms': percentil(0.5),
+            'latencia_p95_ms': percentil(0.95),
+        }
+
+
+_proveedores = {}
+_sesiones = {}
+_lock = threading.Lock()
+
+
+def _proveedor(nombre):
+    with _lock:
+        if nombre not in _proveedores:
+            _proveedores[nombre] = Proveedor(nombre)
+        return _proveedores[nombre]
+
+
+def _sesion(url):
+    partes = urlsplit(url)
+    clave = (partes.scheme, partes.netloc)
+    with _lock:
+        sesion = _sesiones.get(clave)
+        if sesion is None:
+            sesion = requests.Session()
+            sesion.mount(f'{partes.scheme}://', HTTPAdapter(pool_connections=1, pool_maxsize=TAMANO_POOL))
+            _sesiones[clave] = sesion
+        return sesion
+
+
+def _esperar(intento):
+    # Full jitter: los clientes que fallaron juntos no reintentan juntos
+    time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** intento)))
+
+
+def get(url, proveedor=None, timeout=None, reintentos=REINTENTOS, **kwargs):
+    """
+    GET con pool, reintentos y circuit breaker. Devuelve la respuesta, aun
+    con status de error; levanta `ErrorHTTP` si no hubo respuesta.
+    """
+    estado = _proveedor(proveedor or urlsplit(url).netloc)
+    if not estado.permitir():
+        raise CircuitoAbierto(f"{estado.nombre}: circuito abierto (reintenta en {estado.restante():.0f}s)")
+
+    sesion = _sesion(url)
+    timeout = timeout or (TIMEOUT_CONEXION, TIMEOUT_LECTURA)
+    inicio = time.monotonic()
+    try:
+        for intento in range(reintentos + 1):
+            try:
+                respuesta = sesion.get(url, timeout=timeout, **kwargs)
+            except requests.Timeout:
+                raise
+            except requests.ConnectionError:
+                if intento == reintentos:
+                    raise
+            else:
+                if respuesta.status_code not in STATUS_REINTENTABLES or intento == reintentos:
+                    break
+                respuesta.close()
+            estado.reintento()
+            _esperar(intento)
+    except (requests.ConnectionError, requests.Timeout) as e:
+        estado.registrar(time.monotonic() - inicio, error=True)
+        # Sin la URL en el mensaje: lleva las API keys y puede terminar en la página
+        raise ErrorHTTP(f"{estado.nombre}: {type(e).__name__}") from e
+    except BaseException:
+        estado.liberar()
+        raise
+
+    error = respuesta.status_code >= 500 or respuesta.status_code == 429
+    estado.registrar(time.monotonic() - inicio, error=error)
+    return respuesta
+
+
+def metricas():
+    """Métricas de los proveedores usados por este proceso"""
+    with _lock:
+        proveedores = list(_proveedores.values())
+    return {p.nombre: p.metricas() for p in proveedores}
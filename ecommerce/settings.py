@@ -147,8 +147,17 @@ WSGI_APPLICATION = "ecommerce.wsgi.application"
 
 
 # DATABASES via DATABASE_URL (Render te dará la URL)
+# Sin conexiones persistentes: la web corre en ASGI, donde cada request
+# puede usar otro hilo y las conexiones abiertas no se reutilizan
 DATABASES = {
-    "default": dj_database_url.config(default=os.environ.get("DATABASE_URL"), conn_max_age=600)
+    "default": dj_database_url.config(default=os.environ.get("DATABASE_URL"), conn_max_age=0)
+}
+
+
+# CACHE: en memoria por defecto; en producción definir CACHE_URL
+# (ej. redis://...) para compartirla entre la web y los workers (render.yaml)
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://"),
 }
 
 
@@ -204,12 +213,16 @@ EMAIL_HOST_USER = env("EMAIL_HOST_USER", default="")
 EMAIL_HOST_PASSWORD = env("EMAIL_HOST_PASSWORD", default="")
 DEFAULT_FROM_EMAIL = env("DEFAULT_FROM_EMAIL", default="noreply@mercadito.com")
 EMAIL_SUBJECT_PREFIX = "[Mercadito] "
+# Segundos por operación SMTP: acota el envío del worker de notificaciones
+EMAIL_TIMEOUT = env("EMAIL_TIMEOUT", default=30, cast=int)
 
 
 # ============================================
 # CONFIGURACIÓN DE TELEGRAM BOT
 # ============================================
 TELEGRAM_BOT_TOKEN = env("TELEGRAM_BOT_TOKEN", default="")
+# Permite apuntar el bot a un stub local de la Bot API (tests/cargas)
+TELEGRAM_API_BASE_URL = env("TELEGRAM_API_BASE_URL", default="https://api.telegram.org/bot")
 
 # ============================================
 # CONFIGURACIÓN DE LOGGING
@@ -1,4 +1,8 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .exportacion import MAX_EXPORTACION_ADMIN, zip_en_stream
 from .models import Presupuesto, PresupuestoItem
 
 
@@ -15,6 +19,7 @@ class PresupuestoAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'notas')
     readonly_fields = ('fecha_creacion', 'fecha_actualizacion', 'total')
     inlines = [PresupuestoItemInline]
+    actions = ['exportar_pdfs']
     
     fieldsets = (
         ('Información General', {
@@ -27,3 +32,21 @@ class PresupuestoAdmin(admin.ModelAdmin):
             'fields': ('notas',)
         }),
     )
+
+    @admin.action(description='Exportar PDFs seleccionados (ZIP)')
+    def exportar_pdfs(self, request, queryset):
+        cantidad = queryset.count()
+        if cantidad > MAX_EXPORTACION_ADMIN:
+            self.message_user(
+                request,
+                f'Seleccionaste {cantidad} presupuestos y desde el admin se exportan hasta '
+                f'{MAX_EXPORTACION_ADMIN}. Para más, usar "python manage.py exportar_presupuestos '
+                f'salida.zip --desde AAAA-MM-DD --hasta AAAA-MM-DD".',
+                messages.WARNING,
+            )
+            return None
+        # En este proceso (sin pool) y enviando cada PDF a medida que está listo
+        response = StreamingHttpResponse(zip_en_stream(queryset, procesos=1), content_type='application/zip')
+        nombre = f'presupuestos_{timezone.now():%Y%m%d_%H%M}.zip'
+        response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+        return response
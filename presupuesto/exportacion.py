@@ -0,0 +1,137 @@
+"""
+Exportación masiva de presupuestos en PDF (ZIP).
+
+El proceso principal lee los presupuestos en bloques (con sus items
+prefetcheados) y reparte el render de ReportLab, que es CPU, en un
+`ProcessPoolExecutor`. Cada worker escribe su PDF en la cache en disco de
+presupuesto/pdf.py, así que los ya renderizados no se repiten y las
+descargas posteriores los reutilizan.
+
+Los PDFs se agregan al ZIP a medida que terminan, con una ventana acotada
+de trabajos en vuelo: la memoria no depende de la cantidad de presupuestos.
+`zip_en_stream` produce el ZIP por partes para un `StreamingHttpResponse`;
+`exportar_a_archivo` lo escribe en disco.
+
+Con un solo proceso se renderiza en el proceso actual, sin pool: es lo que
+usa la acción del admin, acotada a `MAX_EXPORTACION_ADMIN` presupuestos
+(ver presupuesto/admin.py). Las exportaciones grandes van por
+``manage.py exportar_presupuestos``.
+"""
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+
+from . import pdf
+
+TAMANO_BLOQUE = 200
+# Más que esto no entra en el timeout de un request: usar el comando
+MAX_EXPORTACION_ADMIN = 50
+
+
+def _renderizar(presupuesto, items, ruta):
+    if not ruta.exists():
+        pdf._guardar(ruta, pdf.renderizar(presupuesto, items))
+    return ruta
+
+
+def procesos_por_defecto():
+    return os.cpu_count() or 1
+
+
+def pdfs_en_paralelo(queryset, procesos=None):
+    """
+    Genera (nombre en el ZIP, ruta del PDF) a medida que los PDFs están
+    listos. Los que ya están en cache no pasan por el pool.
+    """
+    procesos = procesos or procesos_por_defecto()
+    en_vuelo_max = procesos * 2
+    presupuestos = (
+        queryset.select_related('user').prefetch_related(pdf.items_prefetch())
+        .order_by('id').iterator(chunk_size=TAMANO_BLOQUE)
+    )
+
+    # Se crea con el primer PDF que falta: una exportación ya cacheada no
+    # paga el arranque de los procesos
+    executor = None
+    en_vuelo = {}
+    try:
+        for presupuesto in presupuestos:
+            items = pdf.items_prefetcheados(presupuesto)
+            ruta = pdf.ruta_version(presupuesto, items)
+            nombre = f'presupuesto_{presupuesto.id}.pdf'
+            if ruta.exists():
+                yield nombre, ruta
+                continue
+            if procesos == 1:
+                yield nombre, _renderizar(presupuesto, items, ruta)
+                continue
+
+            if executor is None:
+                executor = ProcessPoolExecutor(
+                    max_workers=procesos,
+                    # spawn: el proceso web tiene hilos y conexiones abiertas. Los
+                    # workers solo cargan los modelos para deserializar; no consultan la base
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=django.setup,
+                )
+            # El worker no necesita el prefetch: se envía liviano
+            presupuesto._prefetched_objects_cache = {}
+            en_vuelo[executor.submit(_renderizar, presupuesto, items, ruta)] = nombre
+            if len(en_vuelo) >= en_vuelo_max:
+                listos, _ = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                for futuro in listos:
+                    yield en_vuelo.pop(futuro), futuro.result()
+
+        while en_vuelo:
+            listos, _ = wait(en_vuelo, return_when=FIRST_COMPLETED)
+            for futuro in listos:
+                yield en_vuelo.pop(futuro), futuro.result()
+    finally:
+        # También si el cliente corta la descarga (el generador se cierra)
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+class _Salida:
+    """Destino no seekable para ZipFile que acumula lo escrito hasta vaciarlo"""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+def zip_en_stream(queryset, procesos=None):
+    """Partes del ZIP para un StreamingHttpResponse"""
+    salida = _Salida()
+    # Los PDFs ya vienen comprimidos: se guardan sin recomprimir
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_STORED) as archivo_zip:
+        for nombre, ruta in pdfs_en_paralelo(queryset, procesos):
+            archivo_zip.write(ruta, nombre)
+            yield salida.vaciar()
+    yield salida.vaciar()
+
+
+def exportar_a_archivo(queryset, destino, procesos=None, progreso=None):
+    """Escribe el ZIP en `destino`. Devuelve la cantidad de PDFs."""
+    total = 0
+    with zipfile.ZipFile(destino, 'w', zipfile.ZIP_STORED) as archivo_zip:
+        for nombre, ruta in pdfs_en_paralelo(queryset, procesos):
+            archivo_zip.write(ruta, nombre)
+            total += 1
+            if progreso:
+                progreso(total)
+    return total
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from presupuesto.exportacion import exportar_a_archivo, procesos_por_defecto
+from presupuesto.models import Presupuesto
+
+
+def _fecha(valor):
+    try:
+        return timezone.make_aware(datetime.strptime(valor, '%Y-%m-%d'))
+    except ValueError:
+        raise CommandError(f'Fecha inválida: {valor} (usar AAAA-MM-DD)')
+
+
+class Command(BaseCommand):
+    help = 'Exporta los PDFs de presupuestos a un ZIP, renderizando en paralelo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('salida', help='Ruta del archivo ZIP a generar')
+        parser.add_argument('--desde', help='Fecha de creación desde (AAAA-MM-DD, inclusive)')
+        parser.add_argument('--hasta', help='Fecha de creación hasta (AAAA-MM-DD, exclusive)')
+        parser.add_argument(
+            '--estado',
+            choices=[estado for estado, _ in Presupuesto.ESTADO_CHOICES],
+            help='Solo presupuestos en este estado',
+        )
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=procesos_por_defecto(),
+            help='Procesos de render (default: cantidad de CPUs)',
+        )
+
+    def handle(self, *args, **options):
+        presupuestos = Presupuesto.objects.all()
+        if options['desde']:
+            presupuestos = presupuestos.filter(fecha_creacion__gte=_fecha(options['desde']))
+        if options['hasta']:
+            presupuestos = presupuestos.filter(fecha_creacion__lt=_fecha(options['hasta']))
+        if options['estado']:
+            presupuestos = presupuestos.filter(estado=options['estado'])
+
+        total = presupuestos.count()
+        self.stdout.write(f"📄 Exportando {total} presupuestos con {options['procesos']} procesos...")
+
+        def progreso(hechos):
+            if hechos % 100 == 0:
+                self.stdout.write(f'   {hechos}/{total}')
+
+        exportados = exportar_a_archivo(
+            presupuestos, options['salida'], procesos=options['procesos'], progreso=progreso
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"✅ {exportados} PDFs exportados a {options['salida']}")
+        )
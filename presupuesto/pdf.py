@@ -0,0 +1,234 @@
+"""
+PDF de presupuestos con cache en disco.
+
+El PDF se renderiza una vez por versión del contenido (items, total,
+estado, notas, cliente y `fecha_actualizacion`) y se guarda en
+``MEDIA_ROOT/presupuestos/<id>-<version>.pdf``. La descarga, el email y
+Telegram leen ese archivo; si el presupuesto cambia, cambia la versión y
+se vuelve a renderizar. Dentro de un proceso un lock por versión evita que
+dos envíos simultáneos (el worker de notificaciones corre en paralelo)
+rendericen lo mismo.
+
+Los estilos de ReportLab se arman una sola vez al importar el módulo.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Prefetch
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .models import PresupuestoItem
+
+ESTILOS = getSampleStyleSheet()
+ESTILO_TITULO = ParagraphStyle(
+    'CustomTitle',
+    parent=ESTILOS['Heading1'],
+    fontSize=24,
+    textColor=colors.HexColor('#2c3e50'),
+    alignment=TA_CENTER,
+    spaceAfter=30,
+)
+ESTILO_SUBTITULO = ParagraphStyle(
+    'CustomSubtitle',
+    parent=ESTILOS['Normal'],
+    fontSize=12,
+    textColor=colors.HexColor('#7f8c8d'),
+    alignment=TA_CENTER,
+    spaceAfter=20,
+)
+ESTILO_FOOTER = ParagraphStyle(
+    'Footer',
+    parent=ESTILOS['Normal'],
+    fontSize=9,
+    textColor=colors.HexColor('#95a5a6'),
+    alignment=TA_CENTER,
+)
+ESTILO_TABLA_INFO = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#ecf0f1')),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#2c3e50')),
+    ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+])
+ESTILO_TABLA_PRODUCTOS = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498db')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 11),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('TEXTCOLOR', (0, 1), (-1, -2), colors.HexColor('#2c3e50')),
+    ('ALIGN', (1, 1), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('GRID', (0, 0), (-1, -2), 0.5, colors.grey),
+    ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#ecf0f1')),
+    ('TEXTCOLOR', (0, -1), (-1, -1), colors.HexColor('#2c3e50')),
+    ('ALIGN', (2, -1), (2, -1), 'RIGHT'),
+    ('FONTNAME', (2, -1), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (2, -1), (-1, -1), 12),
+    ('TOPPADDING', (0, -1), (-1, -1), 12),
+    ('BOTTOMPADDING', (0, -1), (-1, -1), 12),
+    ('LINEABOVE', (0, -1), (-1, -1), 2, colors.HexColor('#3498db')),
+])
+ANCHOS_INFO = [2 * inch, 4 * inch]
+ANCHOS_PRODUCTOS = [3 * inch, 1 * inch, 1.5 * inch, 1.5 * inch]
+
+# Cambiar si cambia el diseño: invalida los PDFs guardados
+VERSION_DISENO = '1'
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def directorio():
+    return Path(settings.MEDIA_ROOT) / 'presupuestos'
+
+
+def _items(presupuesto):
+    return list(
+        presupuesto.items.order_by('id').values_list(
+            'producto__title', 'cantidad', 'precio_unitario', 'subtotal'
+        )
+    )
+
+
+def items_prefetch():
+    """Prefetch de items para lotes; `items_prefetcheados` arma la misma lista que `_items`"""
+    return Prefetch(
+        'items', queryset=PresupuestoItem.objects.select_related('producto').order_by('id')
+    )
+
+
+def items_prefetcheados(presupuesto):
+    return [
+        (item.producto.title, item.cantidad, item.precio_unitario, item.subtotal)
+        for item in presupuesto.items.all()
+    ]
+
+
+def version(presupuesto, items):
+    """Hash del contenido que aparece en el PDF"""
+    user = presupuesto.user
+    partes = [
+        VERSION_DISENO, presupuesto.fecha_actualizacion.isoformat(), presupuesto.estado,
+        presupuesto.total, presupuesto.notas, user.get_full_name(), user.username, user.email,
+        *items,
+    ]
+    return hashlib.sha256(repr(partes).encode()).hexdigest()[:16]
+
+
+def renderizar(presupuesto, items):
+    """Arma el PDF con ReportLab. Devuelve los bytes."""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, pagesize=A4, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30,
+        pageCompression=1, invariant=1,
+    )
+
+    elementos = [
+        Paragraph("PRESUPUESTO", ESTILO_TITULO),
+        Paragraph(f"Presupuesto #{presupuesto.id}", ESTILO_SUBTITULO),
+        Spacer(1, 0.3 * inch),
+    ]
+
+    info_data = [
+        ['Cliente:', presupuesto.user.get_full_name() or presupuesto.user.username],
+        ['Email:', presupuesto.user.email],
+        ['Fecha:', presupuesto.fecha_creacion.strftime('%d/%m/%Y %H:%M')],
+        ['Estado:', presupuesto.get_estado_display()],
+    ]
+    tabla_info = Table(info_data, colWidths=ANCHOS_INFO)
+    tabla_info.setStyle(ESTILO_TABLA_INFO)
+    elementos += [
+        tabla_info,
+        Spacer(1, 0.4 * inch),
+        Paragraph("Detalle de Productos", ESTILOS['Heading2']),
+        Spacer(1, 0.2 * inch),
+    ]
+
+    datos_tabla = [['Producto', 'Cantidad', 'Precio Unit.', 'Subtotal']]
+    for titulo, cantidad, precio_unitario, subtotal in items:
+        datos_tabla.append([titulo, str(cantidad), f"${precio_unitario:,.2f}", f"${subtotal:,.2f}"])
+    datos_tabla.append(['', '', 'TOTAL:', f"${presupuesto.total:,.2f}"])
+
+    tabla_productos = Table(datos_tabla, colWidths=ANCHOS_PRODUCTOS)
+    tabla_productos.setStyle(ESTILO_TABLA_PRODUCTOS)
+    elementos.append(tabla_productos)
+
+    if presupuesto.notas:
+        elementos += [
+            Spacer(1, 0.3 * inch),
+            Paragraph("Notas:", ESTILOS['Heading3']),
+            Paragraph(presupuesto.notas, ESTILOS['Normal']),
+        ]
+
+    elementos += [
+        Spacer(1, 0.5 * inch),
+        Paragraph("Gracias por su preferencia", ESTILO_FOOTER),
+        Paragraph("Este presupuesto tiene validez de 30 días", ESTILO_FOOTER),
+    ]
+
+    doc.build(elementos)
+    return buffer.getvalue()
+
+
+def _guardar(ruta, contenido):
+    """Escribe en un temporal y renombra: un lector nunca ve archivos a medias"""
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(contenido)
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+
+def _lock(clave):
+    with _locks_lock:
+        return _locks.setdefault(clave, threading.Lock())
+
+
+def ruta_version(presupuesto, items):
+    return directorio() / f'{presupuesto.id}-{version(presupuesto, items)}.pdf'
+
+
+def ruta_pdf(presupuesto):
+    """Ruta del PDF de la versión actual, renderizándolo si no existe"""
+    items = _items(presupuesto)
+    ruta = ruta_version(presupuesto, items)
+    if ruta.exists():
+        return ruta
+
+    clave = ruta.stem
+    with _lock(clave):
+        if not ruta.exists():
+            _guardar(ruta, renderizar(presupuesto, items))
+            # Versiones anteriores del mismo presupuesto
+            for vieja in directorio().glob(f'{presupuesto.id}-*.pdf'):
+                if vieja != ruta:
+                    vieja.unlink(missing_ok=True)
+    with _locks_lock:
+        _locks.pop(clave, None)
+    return ruta
+
+
+def obtener_pdf(presupuesto):
+    """Bytes del PDF (cacheado) del presupuesto"""
+    return ruta_pdf(presupuesto).read_bytes()
@@ -0,0 +1,54 @@
+"""
+Exportación de PDFs desde el admin.
+
+Los PDFs se escriben en un MEDIA_ROOT temporal por test.
+"""
+import io
+import tempfile
+import zipfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .models import Presupuesto
+
+
+class ExportarPDFsAdminTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ajuste = override_settings(MEDIA_ROOT=media.name)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+        # El acceso al admin sale del perfil (ver usuarios/models.py)
+        self.admin = User.objects.create_user('admin')
+        self.admin.profile.is_admin = True
+        self.admin.profile.save()
+        self.client.force_login(self.admin)
+        self.presupuestos = [Presupuesto.objects.create(user=self.admin, total=100) for _ in range(3)]
+
+    def _exportar(self, **kwargs):
+        return self.client.post(reverse('admin:presupuesto_presupuesto_changelist'), {
+            'action': 'exportar_pdfs',
+            '_selected_action': [p.pk for p in self.presupuestos],
+        }, **kwargs)
+
+    def test_seleccion_chica_se_descarga_sin_pool(self):
+        with mock.patch('presupuesto.exportacion.ProcessPoolExecutor') as pool:
+            respuesta = self._exportar()
+            contenido = b''.join(respuesta.streaming_content)
+
+        pool.assert_not_called()
+        self.assertEqual(respuesta['Content-Type'], 'application/zip')
+        nombres = zipfile.ZipFile(io.BytesIO(contenido)).namelist()
+        self.assertEqual(sorted(nombres), sorted(f'presupuesto_{p.pk}.pdf' for p in self.presupuestos))
+
+    def test_seleccion_grande_deriva_al_comando(self):
+        with mock.patch('presupuesto.admin.MAX_EXPORTACION_ADMIN', 2):
+            respuesta = self._exportar(follow=True)
+
+        self.assertNotEqual(respuesta.get('Content-Type'), 'application/zip')
+        self.assertContains(respuesta, 'exportar_presupuestos')
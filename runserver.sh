@@ -26,6 +26,12 @@ python3 manage.py migrate --check > /dev/null 2>&1 || {
     python3 manage.py migrate
 }
 
+# Worker de notificaciones (email/Telegram) en segundo plano
+echo "📬 Iniciando worker de notificaciones..."
+python3 manage.py despachar_notificaciones &
+WORKER_PID=$!
+trap "kill $WORKER_PID 2>/dev/null" EXIT
+
 # Iniciar servidor
 echo "🌐 Iniciando servidor en http://localhost:$PUERTO"
 echo "📝 OAuth configurado para:"
@@ -1,6 +1,12 @@
 from django.contrib import admin
-from .models import ChatMessage
+from .models import ChatMessage, ChatMessageArchivo
 
 @admin.register(ChatMessage)
 class ChatMessageAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "text", "created_at")
+
+
+@admin.register(ChatMessageArchivo)
+class ChatMessageArchivoAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "text", "created_at", "archivado_at")
+    list_select_related = ("user",)
@@ -0,0 +1,177 @@
+"""
+Historial acotado del chat con un ring buffer por proceso.
+
+`buffer_reciente` guarda los últimos `CAPACIDAD` mensajes ya serializados
+(un sufijo contiguo de la tabla por id). Se carga de la base la primera vez
+y `post_message_api` le agrega cada mensaje nuevo. Si el cache indica un
+mensaje más nuevo que el último del buffer (publicado por otro proceso),
+se trae lo que falta antes de responder.
+
+Lo que el buffer no cubre (páginas viejas con `before_id`, reconexiones
+muy atrasadas) se lee de la base con `select_related('user')` y con límite.
+
+Los ids no se confirman en orden: dos posts concurrentes pueden confirmar
+el 102 antes que el 101. Un mensaje que llega tarde se inserta en su lugar
+del buffer y, mientras haya un hueco de ids reciente (menos de `GRACIA`),
+cada sincronización vuelve a leer desde antes del hueco y lo posterior al
+hueco no se entrega: los clientes avanzan su cursor por id y si recibieran
+el 102 nunca pedirían el 101. Pasada la gracia, el hueco es un rollback.
+"""
+import bisect
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import ChatMessage
+from .pubsub import ULTIMO_ID_KEY
+
+CAPACIDAD = 200
+LIMITE_DEFAULT = 50
+LIMITE_MAX = 200
+# Más que cualquier transacción de `post_message_api`
+GRACIA = timedelta(seconds=5)
+
+
+def serializar(m):
+    return {
+        "id": m.id,
+        "user": m.user.username if m.user else "Anónimo",
+        "text": m.text,
+        "created_at": m.created_at.isoformat(),
+    }
+
+
+def _primer_hueco(mensajes, after_id=None):
+    """
+    Índice del primer mensaje precedido por un hueco de ids todavía reciente
+    (o None). Solo se revisan los mensajes de los últimos `GRACIA` segundos.
+    """
+    limite = timezone.now() - GRACIA
+    inicio = len(mensajes)
+    while inicio > 0 and datetime.fromisoformat(mensajes[inicio - 1]['created_at']) > limite:
+        inicio -= 1
+    previo = mensajes[inicio - 1]['id'] if inicio else after_id
+    for i in range(inicio, len(mensajes)):
+        if previo is not None and mensajes[i]['id'] != previo + 1:
+            return i
+        previo = mensajes[i]['id']
+    return None
+
+
+def _hasta_hueco(mensajes, after_id=None):
+    """Lo que se puede entregar: hasta el primer hueco reciente"""
+    hueco = _primer_hueco(mensajes, after_id)
+    return mensajes if hueco is None else mensajes[:hueco]
+
+
+def _consulta():
+    return ChatMessage.objects.select_related('user')
+
+
+def _de_la_base(after_id=None, before_id=None, limite=LIMITE_DEFAULT):
+    """Hasta `limite` mensajes en orden cronológico; los más nuevos si hay `before_id` o ninguno"""
+    qs = _consulta()
+    if after_id:
+        return [serializar(m) for m in qs.filter(id__gt=after_id).order_by('id')[:limite]]
+    if before_id:
+        qs = qs.filter(id__lt=before_id)
+    return [serializar(m) for m in reversed(qs.order_by('-id')[:limite])]
+
+
+class BufferReciente:
+    def __init__(self, capacidad=CAPACIDAD):
+        self.capacidad = capacidad
+        self._mensajes = deque(maxlen=capacidad)
+        # True si el buffer tiene todo el historial (la tabla es chica)
+        self._completo = False
+        self._cargado = False
+        self._lock = threading.Lock()
+
+    def _cargar(self):
+        mensajes = _de_la_base(limite=self.capacidad)
+        self._mensajes = deque(mensajes, maxlen=self.capacidad)
+        self._completo = len(mensajes) < self.capacidad
+        self._cargado = True
+
+    def _ultimo_id(self):
+        return self._mensajes[-1]['id'] if self._mensajes else 0
+
+    def _sincronizar(self):
+        if not self._cargado:
+            self._cargar()
+            return
+        hueco = _primer_hueco(self._mensajes)
+        if hueco is not None:
+            # Se relee desde antes del hueco: puede haberse confirmado lo que falta
+            desde_id = self._mensajes[hueco - 1]['id'] if hueco else 0
+        elif (cache.get(ULTIMO_ID_KEY) or 0) > self._ultimo_id():
+            desde_id = self._ultimo_id()
+        else:
+            return
+        faltantes = _de_la_base(after_id=desde_id, limite=self.capacidad + 1)
+        if len(faltantes) > self.capacidad:
+            self._cargar()
+        else:
+            self._agregar(faltantes)
+
+    def _agregar(self, mensajes):
+        for mensaje in mensajes:
+            if mensaje['id'] > self._ultimo_id():
+                if len(self._mensajes) == self.capacidad:
+                    self._completo = False
+                self._mensajes.append(mensaje)
+            elif self._completo or (self._mensajes and mensaje['id'] > self._mensajes[0]['id']):
+                # Confirmado tarde: va en su lugar, si no estaba
+                ids = [m['id'] for m in self._mensajes]
+                posicion = bisect.bisect_left(ids, mensaje['id'])
+                if posicion < len(ids) and ids[posicion] == mensaje['id']:
+                    continue
+                if len(self._mensajes) == self.capacidad:
+                    self._mensajes.popleft()
+                    self._completo = False
+                    posicion -= 1
+                self._mensajes.insert(max(posicion, 0), mensaje)
+
+    def agregar(self, mensaje):
+        """Mensaje recién creado en este proceso"""
+        with self._lock:
+            if self._cargado:
+                self._sincronizar()
+                self._agregar([mensaje])
+
+    def ultimos(self, limite=LIMITE_DEFAULT, before_id=None):
+        """
+        Devuelve (mensajes, hay_mas): hasta `limite` mensajes anteriores a
+        `before_id` (o los últimos), en orden cronológico
+        """
+        with self._lock:
+            self._sincronizar()
+            mensajes = list(self._mensajes)
+            completo = self._completo
+        if before_id:
+            mensajes = [m for m in mensajes if m['id'] < before_id]
+        if not (completo or len(mensajes) > limite):
+            # El buffer no alcanza a cubrir la página
+            mensajes = _de_la_base(before_id=before_id, limite=limite + 1)
+        hay_mas = len(mensajes) > limite
+        mensajes = mensajes[-limite:]
+        # Las páginas viejas no tienen huecos recientes
+        return (mensajes if before_id else _hasta_hueco(mensajes)), hay_mas
+
+    def desde(self, after_id, limite=LIMITE_MAX):
+        """Hasta `limite` mensajes posteriores a `after_id`, en orden cronológico"""
+        with self._lock:
+            self._sincronizar()
+            mensajes = list(self._mensajes)
+            completo = self._completo
+        if completo or (mensajes and mensajes[0]['id'] <= after_id + 1):
+            nuevos = [m for m in mensajes if m['id'] > after_id][:limite]
+        else:
+            nuevos = _de_la_base(after_id=after_id, limite=limite)
+        return _hasta_hueco(nuevos, after_id)
+
+
+buffer_reciente = BufferReciente()
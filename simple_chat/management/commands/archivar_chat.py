@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from simple_chat.models import ChatMessage, ChatMessageArchivo
+
+
+class Command(BaseCommand):
+    help = 'Mueve los mensajes del chat más viejos que la retención a ChatMessageArchivo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=90,
+            help='Días de historial que quedan en el chat (default: 90)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=1000,
+            help='Mensajes movidos por transacción (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        corte = timezone.now() - timedelta(days=options['dias'])
+        self.stdout.write(f'🗄️ Archivando mensajes anteriores a {corte:%d/%m/%Y}...')
+
+        total = 0
+        while True:
+            with transaction.atomic():
+                lote = list(
+                    ChatMessage.objects.filter(created_at__lt=corte)
+                    .order_by('id').select_for_update()[:options['lote']]
+                )
+                if not lote:
+                    break
+                ChatMessageArchivo.objects.bulk_create(
+                    [
+                        ChatMessageArchivo(id=m.id, user_id=m.user_id, text=m.text, created_at=m.created_at)
+                        for m in lote
+                    ],
+                    ignore_conflicts=True,
+                )
+                ChatMessage.objects.filter(id__in=[m.id for m in lote]).delete()
+            total += len(lote)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} mensajes archivados'))
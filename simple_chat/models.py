@@ -12,6 +12,31 @@ class ChatMessage(models.Model):
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [
+            # Corte por antigüedad de `archivar_chat`
+            models.Index(fields=["created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.text[:30]}"
+
+
+class ChatMessageArchivo(models.Model):
+    """Mensajes viejos movidos fuera de la tabla del chat (conservan el id)"""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    text = models.TextField()
+    created_at = models.DateTimeField(db_index=True)
+    archivado_at = models.DateTimeField(auto_now_add=True)
+
     class Meta:
         ordering = ["created_at"]
 
@@ -0,0 +1,65 @@
+"""
+Pub/sub en proceso para el chat.
+
+Cada conexión SSE (ver `views.stream_api`) se suscribe con una cola de
+asyncio en el loop del servidor ASGI; `post_message_api` publica el mensaje
+nuevo desde su hilo con `call_soon_threadsafe`. Una conexión que no da
+abasto recibe `None` en lugar de los mensajes perdidos y se pone al día
+desde la base.
+
+Solo llega a las conexiones del mismo proceso: para los otros workers el
+stream compara `ULTIMO_ID_KEY` (cache) en cada heartbeat y, si hay algo
+nuevo, lo trae de la base.
+"""
+import asyncio
+import threading
+
+from django.core.cache import cache
+
+ULTIMO_ID_KEY = 'simple_chat:ultimo_id'
+MAX_PENDIENTES = 100
+
+
+def _encolar(cola, mensaje):
+    try:
+        cola.put_nowait(mensaje)
+    except asyncio.QueueFull:
+        # Se descarta lo pendiente y se avisa que hay que recargar
+        while not cola.empty():
+            cola.get_nowait()
+        cola.put_nowait(None)
+
+
+class Canal:
+    def __init__(self):
+        self._suscriptores = set()
+        self._lock = threading.Lock()
+
+    def suscribir(self):
+        """Debe llamarse desde el loop que va a consumir la cola"""
+        suscripcion = (asyncio.get_running_loop(), asyncio.Queue(maxsize=MAX_PENDIENTES))
+        with self._lock:
+            self._suscriptores.add(suscripcion)
+        return suscripcion
+
+    def desuscribir(self, suscripcion):
+        with self._lock:
+            self._suscriptores.discard(suscripcion)
+
+    def publicar(self, mensaje):
+        """Thread-safe: se puede llamar desde vistas sincrónicas"""
+        # Un mensaje confirmado tarde (id menor) no hace retroceder el último id
+        if mensaje['id'] > (cache.get(ULTIMO_ID_KEY) or 0):
+            cache.set(ULTIMO_ID_KEY, mensaje['id'], None)
+        with self._lock:
+            suscriptores = list(self._suscriptores)
+        for suscripcion in suscriptores:
+            loop, cola = suscripcion
+            try:
+                loop.call_soon_threadsafe(_encolar, cola, mensaje)
+            except RuntimeError:
+                # Loop cerrado: la conexión ya no existe
+                self.desuscribir(suscripcion)
+
+
+canal = Canal()
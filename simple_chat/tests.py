@@ -0,0 +1,84 @@
+"""
+Historial del chat con ids confirmados fuera de orden.
+
+Un mensaje "sin confirmar" se simula ocultándolo de las lecturas de la base
+hasta que el test lo confirma.
+"""
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+
+from . import historial
+from .historial import BufferReciente, serializar
+from .models import ChatMessage
+from .pubsub import ULTIMO_ID_KEY
+
+
+class HistorialFueraDeOrdenTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('charla')
+        self.previos = [ChatMessage.objects.create(user=self.user, text=f'previo {i}') for i in range(3)]
+        self.ultimo = self.previos[-1].id
+        self.sin_confirmar = set()
+
+        de_la_base = historial._de_la_base
+
+        def visibles(*args, **kwargs):
+            return [m for m in de_la_base(*args, **kwargs) if m['id'] not in self.sin_confirmar]
+
+        parche = mock.patch.object(historial, '_de_la_base', side_effect=visibles)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+        self.buffer = BufferReciente()
+        self.buffer.ultimos()
+
+    def _publicar(self, mensaje):
+        """Lo que hace post_message_api al confirmar"""
+        self.sin_confirmar.discard(mensaje.id)
+        self.buffer.agregar(serializar(mensaje))
+        if mensaje.id > (cache.get(ULTIMO_ID_KEY) or 0):
+            cache.set(ULTIMO_ID_KEY, mensaje.id, None)
+
+    def _ids(self, mensajes):
+        return [m['id'] for m in mensajes]
+
+    def test_lo_posterior_a_un_hueco_reciente_se_retiene(self):
+        primero = ChatMessage.objects.create(user=self.user, text='uno')
+        segundo = ChatMessage.objects.create(user=self.user, text='dos')
+        self.sin_confirmar.add(primero.id)
+
+        self._publicar(segundo)
+        # Si el cliente recibiera el segundo, su cursor saltearía al primero
+        self.assertEqual(self.buffer.desde(self.ultimo), [])
+        self.assertEqual(self._ids(self.buffer.ultimos()[0]), [m.id for m in self.previos])
+
+        self._publicar(primero)
+        self.assertEqual(self._ids(self.buffer.desde(self.ultimo)), [primero.id, segundo.id])
+
+    def test_otro_proceso_relee_el_hueco(self):
+        primero = ChatMessage.objects.create(user=self.user, text='uno')
+        segundo = ChatMessage.objects.create(user=self.user, text='dos')
+        self.sin_confirmar.add(primero.id)
+        # Publicados por otro proceso: este buffer solo ve la base y el cache
+        cache.set(ULTIMO_ID_KEY, segundo.id, None)
+        self.assertEqual(self.buffer.desde(self.ultimo), [])
+
+        self.sin_confirmar.discard(primero.id)
+        self.assertEqual(self._ids(self.buffer.desde(self.ultimo)), [primero.id, segundo.id])
+        self.assertEqual(self._ids(self.buffer.ultimos()[0])[-2:], [primero.id, segundo.id])
+
+    def test_hueco_vencido_es_un_rollback(self):
+        descartado = ChatMessage.objects.create(user=self.user, text='rollback')
+        descartado.delete()
+        siguiente = ChatMessage.objects.create(user=self.user, text='sigue')
+
+        self._publicar(siguiente)
+        self.assertEqual(self.buffer.desde(self.ultimo), [])
+
+        with mock.patch.object(historial, 'GRACIA', timedelta(0)):
+            self.assertEqual(self._ids(self.buffer.desde(self.ultimo)), [siguiente.id])
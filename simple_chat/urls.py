@@ -7,6 +7,7 @@ urlpatterns = [
 
     path("", views.chat_view, name="chat"),
     path("api/messages/", views.messages_api, name="messages-api"),
+    path("api/stream/", views.stream_api, name="stream-api"),
     path("api/post/", views.post_message_api, name="post-api"),
 
                 ]
\ No newline at end of file
@@ -1,8 +1,37 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 from .models import ChatMessage
+from .historial import GRACIA, LIMITE_DEFAULT, LIMITE_MAX, buffer_reciente, serializar
+from .pubsub import ULTIMO_ID_KEY, canal
+
+# Segundos sin mensajes entre comentarios keep-alive del stream
+HEARTBEAT = 20
+# Espera de EventSource antes de reconectar (en WSGI, cada respuesta termina)
+RETRY_MS = 2000
+
+
+def pendientes(ultimo_id):
+    """Lo que falta a un cliente: los últimos mensajes si recién entra"""
+    if not ultimo_id:
+        return buffer_reciente.ultimos()[0]
+    return buffer_reciente.desde(ultimo_id)
+
+
+def _id(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return 0
+
 
 @login_required
 def chat_view(request):
@@ -10,20 +39,94 @@ def chat_view(request):
 
 @login_required
 def messages_api(request):
-    after = request.GET.get("after_id")
-    qs = ChatMessage.objects.all().order_by('created_at')
-    if after:
-        qs = qs.filter(id__gt=int(after))
-    msgs = [
-        {
-            "id": m.id,
-            "user": m.user.username if m.user else "Anónimo",
-            "text": m.text,
-            "created_at": m.created_at.isoformat(),
-        }
-        for m in qs
-    ]
-    return JsonResponse({"messages": msgs})
+    """
+    Historial acotado: `after_id` devuelve lo nuevo (hasta LIMITE_MAX);
+    si no, los últimos `limit` mensajes, o los anteriores a `before_id`
+    """
+    after_id = _id(request.GET.get("after_id"))
+    if after_id:
+        return JsonResponse({"messages": buffer_reciente.desde(after_id)})
+    limite = min(_id(request.GET.get("limit")) or LIMITE_DEFAULT, LIMITE_MAX)
+    mensajes, hay_mas = buffer_reciente.ultimos(limite, _id(request.GET.get("before_id")))
+    return JsonResponse({"messages": mensajes, "has_more": hay_mas})
+
+
+def _evento(mensaje):
+    return f"id: {mensaje['id']}\ndata: {json.dumps(mensaje)}\n\n"
+
+
+async def _stream(ultimo_id):
+    """Mensajes posteriores a `ultimo_id`, luego los nuevos a medida que llegan"""
+    # Suscribirse antes de leer la base: nada publicado en el medio se pierde
+    suscripcion = canal.suscribir()
+    _, cola = suscripcion
+    # Id más alto publicado: si supera a `ultimo_id` hay mensajes retenidos
+    # detrás de un hueco (ver historial.py) y se reintenta pronto
+    visto = ultimo_id
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        nuevos = await sync_to_async(pendientes)(ultimo_id)
+        while True:
+            for mensaje in nuevos:
+                if mensaje['id'] > ultimo_id:
+                    yield _evento(mensaje)
+                    ultimo_id = mensaje['id']
+            visto = max(visto, ultimo_id)
+            if len(nuevos) == LIMITE_MAX:
+                # Catch-up largo: se sigue por tandas
+                nuevos = await sync_to_async(pendientes)(ultimo_id)
+                continue
+
+            espera = HEARTBEAT if visto <= ultimo_id else GRACIA.total_seconds() / 2
+            try:
+                mensaje = await asyncio.wait_for(cola.get(), espera)
+            except asyncio.TimeoutError:
+                # Mensajes publicados por otros procesos
+                ultimo_global = await sync_to_async(cache.get)(ULTIMO_ID_KEY) or 0
+                if max(ultimo_global, visto) <= ultimo_id:
+                    yield ": ping\n\n"
+                    nuevos = []
+                    continue
+                mensaje = None
+
+            if mensaje is not None and mensaje['id'] == ultimo_id + 1 and visto <= ultimo_id:
+                nuevos = [mensaje]
+            else:
+                # Desborde, hueco en los ids o mensaje confirmado tarde: se
+                # completa desde el historial
+                if mensaje is not None:
+                    visto = max(visto, mensaje['id'])
+                nuevos = await sync_to_async(pendientes)(ultimo_id)
+    finally:
+        canal.desuscribir(suscripcion)
+
+
+def _catch_up(ultimo_id):
+    yield f"retry: {RETRY_MS}\n\n"
+    for mensaje in pendientes(ultimo_id):
+        yield _evento(mensaje)
+
+
+@login_required
+def stream_api(request):
+    """
+    Server-sent events del chat. Al reconectar, EventSource manda
+    Last-Event-ID y se recupera lo perdido desde el historial.
+
+    En ASGI la conexión queda abierta y recibe los mensajes al publicarse;
+    en WSGI (runserver) responde lo pendiente y cierra, y EventSource
+    reconecta cada `RETRY_MS` (equivale al polling anterior). En producción
+    se sirve ecommerce.asgi (ver render.yaml).
+    """
+    ultimo_id = _id(request.headers.get("Last-Event-ID") or request.GET.get("after_id"))
+    if isinstance(request, ASGIRequest):
+        eventos = _stream(ultimo_id)
+    else:
+        eventos = _catch_up(ultimo_id)
+    response = StreamingHttpResponse(eventos, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 @require_POST
 @login_required
@@ -34,10 +137,16 @@ def post_message_api(request):
         return JsonResponse({"error": "Mensaje vacío"}, status=400)
     if len(text) > 500:
         return JsonResponse({"error": "Mensaje muy largo"}, status=400)
-    
+
     m = ChatMessage.objects.create(user=user, text=text)
+    mensaje = serializar(m)
+
+    def difundir():
+        buffer_reciente.agregar(mensaje)
+        canal.publicar(mensaje)
+    transaction.on_commit(difundir)
     return JsonResponse({
-        "id": m.id, 
+        "id": m.id,
         "created_at": m.created_at.isoformat(),
         "success": True
     })
@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Difusion
+
+
+@admin.register(Difusion)
+class DifusionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'estado', 'enviados', 'fallidos', 'total', 'created_at', 'finalizada_at')
+    list_filter = ('estado',)
+    readonly_fields = ('ultimo_profile_id', 'total', 'enviados', 'fallidos', 'iniciada_at', 'finalizada_at')
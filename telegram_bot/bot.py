@@ -5,7 +5,6 @@ Maneja notificaciones de presupuestos y pedidos
 
 import asyncio
 import logging
-from io import BytesIO
 from typing import Optional
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -250,13 +249,9 @@ Usa `/help` para más información.
         # Manejar mensajes desconocidos
         self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.unknown_command))
     
-    async def enviar_presupuesto(self, chat_id: str, presupuesto, pdf_buffer: BytesIO):
-        """Enviar notificación de presupuesto con PDF"""
-        try:
-            if not self.application:
-                return False
-                
-            message = f"""
+    def mensaje_presupuesto(self, presupuesto) -> str:
+        """Texto de la notificación de presupuesto (consulta la base: llamar fuera del loop)"""
+        return f"""
 📋 **¡Nuevo Presupuesto Generado!**
 
 **Presupuesto #{presupuesto.id}**
@@ -268,56 +263,30 @@ Estado: {presupuesto.get_estado_display()}
 
 📎 **PDF adjunto** ⬇️
             """
-            
-            # Enviar mensaje
-            await self.application.bot.send_message(
-                chat_id=chat_id,
-                text=message,
-                parse_mode=ParseMode.MARKDOWN
-            )
-            
-            # Enviar PDF
-            pdf_buffer.seek(0)
-            await self.application.bot.send_document(
-                chat_id=chat_id,
-                document=pdf_buffer,
-                filename=f"presupuesto_{presupuesto.id}.pdf",
-                caption=f"📄 Presupuesto #{presupuesto.id} - ${presupuesto.total}"
-            )
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error enviando presupuesto por Telegram: {e}")
-            return False
     
-    async def enviar_pedido(self, chat_id: str, pedido, accion: str):
-        """Enviar notificación de pedido"""
-        try:
-            if not self.application:
-                return False
-            
-            # Configurar mensajes según la acción
-            emojis = {
-                'creado': '🎉',
-                'procesando': '⚙️',
-                'enviado': '🚚',
-                'entregado': '✅',
-                'cancelado': '❌'
-            }
-            
-            titulos = {
-                'creado': '¡Pedido Confirmado!',
-                'procesando': 'Pedido en Preparación',
-                'enviado': '¡Pedido Enviado!',
-                'entregado': '¡Pedido Entregado!',
-                'cancelado': 'Pedido Cancelado'
-            }
-            
-            emoji = emojis.get(accion, '📦')
-            titulo = titulos.get(accion, 'Actualización de Pedido')
-            
-            message = f"""
+    def mensaje_pedido(self, pedido, accion: str) -> str:
+        """Texto de la notificación de pedido (consulta la base: llamar fuera del loop)"""
+        # Configurar mensajes según la acción
+        emojis = {
+            'creado': '🎉',
+            'procesando': '⚙️',
+            'enviado': '🚚',
+            'entregado': '✅',
+            'cancelado': '❌'
+        }
+        
+        titulos = {
+            'creado': '¡Pedido Confirmado!',
+            'procesando': 'Pedido en Preparación',
+            'enviado': '¡Pedido Enviado!',
+            'entregado': '¡Pedido Entregado!',
+            'cancelado': 'Pedido Cancelado'
+        }
+        
+        emoji = emojis.get(accion, '📦')
+        titulo = titulos.get(accion, 'Actualización de Pedido')
+        
+        return f"""
 {emoji} **{titulo}**
 
 **Pedido #{pedido.id}**
@@ -328,18 +297,6 @@ Estado: {presupuesto.get_estado_display()}
 
 {self._get_mensaje_estado(accion)}
             """
-            
-            await self.application.bot.send_message(
-                chat_id=chat_id,
-                text=message,
-                parse_mode=ParseMode.MARKDOWN
-            )
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error enviando notificación de pedido: {e}")
-            return False
     
     def _get_mensaje_estado(self, accion: str) -> str:
         """Obtener mensaje específico según el estado"""
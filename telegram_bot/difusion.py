@@ -0,0 +1,195 @@
+"""
+Difusión masiva por Telegram ("Ofertas especiales").
+
+Los perfiles con `telegram_chat_id` se recorren por id en lotes; cada lote
+se envía en el loop del sender compartido (ver sender.py) a través de un
+limitador token-bucket que respeta el límite global de la Bot API (~30
+mensajes/s) y el de un mensaje por segundo por chat. Un `RetryAfter`
+pausa a todos los envíos el tiempo que indica Telegram.
+
+Al terminar cada lote se guarda el último id procesado y los contadores en
+`Difusion`, así que una difusión interrumpida se reanuda sin reenviar. Un
+error inesperado en un chat cuenta como fallido y no corta el lote.
+
+El mensaje lo escribe un admin: se envía como texto plano, sin parse_mode,
+para que un `*` o `_` suelto no haga fallar a todos los destinatarios.
+"""
+import asyncio
+import logging
+import time
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError, TimedOut
+
+from usuarios.models import Profile
+from .models import Difusion
+from .sender import get_sender
+
+logger = logging.getLogger(__name__)
+
+TASA_GLOBAL = 25  # mensajes/s, por debajo del límite de ~30 de Telegram
+INTERVALO_POR_CHAT = 1.0  # segundos entre mensajes a un mismo chat
+TAMANO_LOTE = 100
+CONCURRENCIA = 20
+MAX_REINTENTOS = 3
+
+
+class TokenBucket:
+    """Token bucket asíncrono. `pausar()` frena a todos los consumidores."""
+
+    def __init__(self, tasa, capacidad=None):
+        self.tasa = tasa
+        self.capacidad = capacidad or tasa
+        self.tokens = self.capacidad
+        self.actualizado = time.monotonic()
+        self.pausa_hasta = 0.0
+        self._lock = None
+
+    async def adquirir(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                ahora = time.monotonic()
+                if ahora < self.pausa_hasta:
+                    await asyncio.sleep(self.pausa_hasta - ahora)
+                    continue
+                self.tokens = min(self.capacidad, self.tokens + (ahora - self.actualizado) * self.tasa)
+                self.actualizado = ahora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.tasa)
+
+    def pausar(self, segundos):
+        self.pausa_hasta = max(self.pausa_hasta, time.monotonic() + segundos)
+        self.tokens = 0
+
+
+class LimitadorTelegram:
+    """Límite global (token bucket) más un intervalo mínimo por chat"""
+
+    def __init__(self, tasa_global=TASA_GLOBAL, intervalo_por_chat=INTERVALO_POR_CHAT):
+        self.global_ = TokenBucket(tasa_global)
+        self.intervalo_por_chat = intervalo_por_chat
+        self._ultimo_por_chat = {}
+
+    async def adquirir(self, chat_id):
+        ultimo = self._ultimo_por_chat.get(chat_id)
+        if ultimo is not None:
+            espera = ultimo + self.intervalo_por_chat - time.monotonic()
+            if espera > 0:
+                await asyncio.sleep(espera)
+        await self.global_.adquirir()
+        self._ultimo_por_chat[chat_id] = time.monotonic()
+
+    def pausar(self, segundos):
+        self.global_.pausar(segundos)
+
+
+def _segundos(retry_after):
+    return retry_after.total_seconds() if isinstance(retry_after, timedelta) else float(retry_after)
+
+
+async def _enviar_uno(bot, limitador, chat_id, texto):
+    """Envía a un chat respetando límites. True si llegó, False si no se puede."""
+    for intento in range(MAX_REINTENTOS + 1):
+        await limitador.adquirir(chat_id)
+        try:
+            await bot.send_message(chat_id=chat_id, text=texto)
+            return True
+        except RetryAfter as e:
+            segundos = _segundos(e.retry_after)
+            logger.warning(f"Telegram pidió esperar {segundos}s (flood control)")
+            limitador.pausar(segundos)
+        except (Forbidden, BadRequest) as e:
+            # Bot bloqueado, chat inexistente, etc.: no tiene sentido reintentar
+            logger.info(f"No se pudo enviar a {chat_id}: {e}")
+            return False
+        except (TimedOut, NetworkError) as e:
+            if intento == MAX_REINTENTOS:
+                logger.error(f"Error de red enviando a {chat_id}: {e}")
+                return False
+            await asyncio.sleep(2 ** intento)
+        except TelegramError as e:
+            logger.error(f"Error de Telegram enviando a {chat_id}: {e}")
+            return False
+    return False
+
+
+async def _enviar_lote(bot, limitador, chat_ids, texto, concurrencia):
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def enviar(chat_id):
+        async with semaforo:
+            return await _enviar_uno(bot, limitador, chat_id, texto)
+
+    # Una excepción en un chat no debe cortar el lote antes de guardar el progreso
+    resultados = await asyncio.gather(*(enviar(chat_id) for chat_id in chat_ids), return_exceptions=True)
+    for chat_id, resultado in zip(chat_ids, resultados):
+        if isinstance(resultado, BaseException):
+            logger.error(f"Error inesperado enviando a {chat_id}: {resultado!r}")
+    return [resultado is True for resultado in resultados]
+
+
+def _vinculados():
+    return Profile.objects.exclude(telegram_chat_id__isnull=True).exclude(telegram_chat_id='')
+
+
+def crear_difusion(mensaje, creada_por=None):
+    return Difusion.objects.create(mensaje=mensaje, creada_por=creada_por, total=_vinculados().count())
+
+
+def ejecutar_difusion(difusion, tasa=TASA_GLOBAL, tamano_lote=TAMANO_LOTE,
+                      concurrencia=CONCURRENCIA, sender=None, progreso=None):
+    """
+    Envía (o reanuda) una difusión. Bloquea hasta terminar o hasta que la
+    difusión se cancele. `progreso(difusion, mensajes_por_segundo)` se llama
+    después de cada lote.
+    """
+    sender = sender or get_sender()
+    limitador = LimitadorTelegram(tasa_global=tasa)
+
+    if difusion.iniciada_at is None:
+        difusion.iniciada_at = timezone.now()
+    difusion.estado = 'enviando'
+    difusion.save(update_fields=['estado', 'iniciada_at'])
+
+    inicio = time.monotonic()
+    procesados_al_inicio = difusion.procesados
+    while True:
+        lote = list(
+            _vinculados().filter(id__gt=difusion.ultimo_profile_id)
+            .order_by('id').values_list('id', 'telegram_chat_id')[:tamano_lote]
+        )
+        if not lote:
+            break
+
+        resultados = sender.submit(
+            _enviar_lote, limitador, [chat_id for _, chat_id in lote], difusion.mensaje, concurrencia
+        ).result()
+        enviados = sum(resultados)
+
+        Difusion.objects.filter(pk=difusion.pk).update(
+            ultimo_profile_id=lote[-1][0],
+            enviados=F('enviados') + enviados,
+            fallidos=F('fallidos') + len(resultados) - enviados,
+        )
+        difusion.refresh_from_db()
+
+        transcurrido = time.monotonic() - inicio
+        tasa_real = (difusion.procesados - procesados_al_inicio) / transcurrido if transcurrido else 0.0
+        logger.info(f"Difusión #{difusion.pk}: {difusion.procesados}/{difusion.total} ({tasa_real:.1f} msg/s)")
+        if progreso:
+            progreso(difusion, tasa_real)
+        # Desde la base: la cancelación llega desde el admin mientras se envía
+        if Difusion.objects.filter(pk=difusion.pk, estado='cancelada').exists():
+            difusion.estado = 'cancelada'
+            return difusion
+
+    difusion.estado = 'completada'
+    difusion.finalizada_at = timezone.now()
+    difusion.save(update_fields=['estado', 'finalizada_at'])
+    return difusion
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from telegram_bot.difusion import (
+    CONCURRENCIA, TAMANO_LOTE, TASA_GLOBAL, crear_difusion, ejecutar_difusion,
+)
+from telegram_bot.models import Difusion
+
+
+class Command(BaseCommand):
+    help = 'Envía un mensaje a todos los usuarios con Telegram vinculado, respetando los límites de la Bot API'
+
+    def add_arguments(self, parser):
+        grupo = parser.add_mutually_exclusive_group(required=True)
+        grupo.add_argument('--mensaje', help='Texto plano de una nueva difusión')
+        grupo.add_argument('--reanudar', type=int, metavar='ID', help='Reanuda una difusión interrumpida')
+        parser.add_argument(
+            '--tasa',
+            type=float,
+            default=TASA_GLOBAL,
+            help=f'Mensajes por segundo como máximo (default: {TASA_GLOBAL})',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Perfiles por lote; el progreso se guarda al final de cada uno (default: {TAMANO_LOTE})',
+        )
+        parser.add_argument(
+            '--concurrencia',
+            type=int,
+            default=CONCURRENCIA,
+            help=f'Envíos en vuelo como máximo (default: {CONCURRENCIA})',
+        )
+
+    def handle(self, *args, **options):
+        if options['mensaje']:
+            difusion = crear_difusion(options['mensaje'])
+            self.stdout.write(f'📣 Difusión #{difusion.pk} creada para {difusion.total} usuarios')
+        else:
+            try:
+                difusion = Difusion.objects.get(pk=options['reanudar'])
+            except Difusion.DoesNotExist:
+                raise CommandError(f"No existe la difusión #{options['reanudar']}")
+            if difusion.estado == 'completada':
+                raise CommandError(f'La difusión #{difusion.pk} ya está completada')
+            self.stdout.write(f'🔁 Reanudando difusión #{difusion.pk} ({difusion.procesados}/{difusion.total})')
+
+        def progreso(difusion, tasa):
+            self.stdout.write(
+                f'   📤 {difusion.procesados}/{difusion.total} procesados '
+                f'({difusion.fallidos} fallidos) - {tasa:.1f} msg/s'
+            )
+
+        difusion = ejecutar_difusion(
+            difusion,
+            tasa=options['tasa'],
+            tamano_lote=options['lote'],
+            concurrencia=options['concurrencia'],
+            progreso=progreso,
+        )
+
+        if difusion.estado == 'cancelada':
+            self.stdout.write(self.style.WARNING(f'⏸️ Difusión #{difusion.pk} cancelada'))
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f'✅ Difusión #{difusion.pk} completada: {difusion.enviados} enviados, {difusion.fallidos} fallidos')
+            )
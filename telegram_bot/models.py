@@ -1,3 +1,38 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class Difusion(models.Model):
+    """Envío masivo por Telegram a todos los usuarios vinculados (ver telegram_bot/difusion.py)"""
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('enviando', 'Enviando'),
+        ('completada', 'Completada'),
+        ('cancelada', 'Cancelada'),
+    ]
+    
+    mensaje = models.TextField()
+    creada_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    
+    # Progreso: los perfiles se recorren por id, así que se puede reanudar
+    ultimo_profile_id = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    enviados = models.PositiveIntegerField(default=0)
+    fallidos = models.PositiveIntegerField(default=0)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    iniciada_at = models.DateTimeField(null=True, blank=True)
+    finalizada_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Difusión'
+        verbose_name_plural = 'Difusiones'
+    
+    def __str__(self):
+        return f"Difusión #{self.id} ({self.get_estado_display()}) - {self.enviados}/{self.total}"
+    
+    @property
+    def procesados(self):
+        return self.enviados + self.fallidos
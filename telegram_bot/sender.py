@@ -0,0 +1,143 @@
+"""
+Servicio de envío de Telegram de larga vida.
+
+Un único `Bot` inicializado (un solo getMe) corre en un event loop propio
+dentro de un hilo dedicado y reutiliza su pool de conexiones HTTP. Desde
+código sincrónico (vistas, el worker de notificaciones) se envía con
+`submit()`, que devuelve un `concurrent.futures.Future`, y se espera con
+`esperar()`, que cancela el envío si vence el timeout.
+
+Los mensajes se arman antes de enviar: dentro del loop no se toca el ORM.
+"""
+import asyncio
+import atexit
+import logging
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+TAMANO_POOL = 8
+TIMEOUT_INICIO = 15
+
+
+class TelegramSender:
+    """Bot de Telegram con loop propio y API thread-safe basada en futures"""
+
+    def __init__(self, token=None, base_url=None, tamano_pool=TAMANO_POOL):
+        self.token = token or settings.TELEGRAM_BOT_TOKEN
+        self.base_url = base_url or getattr(settings, 'TELEGRAM_API_BASE_URL', 'https://api.telegram.org/bot')
+        self.tamano_pool = tamano_pool
+        self.bot = None
+        self._loop = None
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    @property
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def iniciar(self):
+        """Arranca el hilo del loop e inicializa el bot (idempotente)"""
+        with self._lock:
+            if self.activo:
+                return
+            if not self.token:
+                raise RuntimeError('Token de Telegram no configurado')
+
+            listo = Future()
+            self._loop = asyncio.new_event_loop()
+            self._hilo = threading.Thread(
+                target=self._correr, args=(listo,), name='telegram-sender', daemon=True
+            )
+            self._hilo.start()
+            try:
+                listo.result(timeout=TIMEOUT_INICIO)
+            except Exception:
+                if not self._loop.is_closed():
+                    self._loop.call_soon_threadsafe(self._loop.stop)
+                self._hilo = None
+                raise
+
+    def _correr(self, listo):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self.bot = Bot(
+                self.token,
+                base_url=self.base_url,
+                request=HTTPXRequest(connection_pool_size=self.tamano_pool),
+            )
+            self._loop.run_until_complete(self.bot.initialize())
+        except Exception as e:
+            listo.set_exception(e)
+            self._loop.close()
+            return
+        logger.info(f"Telegram sender iniciado como @{self.bot.username}")
+        listo.set_result(True)
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.run_until_complete(self.bot.shutdown())
+            self._loop.close()
+
+    def submit(self, funcion, *args, **kwargs):
+        """
+        Programa `funcion(bot, *args, **kwargs)` (una corrutina) en el loop del
+        sender. Devuelve un `concurrent.futures.Future` con el resultado.
+        """
+        self.iniciar()
+        return asyncio.run_coroutine_threadsafe(funcion(self.bot, *args, **kwargs), self._loop)
+
+    def enviar_mensaje(self, chat_id, texto, **kwargs):
+        return self.submit(_enviar_mensaje, chat_id, texto, **kwargs)
+
+    def enviar_documento(self, chat_id, contenido, filename, caption=''):
+        return self.submit(_enviar_documento, chat_id, contenido, filename, caption)
+
+    def detener(self):
+        with self._lock:
+            if self.activo:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._hilo.join(timeout=5)
+            self._hilo = None
+
+
+async def _enviar_mensaje(bot, chat_id, texto, **kwargs):
+    return await bot.send_message(chat_id=chat_id, text=texto, **kwargs)
+
+
+async def _enviar_documento(bot, chat_id, contenido, filename, caption):
+    return await bot.send_document(
+        chat_id=chat_id, document=contenido, filename=filename, caption=caption
+    )
+
+
+def esperar(futuro, timeout):
+    """
+    Resultado de un envío hecho con `submit()`. Si vence el timeout se cancela
+    la corrutina, así un reintento del llamador no se suma a un envío que
+    sigue en curso (lo ya enviado a Telegram no se puede deshacer).
+    """
+    try:
+        return futuro.result(timeout=timeout)
+    except TimeoutError:
+        futuro.cancel()
+        raise
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def get_sender():
+    """Sender compartido del proceso"""
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = TelegramSender()
+            atexit.register(_sender.detener)
+        return _sender
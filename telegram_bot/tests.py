@@ -1,3 +1,233 @@
-from django.test import TestCase
+"""
+Difusión contra un stub local de la Bot API (http.server en un hilo).
 
-# Create your tests here.
+El stub responde getMe, sendMessage y sendDocument como Telegram y permite programar
+respuestas por chat: 429 con retry_after, 403 (bot bloqueado) o 400.
+"""
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from presupuesto.models import Presupuesto
+from .difusion import crear_difusion, ejecutar_difusion
+from .models import Difusion
+from .sender import TelegramSender
+from .utils import enviar_presupuesto_telegram
+
+TOKEN = '123456:TEST'
+
+
+class StubBotAPI(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.enviados = []  # (chat_id, texto, monotonic)
+        self.metodos = []  # en orden de llegada
+        self.demora_mensaje = 0.0
+        self.respuestas = {}  # chat_id -> lista de (status, cuerpo) a devolver antes de aceptar
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/bot'
+
+    def programar(self, chat_id, *respuestas):
+        self.respuestas[str(chat_id)] = list(respuestas)
+
+    def chats_enviados(self):
+        return [chat_id for chat_id, _, _ in self.enviados]
+
+    def handle_error(self, request, client_address):
+        # Un cliente que canceló por timeout cierra la conexión antes de la respuesta
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def _error(codigo, descripcion, **parametros):
+    cuerpo = {'ok': False, 'error_code': codigo, 'description': descripcion}
+    if parametros:
+        cuerpo['parameters'] = parametros
+    return codigo, cuerpo
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _parametros(self):
+        largo = int(self.headers.get('Content-Length') or 0)
+        crudo = self.rfile.read(largo).decode() if largo else ''
+        if 'json' in (self.headers.get('Content-Type') or ''):
+            return json.loads(crudo or '{}')
+        return {clave: valores[0] for clave, valores in parse_qs(crudo).items()}
+
+    def _responder(self, status, cuerpo):
+        datos = json.dumps(cuerpo).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_POST(self):
+        metodo = self.path.rsplit('/', 1)[-1]
+        if metodo == 'getMe':
+            return self._responder(200, {'ok': True, 'result': {
+                'id': 1, 'is_bot': True, 'first_name': 'Stub', 'username': 'stub_bot',
+            }})
+        if metodo == 'sendDocument':
+            # multipart: no hace falta parsearlo
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            with self.server.lock:
+                self.server.metodos.append(metodo)
+            return self._responder(200, {'ok': True, 'result': {
+                'message_id': 99, 'date': int(time.time()), 'chat': {'id': 1, 'type': 'private'},
+                'document': {'file_id': 'f', 'file_unique_id': 'u'},
+            }})
+        if metodo != 'sendMessage':
+            return self._responder(*_error(404, 'Not Found'))
+
+        parametros = self._parametros()
+        time.sleep(self.server.demora_mensaje)
+        chat_id = str(parametros['chat_id'])
+        with self.server.lock:
+            pendientes = self.server.respuestas.get(chat_id)
+            if pendientes:
+                return self._responder(*pendientes.pop(0))
+            self.server.enviados.append((chat_id, parametros['text'], time.monotonic()))
+            self.server.metodos.append(metodo)
+        self._responder(200, {'ok': True, 'result': {
+            'message_id': len(self.server.enviados), 'date': int(time.time()),
+            'chat': {'id': int(chat_id), 'type': 'private'}, 'text': parametros['text'],
+        }})
+
+
+class StubTestCase(TestCase):
+    def setUp(self):
+        self.stub = StubBotAPI()
+        threading.Thread(target=self.stub.serve_forever, daemon=True).start()
+        self.sender = TelegramSender(token=TOKEN, base_url=self.stub.base_url)
+
+    def tearDown(self):
+        self.sender.detener()
+        self.stub.shutdown()
+        self.stub.server_close()
+
+
+@override_settings(TELEGRAM_BOT_TOKEN=TOKEN)
+class PresupuestoTelegramTests(StubTestCase):
+    def test_mensaje_antes_que_el_pdf(self):
+        user = User.objects.create_user('cliente')
+        user.profile.telegram_chat_id = '2001'
+        user.profile.save()
+        presupuesto = Presupuesto.objects.create(user=user, total=100)
+        # Un mensaje lento no debe dejar que el PDF llegue primero
+        self.stub.demora_mensaje = 0.3
+
+        with mock.patch('telegram_bot.sender.get_sender', return_value=self.sender):
+            enviado = enviar_presupuesto_telegram(user, presupuesto, BytesIO(b'%PDF-1.4'))
+
+        self.assertTrue(enviado)
+        self.assertEqual(self.stub.metodos, ['sendMessage', 'sendDocument'])
+
+    def test_timeout_cancela_el_envio(self):
+        user = User.objects.create_user('cliente')
+        user.profile.telegram_chat_id = '2001'
+        user.profile.save()
+        presupuesto = Presupuesto.objects.create(user=user, total=100)
+        self.stub.demora_mensaje = 0.6
+
+        with mock.patch('telegram_bot.sender.get_sender', return_value=self.sender), \
+                mock.patch('telegram_bot.utils.TIMEOUT_ENVIO', 0.1), \
+                self.assertLogs('telegram_bot.utils', 'ERROR'):
+            enviado = enviar_presupuesto_telegram(user, presupuesto, BytesIO(b'%PDF-1.4'))
+        time.sleep(1)
+
+        self.assertFalse(enviado)
+        # El mensaje ya había salido; el PDF no se envía tarde
+        self.assertEqual(self.stub.metodos, ['sendMessage'])
+
+
+class DifusionTests(StubTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chats = []
+        for i in range(1, 6):
+            user = User.objects.create_user(f'usuario{i}')
+            user.profile.telegram_chat_id = str(1000 + i)
+            user.profile.save()
+            self.chats.append(str(1000 + i))
+
+    def _ejecutar(self, difusion, **kwargs):
+        kwargs.setdefault('tasa', 100)
+        return ejecutar_difusion(difusion, sender=self.sender, **kwargs)
+
+    def test_envia_a_todos_como_texto_plano(self):
+        # Markdown desbalanceado: con parse_mode fallaría en Telegram
+        difusion = self._ejecutar(crear_difusion('Oferta *imperdible_ 2x1'))
+
+        self.assertEqual(difusion.estado, 'completada')
+        self.assertEqual((difusion.enviados, difusion.fallidos), (5, 0))
+        self.assertEqual(sorted(self.stub.chats_enviados()), self.chats)
+        self.assertEqual({texto for _, texto, _ in self.stub.enviados}, {'Oferta *imperdible_ 2x1'})
+
+    def test_retry_after_pausa_y_reintenta(self):
+        self.stub.programar(
+            self.chats[0], _error(429, 'Too Many Requests: retry after 1', retry_after=1)
+        )
+        inicio = time.monotonic()
+        difusion = self._ejecutar(crear_difusion('Hola'))
+
+        self.assertEqual((difusion.enviados, difusion.fallidos), (5, 0))
+        self.assertEqual(self.stub.chats_enviados().count(self.chats[0]), 1)
+        # Después del 429 nadie recibe nada hasta que pasa el retry_after
+        ultimo = max(momento for _, _, momento in self.stub.enviados)
+        self.assertGreaterEqual(ultimo - inicio, 1.0)
+
+    def test_chat_bloqueado_cuenta_como_fallido_sin_reintentar(self):
+        self.stub.programar(
+            self.chats[1],
+            _error(403, 'Forbidden: bot was blocked by the user'),
+            _error(403, 'Forbidden: bot was blocked by the user'),
+        )
+        self.stub.programar(self.chats[2], _error(400, 'Bad Request: chat not found'))
+        difusion = self._ejecutar(crear_difusion('Hola'))
+
+        self.assertEqual(difusion.estado, 'completada')
+        self.assertEqual((difusion.enviados, difusion.fallidos), (3, 2))
+        self.assertNotIn(self.chats[1], self.stub.chats_enviados())
+        # No se reintentó: queda la segunda respuesta programada sin consumir
+        self.assertEqual(len(self.stub.respuestas[self.chats[1]]), 1)
+
+    def test_error_inesperado_no_corta_el_lote(self):
+        self.stub.programar(self.chats[3], _error(409, 'Conflict: algo raro'))
+        difusion = self._ejecutar(crear_difusion('Hola'), tamano_lote=10)
+
+        self.assertEqual((difusion.enviados, difusion.fallidos), (4, 1))
+        self.assertEqual(difusion.ultimo_profile_id, User.objects.get(username='usuario5').profile.pk)
+
+    def test_reanuda_sin_reenviar(self):
+        difusion = crear_difusion('Hola')
+
+        def cancelar_tras_el_primer_lote(difusion, tasa):
+            Difusion.objects.filter(pk=difusion.pk).update(estado='cancelada')
+
+        # Interrupción después del primer lote de 2
+        difusion = self._ejecutar(difusion, tamano_lote=2, progreso=cancelar_tras_el_primer_lote)
+        self.assertEqual(difusion.estado, 'cancelada')
+        self.assertEqual(sorted(self.stub.chats_enviados()), self.chats[:2])
+
+        difusion = self._ejecutar(Difusion.objects.get(pk=difusion.pk), tamano_lote=2)
+        self.assertEqual(difusion.estado, 'completada')
+        self.assertEqual(difusion.enviados, 5)
+        self.assertEqual(sorted(self.stub.chats_enviados()), self.chats)
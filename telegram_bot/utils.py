@@ -1,196 +1,91 @@
 """
-Funciones utilitarias para el bot de Telegram
-"""
-
-import asyncio
-import threading
-from io import BytesIO
-from typing import Optional
-from asgiref.sync import sync_to_async
-
-from .bot import mercadito_bot
-
-
-def enviar_presupuesto_telegram(user, presupuesto, pdf_buffer: BytesIO) -> bool:
-    """
 Utilidades para notificaciones de Telegram
+
+Los envíos pasan por el sender de larga vida (ver sender.py): un solo bot
+inicializado y un pool de conexiones compartido por todo el proceso.
 """
-import asyncio
-import threading
 import logging
 from io import BytesIO
 from typing import Optional
-from concurrent.futures import ThreadPoolExecutor
+
 from django.conf import settings
+from telegram.constants import ParseMode
 
 logger = logging.getLogger(__name__)
 
+TIMEOUT_ENVIO = 30
+
+
+async def _enviar_presupuesto(bot, chat_id, texto, contenido, filename, caption):
+    # En orden: el PDF llega después del mensaje que lo anuncia
+    await bot.send_message(chat_id=chat_id, text=texto, parse_mode=ParseMode.MARKDOWN)
+    await bot.send_document(chat_id=chat_id, document=contenido, filename=filename, caption=caption)
+
+
+def _chat_id(user) -> Optional[str]:
+    profile = getattr(user, 'profile', None)
+    return getattr(profile, 'telegram_chat_id', None) or None
+
+
 def enviar_presupuesto_telegram(user, presupuesto, pdf_buffer: BytesIO) -> bool:
     """
-    Enviar presupuesto por Telegram de forma thread-safe
+    Enviar presupuesto (mensaje + PDF) por Telegram. Bloquea hasta el resultado.
     """
     if not settings.TELEGRAM_BOT_TOKEN:
         logger.warning("Token de Telegram no configurado")
         return False
-        
-    try:
-        # Verificar si el usuario tiene Telegram vinculado
-        if hasattr(user, 'profile') and user.profile.telegram_chat_id:
-            chat_id = user.profile.telegram_chat_id
-            
-            def _enviar_async():
-                """Función para ejecutar en thread separado"""
-                try:
-                    from .bot import MercaditoBot
-                    
-                    # Crear nuevo loop para este thread
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    
-                    try:
-                        mercadito_bot = MercaditoBot()
-                        
-                        # Inicializar bot
-                        result = loop.run_until_complete(mercadito_bot.inicializar())
-                        if not result:
-                            logger.error("No se pudo inicializar el bot")
-                            return False
-                        
-                        # Enviar presupuesto
-                        result = loop.run_until_complete(
-                            mercadito_bot.enviar_presupuesto(chat_id, presupuesto, pdf_buffer)
-                        )
-                        return result
-                        
-                    finally:
-                        loop.close()
-                        
-                except Exception as e:
-                    logger.error(f"Error en hilo de Telegram presupuesto: {e}")
-                    return False
-            
-            # Ejecutar en thread pool
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(_enviar_async)
-                try:
-                    result = future.result(timeout=30)  # Timeout de 30 segundos
-                    logger.info(f"Notificación de presupuesto enviada a Telegram para usuario {user.username}")
-                    return result if result else True  # Retorna True si no hay errores
-                except Exception as e:
-                    logger.error(f"Error ejecutando thread de Telegram: {e}")
-                    return False
-            
-        else:
-            logger.info(f"Usuario {user.username} no tiene Telegram vinculado")
-            return False
-            
-    except Exception as e:
-        logger.error(f"Error enviando presupuesto por Telegram: {e}")
+    
+    chat_id = _chat_id(user)
+    if not chat_id:
+        logger.info(f"Usuario {user.username} no tiene Telegram vinculado")
         return False
+    
     try:
-        if not hasattr(user, 'profile') or not user.profile.telegram_chat_id:
-            return False
-        
-        chat_id = user.profile.telegram_chat_id
-        
-        # Ejecutar en un hilo separado para evitar conflictos con event loops
-        def run_telegram_task():
-            try:
-                # Crear nuevo event loop en el hilo
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                try:
-                    # Inicializar bot si no está listo
-                    if not mercadito_bot.application:
-                        result = loop.run_until_complete(mercadito_bot.inicializar())
-                        if not result:
-                            return False
-                    
-                    # Enviar presupuesto
-                    result = loop.run_until_complete(
-                        mercadito_bot.enviar_presupuesto(chat_id, presupuesto, pdf_buffer)
-                    )
-                    return result
-                    
-                finally:
-                    loop.close()
-                    
-            except Exception as e:
-                print(f"Error en hilo de Telegram: {e}")
-                return False
+        from .bot import mercadito_bot
+        from .sender import esperar, get_sender
         
-        # Ejecutar en hilo separado
-        thread = threading.Thread(target=run_telegram_task)
-        thread.start()
-        thread.join(timeout=10)  # Timeout de 10 segundos
-        
-        return True  # Asumimos éxito si no hay excepciones
-            
+        futuro = get_sender().submit(
+            _enviar_presupuesto,
+            chat_id,
+            mercadito_bot.mensaje_presupuesto(presupuesto),
+            pdf_buffer.getvalue(),
+            f"presupuesto_{presupuesto.id}.pdf",
+            f"📄 Presupuesto #{presupuesto.id} - ${presupuesto.total}",
+        )
+        # Dos envíos seguidos: hasta un TIMEOUT_ENVIO cada uno
+        esperar(futuro, 2 * TIMEOUT_ENVIO)
+        logger.info(f"Notificación de presupuesto enviada a Telegram para usuario {user.username}")
+        return True
+    
     except Exception as e:
-        print(f"Error enviando presupuesto por Telegram: {e}")
+        logger.error(f"Error enviando presupuesto por Telegram: {e}")
         return False
 
 
 def enviar_pedido_telegram(user, pedido, accion: str) -> bool:
     """
-    Enviar notificación de pedido por Telegram de forma thread-safe
+    Enviar notificación de pedido por Telegram. Bloquea hasta el resultado.
     """
     if not settings.TELEGRAM_BOT_TOKEN:
         logger.warning("Token de Telegram no configurado")
         return False
-        
+    
+    chat_id = _chat_id(user)
+    if not chat_id:
+        logger.info(f"Usuario {user.username} no tiene Telegram vinculado")
+        return False
+    
     try:
-        # Verificar si el usuario tiene Telegram vinculado
-        if hasattr(user, 'profile') and user.profile.telegram_chat_id:
-            chat_id = user.profile.telegram_chat_id
-            
-            def _enviar_async():
-                """Función para ejecutar en thread separado"""
-                try:
-                    from .bot import MercaditoBot
-                    
-                    # Crear nuevo loop para este thread
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    
-                    try:
-                        mercadito_bot = MercaditoBot()
-                        
-                        # Inicializar bot
-                        result = loop.run_until_complete(mercadito_bot.inicializar())
-                        if not result:
-                            logger.error("No se pudo inicializar el bot")
-                            return False
-                        
-                        # Enviar notificación
-                        result = loop.run_until_complete(
-                            mercadito_bot.enviar_pedido(chat_id, pedido, accion)
-                        )
-                        return result
-                        
-                    finally:
-                        loop.close()
-                        
-                except Exception as e:
-                    logger.error(f"Error en hilo de Telegram pedido: {e}")
-                    return False
-            
-            # Ejecutar en thread pool
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(_enviar_async)
-                try:
-                    result = future.result(timeout=30)  # Timeout de 30 segundos
-                    logger.info(f"Notificación de pedido enviada a Telegram para usuario {user.username}")
-                    return result if result else True  # Retorna True si no hay errores
-                except Exception as e:
-                    logger.error(f"Error ejecutando thread de Telegram: {e}")
-                    return False
-            
-        else:
-            logger.info(f"Usuario {user.username} no tiene Telegram vinculado")
-            return False
-            
+        from .bot import mercadito_bot
+        from .sender import esperar, get_sender
+        
+        futuro = get_sender().enviar_mensaje(
+            chat_id, mercadito_bot.mensaje_pedido(pedido, accion), parse_mode=ParseMode.MARKDOWN
+        )
+        esperar(futuro, TIMEOUT_ENVIO)
+        logger.info(f"Notificación de pedido enviada a Telegram para usuario {user.username}")
+        return True
+    
     except Exception as e:
         logger.error(f"Error enviando pedido por Telegram: {e}")
         return False
@@ -1,14 +1,23 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.contrib import messages
-from .models import Producto, Pedido, PedidoItem
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from .models import Producto, Pedido, PedidoItem, Notificacion
+from .notificaciones import encolar_pedidos
+from .pagination import ConteoEstimadoPaginator
 
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
-    list_display = ("title", "marca", "price", "stock", "active", "created_at", "seller", "preview_image")
-    list_filter = ("active", "marca", "created_at")
+    list_display = ("title", "marca", "categoria", "price", "stock", "active", "created_at", "seller", "preview_image")
+    list_filter = ("active", "categoria", "marca", "created_at")
     search_fields = ("title", "description", "marca")
     fields = ("title", "description", "marca", "price", "stock", "image", "active", "seller")
+    list_select_related = ("seller",)
+    paginator = ConteoEstimadoPaginator
+    show_full_result_count = False
     
     def preview_image(self, obj):
         """Muestra una preview de la imagen en el admin"""
@@ -26,11 +35,24 @@ class PedidoItemInline(admin.TabularInline):
     can_delete = False
 
 
+def _accion_cambiar_estado(estado):
+    """Acción del admin que pasa los pedidos seleccionados a `estado`"""
+    def accion(modeladmin, request, queryset):
+        modeladmin.cambiar_estado(request, queryset, estado)
+    accion.__name__ = f'marcar_como_{estado}'
+    accion.short_description = f"Marcar como {dict(Pedido.ESTADO_CHOICES)[estado]}"
+    return accion
+
+
 @admin.register(Pedido)
 class PedidoAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'fecha_pedido', 'estado_badge', 'total', 'items_count')
     list_filter = ('estado', 'fecha_pedido')
+    # user__email y direccion_envio tienen índices trigram en PostgreSQL (migración 0016)
     search_fields = ('user__username', 'user__email', 'direccion_envio')
+    list_select_related = ('user',)
+    paginator = ConteoEstimadoPaginator
+    show_full_result_count = False
     readonly_fields = ('fecha_pedido', 'fecha_actualizacion', 'total')
     fields = ('user', 'estado', 'total', 'direccion_envio', 'telefono', 'notas', 'fecha_pedido', 'fecha_actualizacion')
     inlines = [PedidoItemInline]
@@ -52,78 +74,51 @@ class PedidoAdmin(admin.ModelAdmin):
         )
     estado_badge.short_description = 'Estado'
     
+    def get_queryset(self, request):
+        # Subconsulta correlacionada: solo se evalúa para las filas de la página
+        cantidad = PedidoItem.objects.filter(pedido=OuterRef('pk')).order_by().values('pedido').annotate(
+            c=Count('id')
+        ).values('c')
+        return super().get_queryset(request).annotate(_items_count=Coalesce(Subquery(cantidad), 0))
+    
     def items_count(self, obj):
-        return obj.items.count()
+        return obj._items_count
     items_count.short_description = 'Cantidad de Items'
+    items_count.admin_order_field = '_items_count'
     
-    def marcar_como_procesando(self, request, queryset):
-        updated = 0
-        for pedido in queryset:
-            if pedido.estado != 'procesando':
-                pedido.estado = 'procesando'
-                pedido.save()
-                
-                # Enviar notificaciones
-                from .views import enviar_email_pedido
-                from telegram_bot.utils import enviar_pedido_telegram
-                
-                enviar_email_pedido(pedido, 'procesando', request)
-                enviar_pedido_telegram(pedido.user, pedido, 'procesando')
-                updated += 1
-        
-        self.message_user(request, f'{updated} pedidos marcados como "Procesando" y notificaciones enviadas. 📧🤖', messages.SUCCESS)
-    marcar_como_procesando.short_description = "Marcar como Procesando"
-    
-    def marcar_como_enviado(self, request, queryset):
-        updated = 0
-        for pedido in queryset:
-            if pedido.estado != 'enviado':
-                pedido.estado = 'enviado'
-                pedido.save()
-                
-                # Enviar notificaciones
-                from .views import enviar_email_pedido
-                from telegram_bot.utils import enviar_pedido_telegram
-                
-                enviar_email_pedido(pedido, 'enviado', request)
-                enviar_pedido_telegram(pedido.user, pedido, 'enviado')
-                updated += 1
-        
-        self.message_user(request, f'{updated} pedidos marcados como "Enviado" y notificaciones enviadas. 📧🤖', messages.SUCCESS)
-    marcar_como_enviado.short_description = "Marcar como Enviado"
-    
-    def marcar_como_entregado(self, request, queryset):
-        updated = 0
-        for pedido in queryset:
-            if pedido.estado != 'entregado':
-                pedido.estado = 'entregado'
-                pedido.save()
-                
-                # Enviar notificaciones
-                from .views import enviar_email_pedido
-                from telegram_bot.utils import enviar_pedido_telegram
-                
-                enviar_email_pedido(pedido, 'entregado', request)
-                enviar_pedido_telegram(pedido.user, pedido, 'entregado')
-                updated += 1
-        
-        self.message_user(request, f'{updated} pedidos marcados como "Entregado" y notificaciones enviadas. 📧🤖', messages.SUCCESS)
-    marcar_como_entregado.short_description = "Marcar como Entregado"
+    marcar_como_procesando = _accion_cambiar_estado('procesando')
+    marcar_como_enviado = _accion_cambiar_estado('enviado')
+    marcar_como_entregado = _accion_cambiar_estado('entregado')
+    marcar_como_cancelado = _accion_cambiar_estado('cancelado')
     
-    def marcar_como_cancelado(self, request, queryset):
-        updated = 0
-        for pedido in queryset:
-            if pedido.estado != 'cancelado':
-                pedido.estado = 'cancelado'
-                pedido.save()
-                
-                # Enviar notificaciones
-                from .views import enviar_email_pedido
-                from telegram_bot.utils import enviar_pedido_telegram
-                
-                enviar_email_pedido(pedido, 'cancelado', request)
-                enviar_pedido_telegram(pedido.user, pedido, 'cancelado')
-                updated += 1
+    def cambiar_estado(self, request, queryset, estado):
+        """Transición masiva: un UPDATE y las notificaciones al outbox"""
+        with transaction.atomic():
+            ids = Pedido.cambiar_estado_en_lote(queryset, estado)
+            encoladas = encolar_pedidos(ids, estado, request.build_absolute_uri('/'))
         
-        self.message_user(request, f'{updated} pedidos marcados como "Cancelado" y notificaciones enviadas. 📧🤖', messages.SUCCESS)
-    marcar_como_cancelado.short_description = "Marcar como Cancelado"
+        etiqueta = dict(Pedido.ESTADO_CHOICES)[estado]
+        progreso_url = (
+            reverse('admin:tienda_notificacion_changelist')
+            + f'?tipo__exact=pedido&accion={estado}&estado__exact=pendiente'
+        )
+        self.message_user(
+            request,
+            format_html(
+                '{} pedidos marcados como "{}" y {} notificaciones encoladas. 📧🤖 '
+                '<a href="{}">Ver envíos pendientes</a>',
+                len(ids), etiqueta, encoladas, progreso_url,
+            ),
+            messages.SUCCESS,
+        )
+
+
+@admin.register(Notificacion)
+class NotificacionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'canal', 'tipo', 'objeto_id', 'accion', 'estado', 'intentos', 'proximo_intento', 'enviada_at')
+    list_filter = ('estado', 'canal', 'tipo', 'accion')
+    search_fields = ('user__username', 'user__email', 'ultimo_error')
+    readonly_fields = ('created_at', 'enviada_at')
+    list_select_related = ('user',)
+    paginator = ConteoEstimadoPaginator
+    show_full_result_count = False
@@ -1,4 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def _asegurar_triggers_fts(sender, using, **kwargs):
+    from django.db import connections
+
+    from .search import asegurar_triggers_fts
+
+    asegurar_triggers_fts(connections[using])
 
 
 class TiendaConfig(AppConfig):
@@ -7,3 +16,7 @@ class TiendaConfig(AppConfig):
 
     def ready(self):
         import tienda.signals
+
+        # Las migraciones que reconstruyen tienda_producto en SQLite borran
+        # los triggers del índice FTS5 (ver search.py)
+        post_migrate.connect(_asegurar_triggers_fts, sender=self)
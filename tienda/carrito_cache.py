@@ -0,0 +1,39 @@
+"""
+Estado del contador del carrito cacheado por usuario.
+
+`base.html` consulta el contador cada 30 segundos desde cada pestaña
+abierta. El endpoint responde desde cache con un ETag basado en
+`Carrito.version` (y `Last-Modified`), así que el navegador revalida y
+recibe un 304 mientras el carrito no cambie. La entrada se invalida en cada
+mutación del carrito (ver `Carrito.recalcular_totales` y `Carrito.clear`).
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+CARRITO_CACHE_KEY = 'tienda:carrito:{}'
+CARRITO_TIMEOUT = 60 * 60
+
+
+def _clave(user_id):
+    return CARRITO_CACHE_KEY.format(user_id)
+
+
+def obtener_estado_carrito(user_id):
+    """Devuelve {'count', 'version', 'updated_at'} del carrito del usuario"""
+    estado = cache.get(_clave(user_id))
+    if estado is None:
+        from .models import Carrito
+
+        estado = Carrito.objects.filter(user_id=user_id).values(
+            'version', 'updated_at', count=F('item_count')
+        ).first() or {'count': 0, 'version': 0, 'updated_at': None}
+        cache.set(_clave(user_id), estado, CARRITO_TIMEOUT)
+    return estado
+
+
+def invalidar_carritos(user_ids):
+    claves = [_clave(user_id) for user_id in user_ids]
+    cache.delete_many(claves)
+    # Una lectura concurrente pudo volver a cachear el valor previo al commit
+    transaction.on_commit(lambda: cache.delete_many(claves))
@@ -0,0 +1,78 @@
+"""
+Categorías de equipamiento de pesca detectadas en el título del producto.
+
+La categoría se calcula una vez al guardar (`Producto.save`) y queda en la
+columna indexada `Producto.categoria`, que usan las imágenes placeholder,
+el filtro del catálogo y las tendencias por categoría. Los productos
+cargados con `bulk_create`/`update` se completan con
+``manage.py actualizar_categorias``.
+"""
+import re
+
+# (slug, etiqueta, palabras clave, término de búsqueda de la imagen),
+# en orden de prioridad: gana la primera categoría con alguna coincidencia
+CATEGORIAS = [
+    ('canas', 'Cañas', ['caña', 'rod', 'vara', 'telescópica'], 'fishing+rod'),
+    ('reels', 'Reels', ['reel', 'carrete', 'frontal', 'rotativo'], 'fishing+reel'),
+    ('anzuelos', 'Anzuelos', ['anzuelo', 'hook', 'círculo', 'j-hook'], 'fishing+hook'),
+    ('senuelos', 'Señuelos', ['carnada', 'señuelo', 'artificial', 'spinner', 'cuchara'], 'fishing+lure'),
+    ('plomadas', 'Plomadas', ['plomada', 'peso', 'sinker', 'pirámide'], 'fishing+weight'),
+    ('lineas', 'Líneas', ['línea', 'nylon', 'monofilamento', 'multifilamento'], 'fishing+line'),
+    ('cajas', 'Cajas', ['caja', 'organizadora', 'tackle+box'], 'tackle+box'),
+    ('sillas', 'Sillas', ['silla', 'chair', 'asiento'], 'fishing+chair'),
+    ('redes', 'Redes', ['red', 'net', 'landing'], 'fishing+net'),
+    ('carnada_viva', 'Carnada viva', ['lombriz', 'carnada+viva', 'gusano'], 'fishing+bait'),
+]
+CATEGORIA_GENERAL = 'general'
+
+CATEGORIA_CHOICES = [(slug, etiqueta) for slug, etiqueta, _, _ in CATEGORIAS] + [
+    (CATEGORIA_GENERAL, 'General'),
+]
+IMAGEN_POR_CATEGORIA = {slug: imagen for slug, _, _, imagen in CATEGORIAS}
+IMAGEN_GENERAL = 'fishing+equipment'
+
+_PRIORIDAD = {}
+for _prioridad, (_slug, _, _palabras, _) in enumerate(CATEGORIAS):
+    for _palabra in _palabras:
+        _PRIORIDAD.setdefault(_palabra, (_prioridad, _slug))
+
+# Una sola alternación; el lookahead encuentra coincidencias en cada
+# posición (también solapadas) y, ordenada por prioridad, en cada posición
+# captura la palabra de la categoría más prioritaria. Así una pasada sobre
+# el título equivale a probar las categorías en orden.
+_PATRON = re.compile(
+    '(?=(' + '|'.join(re.escape(p) for p in sorted(_PRIORIDAD, key=lambda p: _PRIORIDAD[p][0])) + '))'
+)
+
+
+def clasificar(title):
+    """Devuelve el slug de la categoría del título"""
+    mejor = None
+    for coincidencia in _PATRON.finditer((title or '').lower()):
+        candidata = _PRIORIDAD[coincidencia.group(1)]
+        if mejor is None or candidata < mejor:
+            mejor = candidata
+            if mejor[0] == 0:
+                break
+    return mejor[1] if mejor else CATEGORIA_GENERAL
+
+
+def imagen_de(categoria):
+    return IMAGEN_POR_CATEGORIA.get(categoria, IMAGEN_GENERAL)
+
+
+def recalcular_categorias(queryset, tamano_lote=1000):
+    """Recalcula la categoría de los productos dados. Devuelve cuántos cambiaron."""
+    cambiados = []
+    actualizados = 0
+    for producto in queryset.only('id', 'title', 'categoria').iterator(chunk_size=tamano_lote):
+        categoria = clasificar(producto.title)
+        if categoria != producto.categoria:
+            producto.categoria = categoria
+            cambiados.append(producto)
+        if len(cambiados) >= tamano_lote:
+            actualizados += queryset.model.objects.bulk_update(cambiados, ['categoria'])
+            cambiados = []
+    if cambiados:
+        actualizados += queryset.model.objects.bulk_update(cambiados, ['categoria'])
+    return actualizados
@@ -0,0 +1,87 @@
+"""
+Facetas del catálogo (marcas, categorías y rangos de precio) cacheadas.
+
+Se calculan sobre todo el catálogo visible (activo y con stock) con tres
+consultas agregadas y se guardan en cache hasta que un `Producto` se
+guarda o se elimina (ver tienda/signals.py).
+"""
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .categorias import CATEGORIA_CHOICES
+
+FACETAS_CACHE_KEY = 'tienda:facetas'
+FACETAS_TIMEOUT = 60 * 10
+
+# (etiqueta, mínimo inclusive, máximo exclusivo)
+RANGOS_PRECIO = [
+    ('Hasta 1.000', None, 1000),
+    ('1.000 a 5.000', 1000, 5000),
+    ('5.000 a 20.000', 5000, 20000),
+    ('Más de 20.000', 20000, None),
+]
+
+
+def _filtro_rango(minimo, maximo):
+    filtro = Q()
+    if minimo is not None:
+        filtro &= Q(price__gte=minimo)
+    if maximo is not None:
+        filtro &= Q(price__lt=maximo)
+    return filtro
+
+
+def calcular_facetas():
+    from .models import Producto
+
+    visibles = Producto.objects.filter(active=True, stock__gt=0)
+
+    marcas = list(
+        visibles.order_by().values('marca').annotate(total=Count('id')).order_by('marca')
+    )
+
+    por_categoria = dict(
+        visibles.order_by().values_list('categoria').annotate(total=Count('id'))
+    )
+    categorias = [
+        {'categoria': slug, 'etiqueta': etiqueta, 'total': por_categoria[slug]}
+        for slug, etiqueta in CATEGORIA_CHOICES
+        if por_categoria.get(slug)
+    ]
+
+    conteos = visibles.aggregate(
+        total=Count('id'),
+        **{
+            f'rango_{i}': Count('id', filter=_filtro_rango(minimo, maximo))
+            for i, (_, minimo, maximo) in enumerate(RANGOS_PRECIO)
+        }
+    )
+    rangos = [
+        {
+            'etiqueta': etiqueta,
+            'precio_min': minimo,
+            'precio_max': maximo,
+            'total': conteos[f'rango_{i}'],
+        }
+        for i, (etiqueta, minimo, maximo) in enumerate(RANGOS_PRECIO)
+    ]
+
+    return {
+        'marcas': marcas,
+        'categorias': categorias,
+        'rangos_precio': rangos,
+        'total': conteos['total'],
+    }
+
+
+def obtener_facetas():
+    """Devuelve las facetas desde cache, calculándolas si no están"""
+    facetas = cache.get(FACETAS_CACHE_KEY)
+    if facetas is None:
+        facetas = calcular_facetas()
+        cache.set(FACETAS_CACHE_KEY, facetas, FACETAS_TIMEOUT)
+    return facetas
+
+
+def invalidar_facetas():
+    cache.delete(FACETAS_CACHE_KEY)
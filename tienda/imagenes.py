@@ -0,0 +1,201 @@
+"""
+Proxy y cache local de imágenes de productos.
+
+Cada origen (la URL `Producto.image` o el placeholder de Unsplash según la
+categoría) se descarga una sola vez: se registra en `ImagenOrigen` y con
+Pillow se generan las variantes 400x300 y 200x150 en WebP y JPEG, guardadas
+en ``MEDIA_ROOT/imagenes`` con el hash del contenido en el nombre. Por eso
+se sirven con ``Cache-Control: immutable``: si la imagen cambia, cambia la
+URL.
+
+`Producto.imagen_hash` guarda el hash para que las tarjetas rendericen la
+URL local sin consultas. Mientras no se conoce, `url_imagen` apunta a la
+vista `imagen_producto`, que redirige al origen y lo procesa en segundo
+plano: el request nunca espera la descarga. Si el origen no se puede
+procesar queda `Producto.imagen_fallida` y se renderiza directamente la URL
+de origen. ``manage.py generar_imagenes`` (en build.sh) las pre-genera y
+reintenta las fallidas.
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from ecommerce import cliente_http
+
+from .models import ImagenOrigen, Producto
+
+logger = logging.getLogger(__name__)
+
+VARIANTES = {
+    '400x300': (400, 300),
+    '200x150': (200, 150),
+}
+FORMATOS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+# Cambiar si cambia el procesamiento: genera nombres (y URLs) nuevos
+VERSION = '1'
+TIMEOUT_DESCARGA = 10
+# Un origen que falló no se vuelve a pedir durante este tiempo
+ERROR_TIMEOUT = 60 * 10
+MAX_BYTES = 10 * 1024 * 1024
+PATRON_HASH = re.compile(r'^[0-9a-f]{64}$')
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='imagenes')
+
+
+class ErrorImagen(Exception):
+    pass
+
+
+def directorio():
+    return Path(settings.MEDIA_ROOT) / 'imagenes'
+
+
+def ruta_variante(hash_contenido, variante, extension):
+    return directorio() / hash_contenido[:2] / f'{hash_contenido}-{variante}.{extension}'
+
+
+def url_imagen(producto, variante):
+    """URL local de la variante; si todavía no se procesó, la del proxy"""
+    if producto.imagen_hash:
+        return reverse('tienda:imagen_cacheada', args=[producto.imagen_hash, variante])
+    if producto.pk is None or producto.imagen_fallida:
+        return producto.url_imagen_origen()
+    return reverse('tienda:imagen_producto', args=[producto.pk, variante])
+
+
+def _descargar(url):
+    # Proveedor por defecto: el host, cada origen con su circuito
+    timeout = (cliente_http.TIMEOUT_CONEXION, TIMEOUT_DESCARGA)
+    with cliente_http.get(url, timeout=timeout, stream=True) as respuesta:
+        respuesta.raise_for_status()
+        contenido = io.BytesIO()
+        for bloque in respuesta.iter_content(64 * 1024):
+            contenido.write(bloque)
+            if contenido.tell() > MAX_BYTES:
+                raise ErrorImagen(f'La imagen supera {MAX_BYTES} bytes: {url}')
+    return contenido.getvalue()
+
+
+def _guardar(ruta, imagen, formato, opciones):
+    """Escribe en un temporal y renombra: un lector nunca ve archivos a medias"""
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            imagen.save(archivo, formato, **opciones)
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+
+def generar_variantes(contenido):
+    """Genera todas las variantes del contenido. Devuelve el hash."""
+    hash_contenido = hashlib.sha256(VERSION.encode() + contenido).hexdigest()
+    try:
+        with Image.open(io.BytesIO(contenido)) as original:
+            original = ImageOps.exif_transpose(original).convert('RGB')
+            for variante, tamano in VARIANTES.items():
+                # Recorte centrado, como object-fit: cover en las tarjetas
+                recortada = ImageOps.fit(original, tamano, Image.Resampling.LANCZOS)
+                for extension, (formato, _, opciones) in FORMATOS.items():
+                    ruta = ruta_variante(hash_contenido, variante, extension)
+                    if not ruta.exists():
+                        _guardar(ruta, recortada, formato, opciones)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ErrorImagen(f'Imagen inválida: {e}') from e
+    return hash_contenido
+
+
+def procesar_origen(url):
+    """Devuelve el hash del origen, descargándolo solo si es nuevo"""
+    url_hash = ImagenOrigen.hash_url(url)
+    existente = ImagenOrigen.objects.filter(url_hash=url_hash).values_list('hash', flat=True).first()
+    if existente and ruta_variante(existente, '400x300', 'jpg').exists():
+        return existente
+
+    clave_error = f'tienda:imagen_error:{url_hash}'
+    error = cache.get(clave_error)
+    if error:
+        raise ErrorImagen(error)
+    try:
+        try:
+            contenido = _descargar(url)
+        except requests.RequestException as e:
+            raise ErrorImagen(f'No se pudo descargar {url}: {e}') from e
+        hash_contenido = generar_variantes(contenido)
+    except ErrorImagen as e:
+        cache.set(clave_error, str(e), ERROR_TIMEOUT)
+        raise
+    try:
+        ImagenOrigen.objects.update_or_create(
+            url_hash=url_hash, defaults={'url': url, 'hash': hash_contenido}
+        )
+    except IntegrityError:
+        # Otro proceso lo registró en paralelo con el mismo contenido
+        pass
+    return hash_contenido
+
+
+def procesar_producto(producto):
+    """
+    Procesa la imagen del producto y guarda el hash (o `imagen_fallida` si
+    no se pudo). Devuelve el hash.
+    """
+    # update(): no dispara signals (facetas, carritos) por un dato de presentación
+    try:
+        hash_contenido = procesar_origen(producto.url_imagen_origen())
+    except ErrorImagen:
+        if not producto.imagen_fallida:
+            Producto.objects.filter(pk=producto.pk).update(imagen_fallida=True)
+            producto.imagen_fallida = True
+        raise
+    if producto.imagen_hash != hash_contenido or producto.imagen_fallida:
+        Producto.objects.filter(pk=producto.pk).update(imagen_hash=hash_contenido, imagen_fallida=False)
+        producto.imagen_hash = hash_contenido
+        producto.imagen_fallida = False
+    return hash_contenido
+
+
+def procesar_en_segundo_plano(producto_id):
+    """Encola el procesamiento del producto (uno a la vez por producto)"""
+    clave_lock = f'tienda:imagen_procesando:{producto_id}'
+    # cache.add es atómico: varias tarjetas del mismo producto, una descarga
+    if not cache.add(clave_lock, True, TIMEOUT_DESCARGA * 3):
+        return
+
+    def tarea():
+        try:
+            producto = Producto.objects.only(
+                'id', 'title', 'image', 'categoria', 'imagen_hash', 'imagen_fallida'
+            ).filter(pk=producto_id).first()
+            if producto is not None and not producto.imagen_hash:
+                procesar_producto(producto)
+        except ErrorImagen as e:
+            logger.warning(f"Imagen del producto {producto_id}: {e}")
+        except Exception:
+            logger.exception(f"Error procesando la imagen del producto {producto_id}")
+        finally:
+            cache.delete(clave_lock)
+            connection.close()
+
+    _executor.submit(tarea)
+
+
+def elegir_formato(accept):
+    return 'webp' if 'image/webp' in (accept or '') else 'jpg'
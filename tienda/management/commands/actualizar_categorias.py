@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from tienda.categorias import recalcular_categorias
+from tienda.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la categoría de los productos a partir del título (backfill)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Productos por bulk_update')
+
+    def handle(self, *args, **options):
+        self.stdout.write('🏷️ Recalculando categorías de productos...')
+
+        actualizados = recalcular_categorias(Producto.objects.all(), tamano_lote=options['lote'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ {actualizados} productos cambiaron de categoría')
+        )
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ecommerce import cliente_http
+from tienda.tiempo import COASTS_RIVERS, FRESCO, refrescar_todos
+
+
+class Command(BaseCommand):
+    help = (
+        'Refresca en segundo plano el tiempo, mareas y luna de todos los lugares '
+        '(requiere una cache compartida, CACHE_URL)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Refresca una vez y termina (por defecto queda en loop)',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=FRESCO - 60,
+            help=f'Segundos entre refrescos (default: {FRESCO - 60}, antes de que venza la cache)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'🌦 Refrescando el tiempo de {len(COASTS_RIVERS)} lugares...')
+
+        try:
+            while True:
+                inicio = time.monotonic()
+                correctos = refrescar_todos()
+                self.stdout.write(
+                    f'   🌊 {correctos}/{len(COASTS_RIVERS)} lugares actualizados '
+                    f'en {time.monotonic() - inicio:.1f}s'
+                )
+                if options['verbosity'] >= 2:
+                    for nombre, datos in cliente_http.metricas().items():
+                        self.stdout.write(f'      📡 {nombre}: {datos}')
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS('✅ Refresco del tiempo detenido'))
@@ -0,0 +1,111 @@
+import csv
+import json
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from tienda import mareas
+from tienda.tiempo import COASTS_RIVERS
+
+# En orden de importancia: si el registro es corto se omiten las últimas
+CONSTITUYENTES = 'M2,S2,K1,O1,N2,K2,P1,Q1,M4,MS4,MN4,Mf,Mm'
+
+
+def _timestamp(valor):
+    try:
+        return float(valor)
+    except ValueError:
+        pass
+    try:
+        fecha = datetime.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f'Fecha inválida: {valor} (usar ISO 8601 o timestamp unix)')
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=mareas.ZONA_HORARIA)
+    return fecha.timestamp()
+
+
+def _leer_observaciones(ruta):
+    tiempos, alturas = [], []
+    with open(ruta, newline='', encoding='utf-8') as archivo:
+        for numero, fila in enumerate(csv.reader(archivo), start=1):
+            if not fila or fila[0].startswith('#'):
+                continue
+            try:
+                altura = float(fila[1])
+            except (IndexError, ValueError):
+                if numero == 1:
+                    continue  # encabezado
+                raise CommandError(f'Línea {numero} inválida: {fila}')
+            tiempos.append(_timestamp(fila[0].strip()))
+            alturas.append(altura)
+    return np.array(tiempos), np.array(alturas)
+
+
+class Command(BaseCommand):
+    help = 'Ajusta las constantes armónicas de marea de un lugar a partir de observaciones (CSV fecha,altura)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('lugar', help='Nombre del lugar, como en la página del tiempo')
+        parser.add_argument('observaciones', help='CSV con fecha (ISO 8601 o timestamp) y altura en metros')
+        parser.add_argument(
+            '--constituyentes',
+            default=CONSTITUYENTES,
+            help=f'Constituyentes a ajustar, separadas por coma (default: {CONSTITUYENTES})',
+        )
+        parser.add_argument(
+            '--archivo',
+            default=mareas.CALIBRACION,
+            help=f'Archivo de calibración a actualizar (default: {mareas.CALIBRACION})',
+        )
+
+    def handle(self, *args, **options):
+        lugar = options['lugar']
+        if lugar not in {l['name'] for l in COASTS_RIVERS}:
+            raise CommandError(f'Lugar desconocido: {lugar}')
+        pedidas = [c.strip() for c in options['constituyentes'].split(',') if c.strip()]
+        desconocidas = [c for c in pedidas if c not in mareas.DOODSON]
+        if desconocidas:
+            raise CommandError(f'Constituyentes desconocidas: {", ".join(desconocidas)}')
+
+        tiempos, alturas = _leer_observaciones(options['observaciones'])
+        if len(tiempos) < 2 * len(pedidas) + 1:
+            raise CommandError(f'Muy pocas observaciones ({len(tiempos)})')
+        duracion = (tiempos.max() - tiempos.min()) / 3600
+        self.stdout.write(f'🌊 {len(tiempos)} observaciones de {lugar} en {duracion / 24:.1f} días')
+
+        usadas, omitidas = mareas.resolubles(pedidas, duracion)
+        if omitidas:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ Registro corto, se omiten: {", ".join(omitidas)}'
+            ))
+
+        contenido = mareas.leer(options['archivo'])
+        z0, constituyentes = mareas.ajustar(tiempos, alturas, usadas)
+        contenido['estaciones'][lugar] = {'z0': round(z0, 4), 'constituyentes': constituyentes}
+
+        estacion = mareas.Estacion(lugar, z0, constituyentes)
+        residuo = np.sqrt(np.mean((estacion.alturas(tiempos) - alturas) ** 2))
+        for nombre, (amplitud, fase) in constituyentes.items():
+            self.stdout.write(f'   {nombre:>4}: H={amplitud:.3f} m  g={fase:6.1f}°')
+
+        # Temporal + rename: la web nunca lee un archivo a medias
+        destino = Path(options['archivo'])
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        descriptor, temporal = tempfile.mkstemp(dir=destino.parent, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as archivo:
+                json.dump(contenido, archivo, ensure_ascii=False, indent=2)
+                archivo.write('\n')
+            os.replace(temporal, destino)
+        except BaseException:
+            os.unlink(temporal)
+            raise
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {lugar} calibrado con {len(usadas)} constituyentes (error RMS {residuo:.3f} m)'
+        ))
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tienda.notificaciones import despachar
+
+
+class Command(BaseCommand):
+    help = 'Despacha las notificaciones pendientes del outbox (email y Telegram) con reintentos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesa lo pendiente y termina (por defecto queda escuchando)',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera cuando no hay pendientes (default: 2)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=10,
+            help='Notificaciones tomadas por vuelta (default: 10; la reserva del lote crece con su tamaño)',
+        )
+        parser.add_argument(
+            '--concurrencia',
+            type=int,
+            default=4,
+            help='Envíos simultáneos como máximo (default: 4)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('📬 Despachando notificaciones...')
+
+        total_enviadas = total_fallidas = 0
+        try:
+            while True:
+                enviadas, fallidas = despachar(options['lote'], options['concurrencia'])
+                total_enviadas += enviadas
+                total_fallidas += fallidas
+                if enviadas or fallidas:
+                    self.stdout.write(f'   📤 {enviadas} enviadas, {fallidas} con error')
+                elif options['una_vez']:
+                    break
+                else:
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ {total_enviadas} notificaciones enviadas, {total_fallidas} con error')
+        )
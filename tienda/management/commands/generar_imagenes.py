@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from tienda import imagenes
+from tienda.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Descarga y genera las variantes locales de las imágenes de productos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true', help='Revisar también los que ya tienen imagen local (regenera archivos faltantes)')
+
+    def handle(self, *args, **options):
+        self.stdout.write('🖼️ Generando imágenes de productos...')
+
+        # Sin hash entran también las fallidas: se reintentan
+        productos = Producto.objects.only('id', 'title', 'image', 'categoria', 'imagen_hash', 'imagen_fallida')
+        if not options['todos']:
+            productos = productos.filter(imagen_hash='')
+
+        procesados = fallidos = 0
+        for producto in productos.iterator():
+            try:
+                imagenes.procesar_producto(producto)
+                procesados += 1
+            except imagenes.ErrorImagen as e:
+                fallidos += 1
+                self.stdout.write(self.style.WARNING(f'⚠️ Producto {producto.pk}: {e}'))
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ {procesados} imágenes listas, {fallidos} con error')
+        )
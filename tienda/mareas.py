@@ -0,0 +1,264 @@
+"""
+Predicción local de mareas por análisis armónico.
+
+La altura en una estación es la suma de sus constituyentes armónicas:
+
+    h(t) = z0 + Σ f_i · H_i · cos(V_i(t) + u_i(t) − g_i)
+
+con `H_i` la amplitud (m) y `g_i` la fase de Greenwich (grados, referida a
+UTC) de la estación, tal como las publican las tablas de constantes
+armónicas. `V_i` es el argumento astronómico de la constituyente (números
+de Doodson sobre las longitudes medias de la Luna, el Sol, el perigeo y el
+nodo lunar) y `f_i`, `u_i` las correcciones nodales del ciclo de 18,6 años
+(fórmulas de Schureman). ``manage.py calibrar_mareas`` ajusta H y g con el
+mismo modelo a partir de observaciones.
+
+Es el respaldo sin conexión de la página del tiempo: WorldTides se usa si
+hay API key. El archivo (JSON, `CALIBRACION`) se relee si cambia; alturas
+y extremos se calculan con NumPy sobre toda la ventana de una vez.
+"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CALIBRACION = os.getenv('MAREAS_CALIBRACION', str(Path(__file__).resolve().parent / 'data' / 'mareas.json'))
+ZONA_HORARIA = ZoneInfo('America/Argentina/Buenos_Aires')
+
+# J2000.0 (2000-01-01 12:00 UTC) como timestamp unix
+J2000 = 946728000.0
+
+# Números de Doodson (τ, s, h, p, N', p1) y fase adicional en grados
+DOODSON = {
+    'M2': ((2, 0, 0, 0, 0, 0), 0),
+    'S2': ((2, 2, -2, 0, 0, 0), 0),
+    'N2': ((2, -1, 0, 1, 0, 0), 0),
+    'K2': ((2, 2, 0, 0, 0, 0), 0),
+    'K1': ((1, 1, 0, 0, 0, 0), 90),
+    'O1': ((1, -1, 0, 0, 0, 0), -90),
+    'P1': ((1, 1, -2, 0, 0, 0), -90),
+    'Q1': ((1, -2, 0, 1, 0, 0), -90),
+    'M4': ((4, 0, 0, 0, 0, 0), 0),
+    'MS4': ((4, 2, -2, 0, 0, 0), 0),
+    'MN4': ((4, -1, 0, 1, 0, 0), 0),
+    'Mf': ((0, 2, 0, 0, 0, 0), 0),
+    'Mm': ((0, 1, 0, -1, 0, 0), 0),
+}
+CONSTITUYENTES = list(DOODSON)
+
+# Muestreo para ubicar pleamares y bajamares (luego se refina)
+PASO_EXTREMOS = 60 * 10
+
+
+def _longitudes(tiempos):
+    """
+    Argumentos astronómicos (τ, s, h, p, N', p1) en grados para cada
+    timestamp, y la longitud del nodo N. Forma (6, n) y (n,).
+    """
+    dias = (np.asarray(tiempos, dtype=float) - J2000) / 86400
+    s = 218.3164 + 13.17639648 * dias  # longitud media de la Luna
+    h = 280.4661 + 0.98564736 * dias  # longitud media del Sol
+    p = 83.3535 + 0.11140353 * dias  # perigeo lunar
+    n = 125.0445 - 0.05295377 * dias  # nodo ascendente lunar
+    p1 = 282.9384 + 0.00004707 * dias  # perigeo solar
+    # Tiempo lunar medio: ángulo horario del Sol medio + h − s
+    horas_ut = (dias + 0.5) % 1 * 24
+    tau = 15 * horas_ut + 180 + h - s
+    return np.stack([tau, s, h, p, -n, p1]), n
+
+
+def _nodales(nombres, n):
+    """Factores f y correcciones u (grados) por constituyente, forma (n, k)"""
+    N = np.radians(n)[:, None]
+    cos, sin = np.cos, np.sin
+    f_m2 = 1.0004 - 0.0373 * cos(N) + 0.0002 * cos(2 * N)
+    u_m2 = -2.14 * sin(N)
+    f_k1 = 1.0060 + 0.1150 * cos(N) - 0.0088 * cos(2 * N) + 0.0006 * cos(3 * N)
+    u_k1 = -8.86 * sin(N) + 0.68 * sin(2 * N) - 0.07 * sin(3 * N)
+    f_o1 = 1.0089 + 0.1871 * cos(N) - 0.0147 * cos(2 * N) + 0.0014 * cos(3 * N)
+    u_o1 = 10.80 * sin(N) - 1.34 * sin(2 * N) + 0.19 * sin(3 * N)
+    f_k2 = 1.0241 + 0.2863 * cos(N) + 0.0083 * cos(2 * N) - 0.0015 * cos(3 * N)
+    u_k2 = -17.74 * sin(N) + 0.68 * sin(2 * N) - 0.04 * sin(3 * N)
+    f_mf = 1.043 + 0.414 * cos(N)
+    u_mf = -23.7 * sin(N) + 2.7 * sin(2 * N) - 0.4 * sin(3 * N)
+    uno, cero = np.ones_like(N), np.zeros_like(N)
+    correcciones = {
+        'M2': (f_m2, u_m2), 'N2': (f_m2, u_m2), 'S2': (uno, cero),
+        'K2': (f_k2, u_k2), 'K1': (f_k1, u_k1), 'O1': (f_o1, u_o1),
+        'Q1': (f_o1, u_o1), 'P1': (uno, cero),
+        'M4': (f_m2 ** 2, 2 * u_m2), 'MN4': (f_m2 ** 2, 2 * u_m2), 'MS4': (f_m2, u_m2),
+        'Mf': (f_mf, u_mf), 'Mm': (1.000 - 0.130 * np.cos(N), cero),
+    }
+    f = np.hstack([correcciones[nombre][0] for nombre in nombres])
+    u = np.hstack([correcciones[nombre][1] for nombre in nombres])
+    return f, u
+
+
+def argumentos(nombres, tiempos):
+    """
+    (f, V + u en radianes) de cada constituyente para cada timestamp,
+    matrices de forma (n, k)
+    """
+    longitudes, n = _longitudes(tiempos)
+    numeros = np.array([DOODSON[nombre][0] for nombre in nombres], dtype=float)
+    adicional = np.array([DOODSON[nombre][1] for nombre in nombres], dtype=float)
+    f, u = _nodales(nombres, n)
+    return f, np.radians(longitudes.T @ numeros.T + adicional + u)
+
+
+class Estacion:
+    def __init__(self, nombre, z0, constituyentes):
+        self.nombre = nombre
+        self.z0 = float(z0)
+        self.nombres = [n for n in constituyentes if n in DOODSON]
+        desconocidas = set(constituyentes) - set(self.nombres)
+        if desconocidas:
+            raise ValueError(f'Constituyentes desconocidas: {", ".join(sorted(desconocidas))}')
+        self.amplitud = np.array([constituyentes[n][0] for n in self.nombres], dtype=float)
+        self.fase = np.radians([constituyentes[n][1] for n in self.nombres])
+
+    def alturas(self, tiempos):
+        """Alturas (m) para un array de timestamps unix"""
+        f, argumento = argumentos(self.nombres, np.atleast_1d(tiempos))
+        return self.z0 + (f * np.cos(argumento - self.fase)) @ self.amplitud
+
+    def extremos(self, inicio, fin, paso=PASO_EXTREMOS):
+        """
+        Pleamares y bajamares entre `inicio` y `fin` (timestamps). Devuelve
+        (tiempos, alturas, es_pleamar) como arrays.
+        """
+        tiempos = np.arange(inicio - paso, fin + 2 * paso, paso, dtype=float)
+        alturas = self.alturas(tiempos)
+        pendiente = np.sign(np.diff(alturas))
+        # Índices donde la pendiente cambia de signo
+        i = np.flatnonzero(pendiente[:-1] != pendiente[1:]) + 1
+        # Vértice de la parábola por los tres puntos alrededor de cada cambio
+        y0, y1, y2 = alturas[i - 1], alturas[i], alturas[i + 1]
+        curvatura = y0 - 2 * y1 + y2
+        desplazamiento = np.divide(y0 - y2, 2 * curvatura, out=np.zeros_like(y1), where=curvatura != 0)
+        tiempos_extremos = tiempos[i] + desplazamiento * paso
+        dentro = (tiempos_extremos >= inicio) & (tiempos_extremos < fin)
+        tiempos_extremos = tiempos_extremos[dentro]
+        return tiempos_extremos, self.alturas(tiempos_extremos), curvatura[dentro] < 0
+
+
+_estaciones = {}
+_cargado = None
+_lock = threading.Lock()
+
+
+def leer(ruta=None):
+    """Contenido del archivo de calibración (sin estaciones si no existe)"""
+    ruta = Path(ruta or CALIBRACION)
+    if not ruta.exists():
+        return {'estaciones': {}}
+    with open(ruta, encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+def _cargar(contenido):
+    estaciones = {}
+    for nombre, datos in contenido['estaciones'].items():
+        try:
+            estaciones[nombre] = Estacion(nombre, datos['z0'], datos['constituyentes'])
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            logger.error(f"Calibración de mareas inválida para {nombre}: {e!r}")
+    return estaciones
+
+
+def estaciones():
+    """Estaciones calibradas por nombre; se recargan si el archivo cambió"""
+    global _estaciones, _cargado
+    try:
+        version = os.stat(CALIBRACION).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    with _lock:
+        if version != _cargado:
+            try:
+                _estaciones = _cargar(leer())
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"No se pudo leer la calibración de mareas {CALIBRACION}: {e!r}")
+            _cargado = version
+        return _estaciones
+
+
+def _fecha(ts):
+    return datetime.fromtimestamp(ts, ZONA_HORARIA).strftime('%Y-%m-%dT%H:%M%z')
+
+
+def predecir(nombre, inicio, horas=24, paso=60 * 60 * 3):
+    """
+    Mareas de la estación `nombre` desde `inicio` (timestamp) en el formato
+    de WorldTides ({"mareas": [...], "extremos": [...]}). None si no está
+    calibrada.
+    """
+    estacion = estaciones().get(nombre)
+    if estacion is None:
+        return None
+    # Alturas en horarios redondos
+    primero = -(-int(inicio) // paso) * paso
+    fin = inicio + horas * 3600
+    tiempos = np.arange(primero, fin, paso)
+    alturas = estacion.alturas(tiempos)
+    tiempos_extremos, alturas_extremos, pleamares = estacion.extremos(inicio, fin)
+    return {
+        "mareas": [
+            {"dt": int(t), "date": _fecha(t), "height": round(float(h), 2)}
+            for t, h in zip(tiempos, alturas)
+        ],
+        "extremos": [
+            {"dt": int(t), "date": _fecha(t), "height": round(float(h), 2), "type": "High" if alta else "Low"}
+            for t, h, alta in zip(tiempos_extremos, alturas_extremos, pleamares)
+        ],
+    }
+
+
+def ajustar(tiempos, alturas, constituyentes):
+    """
+    Ajusta por mínimos cuadrados z0 y (H, g de Greenwich) de cada
+    constituyente a observaciones (timestamps, alturas).
+    Devuelve (z0, {nombre: [H, g]}).
+    """
+    f, argumento = argumentos(constituyentes, tiempos)
+    # f·H·cos(V + u − g) = H·cos(g)·f·cos(V + u) + H·sin(g)·f·sin(V + u)
+    diseno = np.hstack([np.ones((len(tiempos), 1)), f * np.cos(argumento), f * np.sin(argumento)])
+    coeficientes, *_ = np.linalg.lstsq(diseno, np.asarray(alturas, dtype=float), rcond=None)
+    k = len(constituyentes)
+    a, b = coeficientes[1:k + 1], coeficientes[k + 1:]
+    amplitudes = np.hypot(a, b)
+    fases = np.degrees(np.arctan2(b, a)) % 360
+    return float(coeficientes[0]), {
+        n: [round(float(H), 4), round(float(g), 2)] for n, H, g in zip(constituyentes, amplitudes, fases)
+    }
+
+
+def velocidad(nombre):
+    """Velocidad angular de la constituyente en grados por hora"""
+    # Derivadas de τ, s, h, p, N', p1 en grados por hora
+    tasas = np.array([14.4920521, 0.5490165, 0.0410686, 0.0046418, 0.0022064, 0.0000020])
+    return float(np.dot(DOODSON[nombre][0], tasas))
+
+
+def resolubles(constituyentes, duracion_horas):
+    """
+    Las constituyentes separables en un registro de `duracion_horas`
+    (criterio de Rayleigh), en orden de prioridad. Devuelve (usadas, omitidas).
+    """
+    usadas, omitidas = [], []
+    for nombre in constituyentes:
+        periodo_minimo = [
+            360 / abs(velocidad(nombre) - velocidad(otra)) for otra in usadas
+        ] + [360 / velocidad(nombre)]
+        if duracion_horas >= max(periodo_minimo):
+            usadas.append(nombre)
+        else:
+            omitidas.append(nombre)
+    return usadas, omitidas
@@ -0,0 +1,89 @@
+from django.db import migrations
+
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE tienda_producto ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish'::regconfig, coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('spanish'::regconfig, coalesce(marca, '')), 'B') ||
+        setweight(to_tsvector('spanish'::regconfig, coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX tienda_producto_search_gin ON tienda_producto USING GIN (search_vector)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS tienda_producto_search_gin",
+    "ALTER TABLE tienda_producto DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE tienda_producto_fts USING fts5(
+        title, marca, description,
+        content='tienda_producto', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER tienda_producto_fts_ai AFTER INSERT ON tienda_producto BEGIN
+        INSERT INTO tienda_producto_fts(rowid, title, marca, description)
+        VALUES (new.id, new.title, new.marca, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER tienda_producto_fts_ad AFTER DELETE ON tienda_producto BEGIN
+        INSERT INTO tienda_producto_fts(tienda_producto_fts, rowid, title, marca, description)
+        VALUES ('delete', old.id, old.title, old.marca, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER tienda_producto_fts_au AFTER UPDATE ON tienda_producto BEGIN
+        INSERT INTO tienda_producto_fts(tienda_producto_fts, rowid, title, marca, description)
+        VALUES ('delete', old.id, old.title, old.marca, old.description);
+        INSERT INTO tienda_producto_fts(rowid, title, marca, description)
+        VALUES (new.id, new.title, new.marca, new.description);
+    END
+    """,
+    "INSERT INTO tienda_producto_fts(tienda_producto_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS tienda_producto_fts_au",
+    "DROP TRIGGER IF EXISTS tienda_producto_fts_ad",
+    "DROP TRIGGER IF EXISTS tienda_producto_fts_ai",
+    "DROP TABLE IF EXISTS tienda_producto_fts",
+]
+
+
+def _ejecutar(schema_editor, sentencias):
+    for sql in sentencias:
+        schema_editor.execute(sql)
+
+
+def crear_indice_busqueda(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _ejecutar(schema_editor, POSTGRES_FORWARD)
+    elif vendor == 'sqlite':
+        _ejecutar(schema_editor, SQLITE_FORWARD)
+
+
+def eliminar_indice_busqueda(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _ejecutar(schema_editor, POSTGRES_BACKWARD)
+    elif vendor == 'sqlite':
+        _ejecutar(schema_editor, SQLITE_BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0010_producto_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice_busqueda, eliminar_indice_busqueda),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0011_producto_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['created_at', 'id'], name='tienda_prod_created_e07239_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['price', 'id'], name='tienda_prod_price_51243c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['title', 'id'], name='tienda_prod_title_f7f894_idx'),
+        ),
+    ]
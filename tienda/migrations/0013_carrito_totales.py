@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:58
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def calcular_totales(apps, schema_editor):
+    Carrito = apps.get_model('tienda', 'Carrito')
+    CarritoItem = apps.get_model('tienda', 'CarritoItem')
+    items = CarritoItem.objects.filter(carrito=OuterRef('pk')).order_by().values('carrito')
+    Carrito.objects.update(
+        item_count=Coalesce(Subquery(items.annotate(s=Sum('cantidad')).values('s')), 0),
+        total=Coalesce(
+            Subquery(items.annotate(
+                s=Sum(F('cantidad') * F('producto__price'), output_field=models.DecimalField())
+            ).values('s')),
+            Value(0),
+            output_field=models.DecimalField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0012_producto_tienda_prod_created_e07239_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carrito',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='carrito',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(calcular_totales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0013_carrito_totales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carrito',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
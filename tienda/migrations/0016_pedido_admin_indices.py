@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:06
+
+from django.db import DatabaseError, migrations, models, transaction
+
+# Búsqueda del admin de pedidos: Django resuelve `icontains` en PostgreSQL
+# como UPPER(col::text) LIKE UPPER(%s), así que los índices trigram van
+# sobre esa misma expresión. El de auth_user (búsqueda por email) vive en
+# usuarios/migrations/0005_user_email_trgm.py: esta app no crea índices
+# sobre tablas ajenas.
+INDICES_TRIGRAM = [
+    ('tienda_pedido_direccion_trgm', 'tienda_pedido', 'direccion_envio'),
+]
+
+
+def crear_indices_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DatabaseError:
+        # Sin permisos para la extensión: la búsqueda funciona igual, sin índice
+        return
+    for nombre, tabla, columna in INDICES_TRIGRAM:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} '
+            f'USING GIN (UPPER({columna}::text) gin_trgm_ops)'
+        )
+
+
+def eliminar_indices_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre, _, _ in INDICES_TRIGRAM:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {nombre}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0015_notificacion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['-fecha_pedido'], name='tienda_pedi_fecha_p_4bc7fa_idx'),
+        ),
+        migrations.RunPython(crear_indices_busqueda, eliminar_indices_busqueda),
+    ]
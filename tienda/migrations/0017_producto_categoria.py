@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:08
+
+from django.db import migrations, models
+
+# Copia congelada de las reglas de tienda/categorias.py a la fecha de esta
+# migración: si las reglas cambian, `manage.py actualizar_categorias`
+# recalcula, pero el historial de migraciones no depende del código vivo.
+CATEGORIAS = [
+    ('canas', ['caña', 'rod', 'vara', 'telescópica']),
+    ('reels', ['reel', 'carrete', 'frontal', 'rotativo']),
+    ('anzuelos', ['anzuelo', 'hook', 'círculo', 'j-hook']),
+    ('senuelos', ['carnada', 'señuelo', 'artificial', 'spinner', 'cuchara']),
+    ('plomadas', ['plomada', 'peso', 'sinker', 'pirámide']),
+    ('lineas', ['línea', 'nylon', 'monofilamento', 'multifilamento']),
+    ('cajas', ['caja', 'organizadora', 'tackle+box']),
+    ('sillas', ['silla', 'chair', 'asiento']),
+    ('redes', ['red', 'net', 'landing']),
+    ('carnada_viva', ['lombriz', 'carnada+viva', 'gusano']),
+]
+
+
+def clasificar(title):
+    title = (title or '').lower()
+    for slug, palabras in CATEGORIAS:
+        if any(palabra in title for palabra in palabras):
+            return slug
+    return 'general'
+
+
+def calcular_categorias(apps, schema_editor):
+    Producto = apps.get_model('tienda', 'Producto')
+    productos = []
+    for producto in Producto.objects.only('id', 'title').iterator(chunk_size=1000):
+        producto.categoria = clasificar(producto.title)
+        productos.append(producto)
+    Producto.objects.bulk_update(productos, ['categoria'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0016_pedido_admin_indices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='categoria',
+            field=models.CharField(choices=[('canas', 'Cañas'), ('reels', 'Reels'), ('anzuelos', 'Anzuelos'), ('senuelos', 'Señuelos'), ('plomadas', 'Plomadas'), ('lineas', 'Líneas'), ('cajas', 'Cajas'), ('sillas', 'Sillas'), ('redes', 'Redes'), ('carnada_viva', 'Carnada viva'), ('general', 'General')], db_index=True, default='general', max_length=20),
+        ),
+        migrations.RunPython(calcular_categorias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0018_imagenes_locales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_fallida',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -1,7 +1,28 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 import hashlib
 
+from .carrito_cache import invalidar_carritos
+from .categorias import CATEGORIA_CHOICES, CATEGORIA_GENERAL, clasificar, imagen_de
+
+
+class ImagenOrigen(models.Model):
+    """Origen de imagen ya descargado y procesado (uno por URL)"""
+    url_hash = models.CharField(max_length=64, unique=True)
+    url = models.TextField()
+    hash = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @staticmethod
+    def hash_url(url):
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def __str__(self):
+        return self.url
+
 
 class Producto(models.Model):
     seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="productos")
@@ -13,77 +34,68 @@ class Producto(models.Model):
     image = models.URLField(blank=True, null=True, help_text="URL de la imagen del producto")
     created_at = models.DateTimeField(auto_now_add=True)
     active = models.BooleanField(default=True)
+    # Calculada del título al guardar (ver tienda/categorias.py)
+    categoria = models.CharField(
+        max_length=20, choices=CATEGORIA_CHOICES, default=CATEGORIA_GENERAL, db_index=True
+    )
+    # Hash de las variantes locales de la imagen (ver tienda/imagenes.py)
+    imagen_hash = models.CharField(max_length=64, blank=True, editable=False)
+    # El origen no se pudo procesar: se muestra directo hasta que cambie
+    imagen_fallida = models.BooleanField(default=False, editable=False)
+
+    # Valores leídos de la base: save() solo recalcula lo que depende de ellos si cambiaron
+    CAMPOS_SEGUIDOS = ('title', 'image', 'categoria', 'price', 'marca', 'active')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._cargados = {
+            campo: valor for campo, valor in zip(field_names, values) if campo in cls.CAMPOS_SEGUIDOS
+        }
+        return instancia
+
+    def cambiaron(self, *campos):
+        """True si algún campo difiere de lo leído de la base (o no se leyó)"""
+        cargados = getattr(self, '_cargados', {})
+        return any(campo not in cargados or cargados[campo] != getattr(self, campo) for campo in campos)
+
+    def cargado(self, campo):
+        """Valor de `campo` leído de la base (el actual si no se leyó)"""
+        return getattr(self, '_cargados', {}).get(campo, getattr(self, campo))
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        origen = {'title', 'image'} if update_fields is None else {'title', 'image'} & set(update_fields)
+        if 'title' in origen and self.cambiaron('title'):
+            self.categoria = clasificar(self.title)
+        # Si cambió el origen (image o categoría), el hash vuelve a resolverse
+        if origen and self.cambiaron('image', 'categoria'):
+            self.imagen_hash = ImagenOrigen.objects.filter(
+                url_hash=ImagenOrigen.hash_url(self.url_imagen_origen())
+            ).values_list('hash', flat=True).first() or ''
+            self.imagen_fallida = False
+        if update_fields is not None and origen:
+            kwargs['update_fields'] = {*update_fields, 'categoria', 'imagen_hash', 'imagen_fallida'}
+        super().save(*args, **kwargs)
+        guardados = kwargs.get('update_fields') or self.CAMPOS_SEGUIDOS
+        self._cargados = {
+            **getattr(self, '_cargados', {}),
+            **{campo: getattr(self, campo) for campo in self.CAMPOS_SEGUIDOS if campo in guardados},
+        }
+
+    def url_imagen_origen(self):
+        """Imagen cargada o placeholder de Unsplash según la categoría"""
+        return self.image or f"https://source.unsplash.com/400x300/?{imagen_de(self.categoria)}"
 
     def get_image_url(self):
-        """Retorna la imagen del producto o una imagen placeholder automática"""
-        if self.image:
-            return self.image
-        
-        # Generar imagen placeholder inteligente basada en el producto
-        title_lower = self.title.lower()
-        
-        # Detectar categorías específicas de equipamiento de pesca
-        if any(word in title_lower for word in ['caña', 'rod', 'vara', 'telescópica']):
-            category = 'fishing+rod'
-        elif any(word in title_lower for word in ['reel', 'carrete', 'frontal', 'rotativo']):
-            category = 'fishing+reel'  
-        elif any(word in title_lower for word in ['anzuelo', 'hook', 'círculo', 'j-hook']):
-            category = 'fishing+hook'
-        elif any(word in title_lower for word in ['carnada', 'señuelo', 'artificial', 'spinner', 'cuchara']):
-            category = 'fishing+lure'
-        elif any(word in title_lower for word in ['plomada', 'peso', 'sinker', 'pirámide']):
-            category = 'fishing+weight'
-        elif any(word in title_lower for word in ['línea', 'nylon', 'monofilamento', 'multifilamento']):
-            category = 'fishing+line'
-        elif any(word in title_lower for word in ['caja', 'organizadora', 'tackle+box']):
-            category = 'tackle+box'
-        elif any(word in title_lower for word in ['silla', 'chair', 'asiento']):
-            category = 'fishing+chair'
-        elif any(word in title_lower for word in ['red', 'net', 'landing']):
-            category = 'fishing+net'
-        elif any(word in title_lower for word in ['lombriz', 'carnada+viva', 'gusano']):
-            category = 'fishing+bait'
-        else:
-            category = 'fishing+equipment'  # Equipamiento genérico de pesca
-        
-        # Usar un seed basado en el ID para consistencia
-        seed = f"{category}-{self.id}" if hasattr(self, 'id') and self.id else category
-        
-        # Unsplash con fallback a Picsum si falla
-        return f"https://source.unsplash.com/400x300/?{category}"
+        """Retorna la imagen del producto (400x300) servida localmente"""
+        from .imagenes import url_imagen
+        return url_imagen(self, '400x300')
     
     def get_thumbnail_url(self):
         """Retorna una versión thumbnail de la imagen"""
-        if self.image:
-            return self.image
-        
-        # Misma lógica para equipamiento de pesca en thumbnail
-        title_lower = self.title.lower()
-        
-        if any(word in title_lower for word in ['caña', 'rod', 'vara', 'telescópica']):
-            category = 'fishing+rod'
-        elif any(word in title_lower for word in ['reel', 'carrete', 'frontal', 'rotativo']):
-            category = 'fishing+reel'  
-        elif any(word in title_lower for word in ['anzuelo', 'hook', 'círculo', 'j-hook']):
-            category = 'fishing+hook'
-        elif any(word in title_lower for word in ['carnada', 'señuelo', 'artificial', 'spinner', 'cuchara']):
-            category = 'fishing+lure'
-        elif any(word in title_lower for word in ['plomada', 'peso', 'sinker', 'pirámide']):
-            category = 'fishing+weight'
-        elif any(word in title_lower for word in ['línea', 'nylon', 'monofilamento', 'multifilamento']):
-            category = 'fishing+line'
-        elif any(word in title_lower for word in ['caja', 'organizadora', 'tackle+box']):
-            category = 'tackle+box'
-        elif any(word in title_lower for word in ['silla', 'chair', 'asiento']):
-            category = 'fishing+chair'
-        elif any(word in title_lower for word in ['red', 'net', 'landing']):
-            category = 'fishing+net'
-        elif any(word in title_lower for word in ['lombriz', 'carnada+viva', 'gusano']):
-            category = 'fishing+bait'
-        else:
-            category = 'fishing+equipment'
-        
-        return f"https://source.unsplash.com/200x150/?{category}"
+        from .imagenes import url_imagen
+        return url_imagen(self, '200x150')
 
     def __str__(self):
         return f"{self.title} (Stock: {self.stock})"
@@ -98,11 +110,19 @@ class Producto(models.Model):
             models.Index(fields=['stock']),
             models.Index(fields=['active', 'stock']),  # Índice compuesto para consultas frecuentes
             models.Index(fields=['seller', 'active']),  # Para dashboard de vendedor
+            # Claves de paginación por cursor (ver tienda/pagination.py)
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['price', 'id']),
+            models.Index(fields=['title', 'id']),
         ]
 
 
 class Carrito(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="carrito")
+    # Totales desnormalizados: se recalculan en cada cambio de items
+    item_count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    version = models.PositiveIntegerField(default=0)  # ETag del contador (ver tienda/carrito_cache.py)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -111,11 +131,32 @@ class Carrito(models.Model):
 
     @property
     def total_items(self):
-        return sum(item.cantidad for item in self.items.all())
+        return self.item_count
 
     @property
     def total_price(self):
-        return sum(item.subtotal for item in self.items.all())
+        return self.total
+
+    @classmethod
+    def recalcular_totales(cls, carritos):
+        """Recalcula item_count/total de los carritos dados en un solo UPDATE"""
+        items = CarritoItem.objects.filter(carrito=OuterRef('pk')).order_by().values('carrito')
+        cantidad = items.annotate(s=Sum('cantidad')).values('s')
+        monto = items.annotate(
+            s=Sum(F('cantidad') * F('producto__price'), output_field=models.DecimalField())
+        ).values('s')
+        actualizados = carritos.update(
+            item_count=Coalesce(Subquery(cantidad), 0),
+            total=Coalesce(Subquery(monto), Value(0), output_field=models.DecimalField()),
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+        )
+        invalidar_carritos(carritos.values_list('user_id', flat=True))
+        return actualizados
+
+    def actualizar_totales(self):
+        Carrito.recalcular_totales(Carrito.objects.filter(pk=self.pk))
+        self.refresh_from_db(fields=['item_count', 'total', 'version', 'updated_at'])
 
     def add_item(self, producto, cantidad=1):
         """Agregar o actualizar un producto en el carrito"""
@@ -139,7 +180,13 @@ class Carrito(models.Model):
 
     def clear(self):
         """Vaciar el carrito"""
-        self.items.all().delete()
+        with transaction.atomic():
+            self.items.all().delete()
+            Carrito.objects.filter(pk=self.pk).update(
+                item_count=0, total=0, version=F('version') + 1, updated_at=timezone.now()
+            )
+        invalidar_carritos([self.user_id])
+        self.refresh_from_db(fields=['item_count', 'total', 'version', 'updated_at'])
 
 
 class CarritoItem(models.Model):
@@ -166,7 +213,15 @@ class CarritoItem(models.Model):
 
     def save(self, *args, **kwargs):
         self.full_clean()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.carrito.actualizar_totales()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            resultado = super().delete(*args, **kwargs)
+            self.carrito.actualizar_totales()
+        return resultado
 
 
 class Pedido(models.Model):
@@ -192,11 +247,26 @@ class Pedido(models.Model):
     def __str__(self):
         return f"Pedido #{self.id} - {self.user.username} - {self.estado}"
     
+    @classmethod
+    def cambiar_estado_en_lote(cls, queryset, estado):
+        """
+        Pasa a `estado` los pedidos del queryset que no lo tengan con un solo
+        UPDATE. Debe llamarse dentro de una transacción; devuelve los ids
+        realmente modificados.
+        """
+        ids = list(
+            queryset.exclude(estado=estado).select_for_update()
+            .order_by('id').values_list('id', flat=True)
+        )
+        cls.objects.filter(id__in=ids).update(estado=estado, fecha_actualizacion=timezone.now())
+        return ids
+    
     class Meta:
         ordering = ['-fecha_pedido']
         indexes = [
             models.Index(fields=['user', '-fecha_pedido']),
             models.Index(fields=['estado']),
+            models.Index(fields=['-fecha_pedido']),  # Orden del changelist del admin
         ]
 
 
@@ -212,3 +282,47 @@ class PedidoItem(models.Model):
     @property
     def subtotal(self):
         return self.cantidad * self.precio_unitario
+
+
+class Notificacion(models.Model):
+    """Outbox de notificaciones: se escribe en la misma transacción que el cambio
+    y la despacha `manage.py despachar_notificaciones` (ver tienda/notificaciones.py)"""
+    CANAL_CHOICES = [
+        ('email', 'Email'),
+        ('telegram', 'Telegram'),
+    ]
+    TIPO_CHOICES = [
+        ('pedido', 'Pedido'),
+        ('presupuesto', 'Presupuesto'),
+    ]
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('enviada', 'Enviada'),
+        ('fallida', 'Fallida'),
+    ]
+    
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="notificaciones")
+    canal = models.CharField(max_length=10, choices=CANAL_CHOICES)
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    objeto_id = models.PositiveIntegerField()  # Pedido o Presupuesto según `tipo`
+    accion = models.CharField(max_length=20, blank=True)
+    site_url = models.CharField(max_length=200, blank=True)
+    
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.PositiveSmallIntegerField(default=0)
+    # Próximo intento; al tomarla un worker se corre hacia adelante (lease)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    ultimo_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    enviada_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.get_canal_display()} {self.tipo} #{self.objeto_id} ({self.estado})"
+    
+    class Meta:
+        ordering = ['proximo_intento']
+        verbose_name = 'Notificación'
+        verbose_name_plural = 'Notificaciones'
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento']),
+        ]
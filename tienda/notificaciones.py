@@ -0,0 +1,184 @@
+"""
+Outbox de notificaciones (email y Telegram).
+
+Las vistas y acciones del admin no hablan con SMTP ni con Telegram: llaman
+a `encolar_*`, que inserta filas `Notificacion` dentro de la misma
+transacción que el pedido o presupuesto. ``manage.py despachar_notificaciones``
+las toma en lotes, las envía con concurrencia limitada y reintenta las
+fallidas con backoff exponencial.
+"""
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Notificacion, Pedido
+
+logger = logging.getLogger(__name__)
+
+MAX_INTENTOS = 6
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAX = timedelta(hours=1)
+# Holgura sobre el peor caso de envío (consultas, render del PDF)
+MARGEN_LEASE = timedelta(minutes=1)
+
+
+def _canales(email, telegram_chat_id):
+    canales = ['email'] if email else []
+    if settings.TELEGRAM_BOT_TOKEN and telegram_chat_id:
+        canales.append('telegram')
+    return canales
+
+
+def _encolar(user, tipo, objeto_id, accion='', site_url=''):
+    """Crea las notificaciones de los canales disponibles para el usuario"""
+    profile = getattr(user, 'profile', None)
+    canales = _canales(user.email, getattr(profile, 'telegram_chat_id', None))
+    Notificacion.objects.bulk_create([
+        Notificacion(
+            user=user, canal=canal, tipo=tipo, objeto_id=objeto_id,
+            accion=accion, site_url=site_url,
+        )
+        for canal in canales
+    ])
+    return canales
+
+
+def encolar_pedido(pedido, accion, site_url=''):
+    """Encola las notificaciones de un pedido. Devuelve los canales encolados."""
+    return _encolar(pedido.user, 'pedido', pedido.id, accion, site_url)
+
+
+def encolar_pedidos(pedido_ids, accion, site_url=''):
+    """
+    Encola las notificaciones de muchos pedidos con una consulta y un
+    bulk_create. Devuelve la cantidad de notificaciones creadas.
+    """
+    destinatarios = Pedido.objects.filter(id__in=pedido_ids).values_list(
+        'id', 'user_id', 'user__email', 'user__profile__telegram_chat_id'
+    )
+    notificaciones = [
+        Notificacion(
+            user_id=user_id, canal=canal, tipo='pedido', objeto_id=pedido_id,
+            accion=accion, site_url=site_url,
+        )
+        for pedido_id, user_id, email, chat_id in destinatarios.iterator()
+        for canal in _canales(email, chat_id)
+    ]
+    Notificacion.objects.bulk_create(notificaciones, batch_size=1000)
+    return len(notificaciones)
+
+
+def encolar_presupuesto(presupuesto, site_url=''):
+    """Encola las notificaciones de un presupuesto. Devuelve los canales encolados."""
+    return _encolar(presupuesto.user, 'presupuesto', presupuesto.id, site_url=site_url)
+
+
+# ---------------------------------------------------------------------------
+# Envío
+# ---------------------------------------------------------------------------
+
+def _enviar_pedido(notificacion):
+    from .views import enviar_email_pedido
+    from telegram_bot.utils import enviar_pedido_telegram
+
+    pedido = Pedido.objects.select_related('user__profile').get(pk=notificacion.objeto_id)
+    if notificacion.canal == 'email':
+        return enviar_email_pedido(pedido, notificacion.accion, notificacion.site_url)
+    return enviar_pedido_telegram(pedido.user, pedido, notificacion.accion)
+
+
+def _enviar_presupuesto(notificacion):
+    from presupuesto.models import Presupuesto
+    from presupuesto.views import enviar_email_presupuesto, generar_pdf_presupuesto
+    from telegram_bot.utils import enviar_presupuesto_telegram
+
+    presupuesto = Presupuesto.objects.select_related('user__profile').get(pk=notificacion.objeto_id)
+    if notificacion.canal == 'email':
+        return enviar_email_presupuesto(presupuesto, notificacion.site_url)
+    pdf_buffer = generar_pdf_presupuesto(presupuesto)
+    return enviar_presupuesto_telegram(presupuesto.user, presupuesto, pdf_buffer)
+
+
+ENVIOS = {
+    'pedido': _enviar_pedido,
+    'presupuesto': _enviar_presupuesto,
+}
+
+
+def _backoff(intentos):
+    return min(BACKOFF_BASE * 2 ** (intentos - 1), BACKOFF_MAX)
+
+
+def _procesar(notificacion):
+    """Envía una notificación y registra el resultado"""
+    try:
+        try:
+            enviada = ENVIOS[notificacion.tipo](notificacion)
+            error = '' if enviada else 'El envío devolvió False'
+        except Exception as e:
+            enviada, error = False, f'{type(e).__name__}: {e}'
+
+        ahora = timezone.now()
+        intentos = notificacion.intentos + 1
+        if enviada:
+            cambios = {'estado': 'enviada', 'enviada_at': ahora, 'ultimo_error': ''}
+        elif intentos >= MAX_INTENTOS:
+            cambios = {'estado': 'fallida', 'ultimo_error': error}
+            logger.error(f"Notificación {notificacion.pk} descartada tras {intentos} intentos: {error}")
+        else:
+            cambios = {'proximo_intento': ahora + _backoff(intentos), 'ultimo_error': error}
+        Notificacion.objects.filter(pk=notificacion.pk).update(intentos=intentos, **cambios)
+        return enviada
+    finally:
+        # Cada hilo del pool abre su propia conexión
+        connection.close()
+
+
+def peor_envio():
+    """Duración máxima de un envío antes de que sus timeouts lo corten"""
+    from telegram_bot.utils import TIMEOUT_ENVIO
+
+    # Telegram: mensaje y documento en secuencia
+    telegram = 2 * TIMEOUT_ENVIO
+    # SMTP: conexión, STARTTLS, login y envío, cada uno con EMAIL_TIMEOUT
+    email = 4 * settings.EMAIL_TIMEOUT
+    return timedelta(seconds=max(telegram, email)) + MARGEN_LEASE
+
+
+def lease(limite, concurrencia):
+    """
+    Reserva de un lote: mayor que lo que puede tardar su último envío
+    (los que no entran en el pool esperan turno), así un envío lento no
+    se toma de nuevo y sale dos veces
+    """
+    return peor_envio() * math.ceil(limite / concurrencia)
+
+
+def tomar_lote(limite, concurrencia=1):
+    """Reserva hasta `limite` notificaciones vencidas para este worker"""
+    ahora = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Notificacion.objects.select_for_update(skip_locked=True)
+            .filter(estado='pendiente', proximo_intento__lte=ahora)
+            .order_by('proximo_intento')
+            .values_list('id', flat=True)[:limite]
+        )
+        Notificacion.objects.filter(id__in=ids).update(proximo_intento=ahora + lease(len(ids), concurrencia))
+    return list(Notificacion.objects.filter(id__in=ids))
+
+
+def despachar(limite=10, concurrencia=4):
+    """Despacha un lote. Devuelve (enviadas, fallidas)."""
+    lote = tomar_lote(limite, concurrencia)
+    if not lote:
+        return 0, 0
+    with ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix='notificaciones') as executor:
+        resultados = list(executor.map(_procesar, lote))
+    enviadas = sum(resultados)
+    return enviadas, len(resultados) - enviadas
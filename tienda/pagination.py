@@ -0,0 +1,233 @@
+"""
+Paginación por cursor (keyset) para el catálogo y la API de productos.
+
+En lugar de ``COUNT(*)`` + ``OFFSET n`` se filtra a partir de los valores
+de la última fila vista, así el costo de cada página es constante sin
+importar qué tan profundo navegue el usuario.
+
+Para el admin, `ConteoEstimadoPaginator` evita el ``COUNT(*)`` exacto en
+tablas grandes.
+"""
+import base64
+import binascii
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+
+# Claves de ordenamiento por modo de `tienda_index`. El último campo
+# siempre es el id para que la clave sea única.
+ORDENES_KEYSET = {
+    'recientes': ('-created_at', '-id'),
+    'precio_asc': ('price', 'id'),
+    'precio_desc': ('-price', '-id'),
+    'nombre': ('title', 'id'),
+    'relevancia': ('-relevancia', '-id'),
+}
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def _serializar_valor(valor):
+    # isoformat() completo: DjangoJSONEncoder recorta a milisegundos y
+    # rompería la igualdad exacta sobre created_at
+    if isinstance(valor, datetime.datetime):
+        return valor.isoformat()
+    if isinstance(valor, decimal.Decimal):
+        return str(valor)
+    raise TypeError(f'Valor de cursor no serializable: {valor!r}')
+
+
+def _codificar_cursor(valores, direccion):
+    payload = json.dumps({'v': valores, 'd': direccion}, default=_serializar_valor)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def _decodificar_cursor(cursor):
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        return payload['v'], payload['d']
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise CursorInvalido(cursor)
+
+
+def _invertir(campo):
+    return campo[1:] if campo.startswith('-') else f'-{campo}'
+
+
+def _filtro_despues_de(ordenamiento, valores):
+    """
+    Construye el filtro "fila > cursor" para un ordenamiento compuesto:
+    (a > va) OR (a = va AND b > vb) OR ...
+    """
+    condicion = Q()
+    iguales = {}
+    for campo, valor in zip(ordenamiento, valores):
+        nombre = campo.lstrip('-')
+        lookup = 'lt' if campo.startswith('-') else 'gt'
+        condicion |= Q(**iguales, **{f'{nombre}__{lookup}': valor})
+        iguales[nombre] = valor
+    return condicion
+
+
+def _valores_de(obj, ordenamiento):
+    return [getattr(obj, campo.lstrip('-')) for campo in ordenamiento]
+
+
+def _convertir_valores(queryset, ordenamiento, valores):
+    """Convierte los valores del cursor (JSON) a los tipos de cada campo"""
+    if len(valores) != len(ordenamiento):
+        raise CursorInvalido(valores)
+    convertidos = []
+    for campo, valor in zip(ordenamiento, valores):
+        nombre = campo.lstrip('-')
+        try:
+            field = queryset.model._meta.get_field(nombre)
+        except FieldDoesNotExist:
+            # Anotaciones (ej. relevancia) no son campos del modelo
+            convertidos.append(valor)
+            continue
+        try:
+            convertidos.append(field.to_python(valor))
+        except ValidationError:
+            raise CursorInvalido(valor)
+    return convertidos
+
+
+class KeysetPage:
+    """Página de resultados con cursores hacia adelante y hacia atrás"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def paginar_keyset(queryset, ordenamiento, cursor=None, por_pagina=12):
+    """
+    Devuelve una `KeysetPage` del queryset según `ordenamiento`.
+    Un cursor inválido se trata como la primera página.
+    """
+    valores, direccion = None, 'n'
+    if cursor:
+        try:
+            valores, direccion = _decodificar_cursor(cursor)
+            valores = _convertir_valores(queryset, ordenamiento, valores)
+        except CursorInvalido:
+            valores, direccion = None, 'n'
+
+    hacia_atras = valores is not None and direccion == 'p'
+    orden_consulta = [_invertir(c) for c in ordenamiento] if hacia_atras else list(ordenamiento)
+
+    qs = queryset.order_by(*orden_consulta)
+    if valores is not None:
+        qs = qs.filter(_filtro_despues_de(orden_consulta, valores))
+
+    filas = list(qs[:por_pagina + 1])
+    hay_mas = len(filas) > por_pagina
+    filas = filas[:por_pagina]
+    if hacia_atras:
+        filas.reverse()
+
+    next_cursor = previous_cursor = None
+    if filas:
+        primera = _valores_de(filas[0], ordenamiento)
+        ultima = _valores_de(filas[-1], ordenamiento)
+        if hacia_atras:
+            previous_cursor = _codificar_cursor(primera, 'p') if hay_mas else None
+            next_cursor = _codificar_cursor(ultima, 'n')
+        else:
+            next_cursor = _codificar_cursor(ultima, 'n') if hay_mas else None
+            previous_cursor = _codificar_cursor(primera, 'p') if valores is not None else None
+
+    return KeysetPage(filas, next_cursor, previous_cursor)
+
+
+class ProductoCursorPagination(CursorPagination):
+    """Paginación acotada por cursor para /api/productos/"""
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+
+class ConteoEstimadoPaginator(Paginator):
+    """
+    Paginator para changelists del admin sobre tablas grandes.
+
+    Sin filtros, en PostgreSQL usa la estimación del planner
+    (``pg_class.reltuples``) en lugar de un ``COUNT(*)`` exacto cuando la
+    tabla supera `UMBRAL_ESTIMADO` filas. Con filtros, o por debajo del
+    umbral, cuenta normalmente.
+
+    La estimación puede pasarse o quedarse corta: si la página pedida sale
+    vacía o fuera de rango, se cuenta exacto y se sirve la página pedida o
+    la última que existe, en lugar de un error.
+    """
+    UMBRAL_ESTIMADO = 10000
+    estimado = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            conexion = connections[queryset.db]
+            if conexion.vendor == 'postgresql':
+                with conexion.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                        [queryset.model._meta.db_table],
+                    )
+                    fila = cursor.fetchone()
+                if fila and fila[0] >= self.UMBRAL_ESTIMADO:
+                    self.estimado = True
+                    return fila[0]
+        return super().count
+
+    def _contar_exacto(self):
+        self.estimado = False
+        self.__dict__['count'] = super().count
+        self.__dict__.pop('num_pages', None)
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # Estimación corta: después de su última página puede haber filas
+            if not self.estimado or int(number) < 1:
+                raise
+            self._contar_exacto()
+            return super().validate_number(min(int(number), self.num_pages))
+
+    def page(self, number):
+        pagina = super().page(number)
+        # Estimación pasada: las últimas páginas quedan vacías
+        if self.estimado and not pagina.object_list:
+            self._contar_exacto()
+            pagina = super().page(min(pagina.number, self.num_pages))
+        return pagina
@@ -0,0 +1,139 @@
+"""
+Búsqueda de texto completo sobre el catálogo de productos.
+
+En PostgreSQL se usa la columna generada ``search_vector`` (tsvector con
+índice GIN) y en SQLite la tabla virtual FTS5 ``tienda_producto_fts``, ambas
+creadas por la migración 0011 y mantenidas por la propia base de datos.
+Para cualquier otro motor se vuelve a los ``icontains`` de siempre.
+
+En los dos motores cada palabra buscada es un prefijo y todas deben
+aparecer ("caña carb" encuentra "Caña de carbono").
+
+En SQLite el índice lo mantienen triggers, y cada migración que agrega o
+quita una columna reconstruye ``tienda_producto`` y los borra.
+`asegurar_triggers_fts()` los vuelve a crear; corre después de cada
+``migrate`` (ver apps.py).
+"""
+import logging
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'spanish'
+FTS_TABLE = 'tienda_producto_fts'
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+SQLITE_TRIGGERS = {
+    'tienda_producto_fts_ai': f"""
+        CREATE TRIGGER tienda_producto_fts_ai AFTER INSERT ON tienda_producto BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, title, marca, description)
+            VALUES (new.id, new.title, new.marca, new.description);
+        END
+    """,
+    'tienda_producto_fts_ad': f"""
+        CREATE TRIGGER tienda_producto_fts_ad AFTER DELETE ON tienda_producto BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, marca, description)
+            VALUES ('delete', old.id, old.title, old.marca, old.description);
+        END
+    """,
+    'tienda_producto_fts_au': f"""
+        CREATE TRIGGER tienda_producto_fts_au AFTER UPDATE ON tienda_producto BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, marca, description)
+            VALUES ('delete', old.id, old.title, old.marca, old.description);
+            INSERT INTO {FTS_TABLE}(rowid, title, marca, description)
+            VALUES (new.id, new.title, new.marca, new.description);
+        END
+    """,
+}
+
+
+def asegurar_triggers_fts(conexion=connection):
+    """
+    Crea los triggers FTS5 que falten y, si faltaba alguno, reconstruye el
+    índice (pudo quedar desactualizado mientras no estaban). Devuelve los
+    nombres de los triggers creados.
+    """
+    if conexion.vendor != 'sqlite':
+        return []
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            "SELECT type, name FROM sqlite_master WHERE name = %s OR (type = 'trigger' AND tbl_name = 'tienda_producto')",
+            [FTS_TABLE],
+        )
+        existentes = {name for _, name in cursor.fetchall()}
+        if FTS_TABLE not in existentes:
+            return []  # migración 0011 sin aplicar (o revertida)
+        faltantes = [nombre for nombre in SQLITE_TRIGGERS if nombre not in existentes]
+        for nombre in faltantes:
+            cursor.execute(SQLITE_TRIGGERS[nombre])
+        if faltantes:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            logger.info(f"Triggers FTS recreados: {', '.join(faltantes)}")
+    return faltantes
+
+
+def _tsquery_prefijos(query):
+    """Texto del usuario a tsquery: cada palabra como prefijo, con AND"""
+    return ' & '.join(f'{token}:*' for token in _TOKEN_RE.findall(query))
+
+
+def _buscar_postgres(queryset, query):
+    prefijos = _tsquery_prefijos(query)
+    if not prefijos:
+        return queryset.none()
+    # Los tokens son solo \w+: no pueden inyectar operadores de tsquery
+    tsquery = f"to_tsquery('{SEARCH_CONFIG}', %s)"
+    return queryset.annotate(
+        coincide=RawSQL(f"tienda_producto.search_vector @@ {tsquery}", (prefijos,), output_field=BooleanField()),
+        # ts_rank_cd es float4: como float8 el valor que guarda el cursor (un
+        # double en JSON) vuelve idéntico y las comparaciones del keyset empatan
+        relevancia=RawSQL(
+            f"ts_rank_cd(tienda_producto.search_vector, {tsquery})::float8", (prefijos,), output_field=FloatField()
+        ),
+    ).filter(coincide=True)
+
+
+def _fts5_match(query):
+    """Convierte el texto del usuario en una expresión MATCH segura (prefijos con AND)"""
+    tokens = _TOKEN_RE.findall(query)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _buscar_sqlite(queryset, query):
+    match = _fts5_match(query)
+    if not match:
+        return queryset.none()
+    return queryset.annotate(
+        # bm25() devuelve valores negativos: más chico = más relevante
+        relevancia=RawSQL(
+            f"SELECT -bm25({FTS_TABLE}, 10.0, 5.0, 1.0) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = tienda_producto.id",
+            (match,),
+            output_field=FloatField(),
+        ),
+    ).filter(id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,)))
+
+
+def _buscar_icontains(queryset, query):
+    return queryset.filter(
+        Q(title__icontains=query) |
+        Q(description__icontains=query) |
+        Q(marca__icontains=query)
+    ).annotate(relevancia=Value(0.0, output_field=FloatField()))
+
+
+def buscar_productos(queryset, query):
+    """
+    Filtra el queryset por el texto buscado y anota ``relevancia``
+    para poder ordenar por ranking (``orden=relevancia``).
+    """
+    if connection.vendor == 'postgresql':
+        return _buscar_postgres(queryset, query)
+    if connection.vendor == 'sqlite':
+        return _buscar_sqlite(queryset, query)
+    return _buscar_icontains(queryset, query)
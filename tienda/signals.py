@@ -1,7 +1,8 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Carrito
+from .models import Carrito, Producto
+from .facets import invalidar_facetas
 
 
 @receiver(post_save, sender=User)
@@ -13,4 +14,40 @@ def crear_carrito_usuario(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def guardar_carrito_usuario(sender, instance, **kwargs):
     if not hasattr(instance, 'carrito'):
-        Carrito.objects.create(user=instance)
\ No newline at end of file
+        Carrito.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_facetas_producto(sender, instance, **kwargs):
+    invalidar_facetas()
+
+
+@receiver(pre_save, sender=Producto)
+def recordar_cambio_de_precio(sender, instance, update_fields=None, **kwargs):
+    # Contra el precio leído de la base (ver Producto.from_db)
+    instance._precio_cambiado = (
+        (update_fields is None or 'price' in update_fields) and instance.cambiaron('price')
+    )
+
+
+@receiver(post_save, sender=Producto)
+def actualizar_totales_carritos(sender, instance, created, **kwargs):
+    """Un cambio de precio modifica el total de los carritos que tienen el producto"""
+    if created or not getattr(instance, '_precio_cambiado', True):
+        return
+    Carrito.recalcular_totales(Carrito.objects.filter(items__producto=instance))
+
+
+@receiver(pre_delete, sender=Producto)
+def recordar_carritos_producto(sender, instance, **kwargs):
+    instance._carritos_afectados = list(
+        Carrito.objects.filter(items__producto=instance).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Producto)
+def actualizar_totales_al_eliminar(sender, instance, **kwargs):
+    carritos = getattr(instance, '_carritos_afectados', None)
+    if carritos:
+        Carrito.recalcular_totales(Carrito.objects.filter(pk__in=carritos))
@@ -0,0 +1,506 @@
+"""
+Búsqueda de productos y página del tiempo.
+
+El tiempo se prueba contra proveedores simulados con http.server local: el
+stub atiende /clima, /mareas y /luna con una demora configurable y puede
+responder 500 para simular un proveedor caído.
+"""
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.paginator import EmptyPage
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ecommerce import cliente_http
+
+from . import notificaciones, tiempo
+from .categorias import clasificar
+from .models import Carrito, CarritoItem, Notificacion, Pedido, PedidoItem, Producto
+from .pagination import ORDENES_KEYSET, ConteoEstimadoPaginator, paginar_keyset
+from .search import asegurar_triggers_fts, buscar_productos
+from .views import _crear_pedido
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Triggers FTS5 de SQLite')
+class BusquedaSQLiteTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user('vendedor')
+        self.producto = Producto.objects.create(
+            seller=seller, title='Caña de carbono telescópica', marca='Shimano', price=10, stock=3,
+        )
+
+    def _titulos(self, query):
+        return [p.title for p in buscar_productos(Producto.objects.all(), query)]
+
+    def test_prefijos_con_and(self):
+        self.assertEqual(self._titulos('caña carb'), ['Caña de carbono telescópica'])
+        self.assertEqual(self._titulos('caña reel'), [])
+
+    def test_triggers_borrados_se_recrean(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER tienda_producto_fts_au')
+        # Sin el trigger, el índice queda con el título viejo
+        Producto.objects.filter(pk=self.producto.pk).update(title='Reel frontal')
+        self.assertEqual(self._titulos('reel'), [])
+
+        self.assertEqual(asegurar_triggers_fts(), ['tienda_producto_fts_au'])
+
+        self.assertEqual(self._titulos('reel fron'), ['Reel frontal'])
+        Producto.objects.filter(pk=self.producto.pk).update(title='Anzuelo')
+        self.assertEqual(self._titulos('anzu'), ['Anzuelo'])
+        self.assertEqual(asegurar_triggers_fts(), [])
+
+
+class PaginacionRelevanciaTests(TestCase):
+    """El cursor guarda la relevancia: tiene que volver idéntica para no repetir ni saltear filas"""
+
+    def test_paginar_por_relevancia_con_empates(self):
+        seller = User.objects.create_user('vendedor')
+        for titulo in ['Caña corta', 'Caña corta', 'Caña corta', 'Caña caña caña', 'Caña de mar', 'Caña de mar']:
+            Producto.objects.create(seller=seller, title=titulo, price=10, stock=3)
+        resultados = buscar_productos(Producto.objects.all(), 'caña')
+        esperado = list(resultados.order_by('-relevancia', '-id').values_list('id', flat=True))
+
+        vistos, cursor = [], None
+        while True:
+            pagina = paginar_keyset(resultados, ORDENES_KEYSET['relevancia'], cursor, por_pagina=2)
+            vistos += [p.id for p in pagina]
+            if not pagina.has_next():
+                break
+            cursor = pagina.next_cursor
+
+        self.assertEqual(vistos, esperado)
+        self.assertEqual(len(esperado), 6)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FacetasCatalogoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seller = User.objects.create_user('vendedor')
+        for titulo, marca, precio in [('Reel frontal', 'Shimano', 500), ('Reel rotativo', 'Shimano', 8000),
+                                      ('Caña telescópica', 'Daiwa', 3000)]:
+            Producto.objects.create(seller=seller, title=titulo, marca=marca, price=precio, stock=2)
+
+    def test_filtros_con_conteos_y_total(self):
+        respuesta = self.client.get(reverse('tienda:index'))
+
+        self.assertContains(respuesta, 'href="?marca=Shimano"')
+        self.assertContains(respuesta, 'Shimano (2)')
+        self.assertContains(respuesta, 'Reels (2)')
+        self.assertContains(respuesta, 'href="?precio_min=1000&amp;precio_max=5000"')
+        self.assertContains(respuesta, '3 productos en total')
+        self.assertNotContains(respuesta, 'Quitar filtros')
+
+    def test_filtro_activo_mantiene_los_demas(self):
+        respuesta = self.client.get(reverse('tienda:index'), {'marca': 'Shimano', 'precio_max': '1000'})
+
+        self.assertContains(respuesta, '1 productos en total')
+        self.assertContains(respuesta, 'href="?marca=Shimano&amp;precio_max=1000&amp;categoria=reels"')
+        self.assertContains(respuesta, 'Quitar filtros')
+
+
+class TotalesCarritoTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user('vendedor')
+        self.producto = Producto.objects.create(seller=seller, title='Reel', price=10, stock=3)
+        self.carrito = User.objects.create_user('cliente').carrito
+        CarritoItem.objects.create(carrito=self.carrito, producto=self.producto, cantidad=2)
+        Carrito.recalcular_totales(Carrito.objects.filter(pk=self.carrito.pk))
+        self.producto = Producto.objects.get(pk=self.producto.pk)
+
+    def _recalculos(self, **kwargs):
+        with CaptureQueriesContext(connection) as consultas:
+            self.producto.save(**kwargs)
+        return sum(q['sql'].startswith('UPDATE "tienda_carrito"') for q in consultas.captured_queries)
+
+    def test_sin_cambio_de_precio_no_recalcula(self):
+        self.producto.stock = 5
+        self.assertEqual(self._recalculos(), 0)
+        self.producto.price = 10
+        self.assertEqual(self._recalculos(update_fields=['price']), 0)
+
+    def test_cambio_de_precio_recalcula(self):
+        self.producto.price = 12
+        self.assertEqual(self._recalculos(), 1)
+        self.carrito.refresh_from_db()
+        self.assertEqual(self.carrito.total, 24)
+        # Ya guardado: el mismo precio no vuelve a recalcular
+        self.assertEqual(self._recalculos(), 0)
+
+
+class PedidoStockTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user('vendedor')
+        self.cliente = User.objects.create_user('cliente')
+        self.reel = Producto.objects.create(seller=seller, title='Reel', price=100, stock=5)
+        self.cana = Producto.objects.create(seller=seller, title='Caña', price=250, stock=3)
+        self.carrito = self.cliente.carrito
+        self.carrito.add_item(self.reel, 2)
+        self.carrito.add_item(self.cana, 3)
+
+    def _crear(self):
+        with transaction.atomic():
+            return _crear_pedido(self.carrito, self.cliente, 'Calle 1', '', '')
+
+    def _stock(self, producto):
+        return Producto.objects.values_list('stock', flat=True).get(pk=producto.pk)
+
+    def test_descuenta_cada_item_del_carrito(self):
+        pedido = self._crear()
+
+        self.assertEqual((self._stock(self.reel), self._stock(self.cana)), (3, 0))
+        self.assertEqual(pedido.total, 2 * 100 + 3 * 250)
+        self.assertEqual(
+            sorted(pedido.items.values_list('producto_id', 'cantidad', 'precio_unitario')),
+            [(self.reel.pk, 2, 100), (self.cana.pk, 3, 250)],
+        )
+
+    def test_stock_insuficiente_revierte_todo(self):
+        # Otro checkout se llevó la caña después de armar el carrito; el reel
+        # (id menor) ya se descontó cuando falla la caña
+        Producto.objects.filter(pk=self.cana.pk).update(stock=2)
+
+        with self.assertRaisesMessage(ValueError, 'Stock insuficiente para Caña'):
+            self._crear()
+
+        self.assertEqual((self._stock(self.reel), self._stock(self.cana)), (5, 2))
+        self.assertFalse(Pedido.objects.exists())
+        self.assertFalse(PedidoItem.objects.exists())
+
+    def test_checkout_sin_stock_vuelve_al_carrito(self):
+        Producto.objects.filter(pk=self.cana.pk).update(stock=0)
+        self.client.force_login(self.cliente)
+
+        respuesta = self.client.post(reverse('tienda:checkout'), {'direccion_envio': 'Calle 1'})
+
+        self.assertRedirects(respuesta, reverse('tienda:ver_carrito'), fetch_redirect_response=False)
+        self.assertEqual(self._stock(self.reel), 5)
+        self.assertFalse(Pedido.objects.exists())
+        self.assertEqual(self.carrito.items.count(), 2)
+
+
+class NotificacionesCheckoutTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user('vendedor')
+        self.cliente = User.objects.create_user('cliente', email='cliente@example.com')
+        self.producto = Producto.objects.create(seller=seller, title='Reel', price=100, stock=5)
+        self.cliente.carrito.add_item(self.producto, 1)
+        self.client.force_login(self.cliente)
+
+    def _checkout(self):
+        return self.client.post(reverse('tienda:checkout'), {'direccion_envio': 'Calle 1'})
+
+    def test_checkout_encola_sin_enviar(self):
+        with mock.patch('tienda.views.enviar_email_pedido') as enviar:
+            self._checkout()
+
+        enviar.assert_not_called()
+        pedido = Pedido.objects.get()
+        notificacion = Notificacion.objects.get()
+        self.assertEqual(
+            (notificacion.canal, notificacion.tipo, notificacion.objeto_id, notificacion.estado),
+            ('email', 'pedido', pedido.pk, 'pendiente'),
+        )
+
+    def test_notificacion_en_la_misma_transaccion_que_el_pedido(self):
+        def encolar_y_fallar(*args, **kwargs):
+            notificaciones.encolar_pedido(*args, **kwargs)
+            raise RuntimeError('falla después de encolar')
+
+        with mock.patch('tienda.views.encolar_pedido', side_effect=encolar_y_fallar):
+            self._checkout()
+
+        self.assertFalse(Pedido.objects.exists())
+        self.assertFalse(Notificacion.objects.exists())
+        self.assertEqual(Producto.objects.get().stock, 5)
+
+
+class DespachoNotificacionesTests(TransactionTestCase):
+    """`despachar` envía desde un pool de hilos, cada uno con su conexión"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('cliente', email='cliente@example.com')
+        self.notificacion = Notificacion.objects.create(user=self.user, canal='email', tipo='pedido', objeto_id=1)
+
+    def _despachar(self, enviar):
+        with mock.patch.dict(notificaciones.ENVIOS, {'pedido': enviar}):
+            return notificaciones.despachar(concurrencia=1)
+
+    def _vencer(self):
+        Notificacion.objects.update(proximo_intento=timezone.now())
+
+    def test_envio_fallido_se_reintenta_con_backoff(self):
+        falla = mock.Mock(side_effect=ConnectionError('SMTP caído'))
+
+        self.assertEqual(self._despachar(falla), (0, 1))
+        self.notificacion.refresh_from_db()
+        self.assertEqual((self.notificacion.estado, self.notificacion.intentos), ('pendiente', 1))
+        self.assertIn('SMTP caído', self.notificacion.ultimo_error)
+        espera = self.notificacion.proximo_intento - timezone.now()
+        self.assertAlmostEqual(espera.total_seconds(), notificaciones.BACKOFF_BASE.total_seconds(), delta=5)
+        # Antes de que venza el backoff no se vuelve a tomar
+        self.assertEqual(self._despachar(falla), (0, 0))
+
+        self._vencer()
+        self._despachar(falla)
+        self.notificacion.refresh_from_db()
+        espera = self.notificacion.proximo_intento - timezone.now()
+        self.assertAlmostEqual(espera.total_seconds(), 2 * notificaciones.BACKOFF_BASE.total_seconds(), delta=5)
+
+        self._vencer()
+        self.assertEqual(self._despachar(mock.Mock(return_value=True)), (1, 0))
+        self.notificacion.refresh_from_db()
+        self.assertEqual((self.notificacion.estado, self.notificacion.intentos), ('enviada', 3))
+
+    def test_fallida_tras_max_intentos(self):
+        Notificacion.objects.update(intentos=notificaciones.MAX_INTENTOS - 1)
+
+        with self.assertLogs('tienda.notificaciones', 'ERROR'):
+            self.assertEqual(self._despachar(mock.Mock(return_value=False)), (0, 1))
+
+        self.notificacion.refresh_from_db()
+        self.assertEqual((self.notificacion.estado, self.notificacion.intentos), ('fallida', notificaciones.MAX_INTENTOS))
+        self._vencer()
+        self.assertEqual(notificaciones.tomar_lote(10), [])
+
+
+class CategoriaTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user('vendedor')
+        Producto.objects.create(seller=seller, title='Reel frontal', price=10, stock=3)
+        self.producto = Producto.objects.get()
+
+    def test_clasifica_solo_si_se_guarda_un_titulo_nuevo(self):
+        with mock.patch('tienda.models.clasificar', wraps=clasificar) as clasificado:
+            self.producto.stock = 2
+            self.producto.save()
+            self.producto.title = 'Caña telescópica'
+            self.producto.save(update_fields=['stock'])
+            self.assertEqual(clasificado.call_count, 0)
+
+            self.producto.save(update_fields=['title'])
+            self.assertEqual(clasificado.call_count, 1)
+        self.assertEqual(Producto.objects.get().categoria, 'canas')
+
+
+class ConteoEstimadoTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user('vendedor')
+        Producto.objects.bulk_create(
+            Producto(seller=seller, title=f'Anzuelo {i}', price=1, stock=1) for i in range(25)
+        )
+
+    def _paginator(self, estimacion):
+        paginator = ConteoEstimadoPaginator(Producto.objects.order_by('id'), 10)
+        # Lo que devolvería reltuples en PostgreSQL
+        paginator.__dict__['count'] = estimacion
+        paginator.estimado = True
+        return paginator
+
+    def test_estimacion_pasada_sirve_la_ultima_pagina_real(self):
+        paginator = self._paginator(60)
+
+        pagina = paginator.page(5)
+
+        self.assertEqual((paginator.count, paginator.num_pages), (25, 3))
+        self.assertEqual((pagina.number, len(pagina.object_list)), (3, 5))
+
+    def test_estimacion_corta_llega_a_las_ultimas_filas(self):
+        paginator = self._paginator(12)
+
+        pagina = paginator.page(3)
+
+        self.assertEqual(paginator.count, 25)
+        self.assertEqual(len(pagina.object_list), 5)
+        with self.assertRaises(EmptyPage):
+            paginator.page(0)
+
+
+LUGAR = tiempo.COASTS_RIVERS[0]
+
+RESPUESTAS = {
+    '/clima': {
+        'wind': {'speed': 4.2, 'deg': 90},
+        'weather': [{'description': 'cielo claro'}],
+        'main': {'temp': 18.5},
+    },
+    '/mareas': {
+        'heights': [{'dt': 1700000000, 'date': '2023-11-14T22:13+0000', 'height': 0.41}],
+        'extremes': [{'dt': 1700010000, 'date': '2023-11-15T01:00+0000', 'height': 0.8, 'type': 'High'}],
+    },
+    '/luna': {'moon_phase': 'FULL_MOON'},
+}
+
+
+class StubProveedores(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, demora=0.0):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.demora = demora
+        self.caidos = set()  # rutas que responden 500
+        self.pedidos = []
+        self.lock = threading.Lock()
+
+    def url(self, ruta):
+        return f'http://127.0.0.1:{self.server_address[1]}{ruta}'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        ruta = self.path.split('?', 1)[0]
+        with self.server.lock:
+            self.server.pedidos.append(ruta)
+        time.sleep(self.server.demora)
+        if ruta in self.server.caidos or ruta not in RESPUESTAS:
+            status, cuerpo = 500, {'error': 'caído'}
+        else:
+            status, cuerpo = 200, RESPUESTAS[ruta]
+        datos = json.dumps(cuerpo).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TiempoTests(SimpleTestCase):
+    demora = 0.0
+
+    def setUp(self):
+        self.stub = StubProveedores(self.demora)
+        threading.Thread(target=self.stub.serve_forever, daemon=True).start()
+        for nombre, ruta in (('OPENWEATHER_URL', '/clima'), ('WORLD_TIDES_URL', '/mareas'), ('MOON_URL', '/luna')):
+            parche = mock.patch.object(tiempo, nombre, self.stub.url(ruta))
+            parche.start()
+            self.addCleanup(parche.stop)
+        parche = mock.patch.object(tiempo, 'WORLD_TIDES_API_KEY', 'clave')
+        parche.start()
+        self.addCleanup(parche.stop)
+        # Circuitos y sesiones limpios entre tests
+        cliente_http._proveedores.clear()
+        cache.clear()
+
+    def tearDown(self):
+        self.stub.shutdown()
+        self.stub.server_close()
+
+    def _envejecer(self, segundos):
+        clave = tiempo._cache_key(LUGAR)
+        entrada = cache.get(clave)
+        entrada['generado'] -= segundos
+        cache.set(clave, entrada, tiempo.MAX_ANTIGUEDAD)
+
+    def _esperar_refresco(self, pedidos, limite=5):
+        fin = time.monotonic() + limite
+        clave_lock = f'{tiempo._cache_key(LUGAR)}:refrescando'
+        while time.monotonic() < fin:
+            if len(self.stub.pedidos) >= pedidos and cache.get(clave_lock) is None:
+                return
+            time.sleep(0.02)
+        self.fail('El refresco en segundo plano no terminó')
+
+    def test_consulta_los_datos_de_las_tres_fuentes(self):
+        data, _ = tiempo.obtener(LUGAR)
+
+        self.assertIsNone(data['error'])
+        self.assertEqual(data['temperatura'], 18.5)
+        self.assertEqual(data['luna'], tiempo.FASES_LUNARES['FULL_MOON'])
+        self.assertEqual(len(data['mareas']), 1)
+        self.assertEqual(sorted(self.stub.pedidos), ['/clima', '/luna', '/mareas'])
+
+    def test_fresco_sale_de_cache(self):
+        tiempo.obtener(LUGAR)
+        _, actualizado = tiempo.obtener(LUGAR)
+
+        self.assertEqual(len(self.stub.pedidos), 3)
+        self.assertLess(abs(time.time() - actualizado.timestamp()), 5)
+
+    def test_vencido_se_sirve_y_se_refresca_en_segundo_plano(self):
+        tiempo.obtener(LUGAR)
+        self._envejecer(tiempo.FRESCO + 1)
+        clima_nuevo = dict(RESPUESTAS['/clima'], main={'temp': 25.0})
+
+        with mock.patch.dict(RESPUESTAS, {'/clima': clima_nuevo}):
+            data, actualizado = tiempo.obtener(LUGAR)
+            # El request no espera al refresco: devuelve lo que había
+            self.assertEqual(data['temperatura'], 18.5)
+            self.assertLess(actualizado.timestamp(), time.time() - tiempo.FRESCO)
+            self._esperar_refresco(pedidos=6)
+
+        data, actualizado = tiempo.obtener(LUGAR)
+        self.assertEqual(data['temperatura'], 25.0)
+        self.assertLess(abs(time.time() - actualizado.timestamp()), 5)
+        self.assertEqual(len(self.stub.pedidos), 6)
+
+    def test_un_refresco_por_lugar_a_la_vez(self):
+        tiempo.obtener(LUGAR)
+        self._envejecer(tiempo.FRESCO + 1)
+        self.stub.demora = 0.3
+
+        for _ in range(5):
+            tiempo.obtener(LUGAR)
+        self._esperar_refresco(pedidos=6)
+
+        self.assertEqual(len(self.stub.pedidos), 6)
+
+    def test_error_no_pisa_datos_buenos(self):
+        tiempo.obtener(LUGAR)
+        self.stub.caidos.add('/clima')
+
+        entrada = tiempo.refrescar(LUGAR)
+
+        self.assertIsNone(entrada['data']['error'])
+        self.assertEqual(entrada['data']['temperatura'], 18.5)
+        self.assertIsNone(cache.get(tiempo._cache_key(LUGAR))['data']['error'])
+
+    def test_error_sin_datos_previos_se_reintenta_pronto(self):
+        self.stub.caidos.add('/clima')
+
+        data, _ = tiempo.obtener(LUGAR)
+
+        self.assertIn('500', data['error'])
+        self.assertEqual(data['luna'], tiempo.FASES_LUNARES['FULL_MOON'])
+        entrada = cache.get(tiempo._cache_key(LUGAR))
+        self.assertEqual(entrada['fresco'], tiempo.FRESCO_CON_ERROR)
+
+    def test_mareas_caidas_usan_la_prediccion_local(self):
+        self.stub.caidos.add('/mareas')
+        prediccion = {'mareas': [{'dt': 1, 'date': 'x', 'height': 0.1}], 'extremos': []}
+
+        with mock.patch.object(tiempo.mareas, 'predecir', return_value=prediccion) as predecir:
+            data, _ = tiempo.obtener(LUGAR)
+
+        predecir.assert_called_once()
+        self.assertEqual(data['mareas'], prediccion['mareas'])
+
+
+class TiempoConcurrenciaTests(TiempoTests):
+    """Las mismas pruebas con proveedores lentos, más la de concurrencia"""
+
+    demora = 0.5
+
+    def test_fuentes_en_paralelo(self):
+        inicio = time.monotonic()
+        data, _ = tiempo.obtener(LUGAR)
+        transcurrido = time.monotonic() - inicio
+
+        self.assertIsNone(data['error'])
+        # La latencia es la del proveedor más lento, no la suma (1.5s)
+        self.assertGreaterEqual(transcurrido, self.demora)
+        self.assertLess(transcurrido, self.demora * 2)
@@ -0,0 +1,214 @@
+"""
+Datos de tiempo, mareas y luna para la página /tiempo/.
+
+Las mareas salen de WorldTides si hay API key; si no hay o falla, de la
+predicción armónica local (tienda/mareas.py) para los lugares calibrados.
+Las fuentes (OpenWeather, mareas, ipgeolocation) se consultan en paralelo
+y el resultado se guarda en cache por lugar:
+
+- fresco (`FRESCO`): se sirve tal cual;
+- vencido pero dentro de `MAX_ANTIGUEDAD`: se sirve igual y se refresca en
+  segundo plano (stale-while-revalidate, un solo refresco por lugar);
+- sin datos: se consulta en el request.
+
+``manage.py actualizar_tiempo`` refresca todos los lugares de
+`COASTS_RIVERS` antes de que venzan, así la página casi siempre sale de
+cache; necesita una cache compartida con la web (CACHE_URL), con la cache
+en memoria por defecto cada proceso tiene la suya. Las URLs base se pueden
+apuntar a servidores locales por entorno.
+
+Las llamadas pasan por `ecommerce.cliente_http`: si un proveedor está
+caído su circuito se abre y se falla en el acto en lugar de esperar el
+timeout en cada refresco.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.core.cache import cache
+
+from ecommerce import cliente_http
+
+from . import mareas
+
+logger = logging.getLogger(__name__)
+
+# APIs desde variables de entorno
+OPENWEATHER_API_KEY = os.getenv('OPENWEATHER_API_KEY')
+WORLD_TIDES_API_KEY = os.getenv('WORLD_TIDES_API_KEY')
+MOON_API_KEY = os.getenv('MOON_API_KEY')
+OPENWEATHER_URL = os.getenv('OPENWEATHER_URL', 'https://api.openweathermap.org/data/2.5/weather')
+WORLD_TIDES_URL = os.getenv('WORLD_TIDES_URL', 'https://www.worldtides.info/api/v3')
+MOON_URL = os.getenv('MOON_URL', 'https://api.ipgeolocation.io/astronomy')
+
+# Lista de costas y ríos argentinos
+COASTS_RIVERS = [
+    {"name": "Mar del Plata", "lat": -38.005, "lon": -57.5426},
+    {"name": "Puerto Madryn", "lat": -42.7699, "lon": -65.0382},
+    {"name": "Villa Gesell", "lat": -37.264, "lon": -56.970},
+    {"name": "Mar de Ajó", "lat": -36.460, "lon": -56.735},
+    {"name": "San Bernardo", "lat": -36.630, "lon": -56.722},
+    {"name": "Río Paraná - Rosario", "lat": -32.9468, "lon": -60.6393},
+    {"name": "Río Uruguay - Colón", "lat": -32.203, "lon": -58.170},
+    {"name": "Río de la Plata - Buenos Aires", "lat": -34.6037, "lon": -58.3816},
+]
+
+FASES_LUNARES = {
+    "NEW_MOON": "Luna Nueva 🌑",
+    "WAXING_CRESCENT": "Luna Creciente 🌒",
+    "FIRST_QUARTER": "Cuarto Creciente 🌓",
+    "WAXING_GIBBOUS": "Gibosa Creciente 🌔",
+    "FULL_MOON": "Luna Llena 🌕",
+    "WANING_GIBBOUS": "Gibosa Menguante 🌖",
+    "LAST_QUARTER": "Cuarto Menguante 🌗",
+    "WANING_CRESCENT": "Luna Menguante 🌘",
+}
+
+FRESCO = 60 * 10
+MAX_ANTIGUEDAD = 60 * 60 * 6
+# Un resultado con error (sin datos previos) se reintenta pronto
+FRESCO_CON_ERROR = 60
+TIMEOUT_CLIMA, TIMEOUT_MAREAS, TIMEOUT_LUNA = 5, 10, 5
+
+_executor = ThreadPoolExecutor(max_workers=12, thread_name_prefix='tiempo')
+
+
+def _cache_key(lugar):
+    return f"tiempo:{lugar['lat']},{lugar['lon']}"
+
+
+def _clima(lugar):
+    resp = cliente_http.get(OPENWEATHER_URL, proveedor='openweather', params={
+        'lat': lugar['lat'], 'lon': lugar['lon'], 'units': 'metric', 'lang': 'es', 'appid': OPENWEATHER_API_KEY,
+    }, timeout=(cliente_http.TIMEOUT_CONEXION, TIMEOUT_CLIMA))
+    if resp.status_code != 200:
+        return {"error": f"Error OpenWeather: {resp.status_code}"}
+    weather = resp.json()
+    return {
+        "viento": {
+            "velocidad": weather.get("wind", {}).get("speed", 0),
+            "direccion": weather.get("wind", {}).get("deg", 0),
+        },
+        "clima": weather.get("weather", [{}])[0].get("description", ""),
+        "temperatura": weather.get("main", {}).get("temp", 0),
+    }
+
+
+def _mareas(lugar):
+    start_time = time.time()
+    if WORLD_TIDES_API_KEY:
+        try:
+            resp = cliente_http.get(
+                f"{WORLD_TIDES_URL}?heights",
+                proveedor='worldtides',
+                params={'lat': lugar['lat'], 'lon': lugar['lon'], 'start': int(start_time), 'length': 86400, 'key': WORLD_TIDES_API_KEY},
+                timeout=(cliente_http.TIMEOUT_CONEXION, TIMEOUT_MAREAS),
+            )
+        except cliente_http.ErrorHTTP as e:
+            logger.warning(f"Mareas no disponibles: {e}")
+            resp = None
+        if resp is not None and resp.status_code == 200:
+            tides = resp.json()
+            return {
+                "mareas": tides.get("heights", [])[:10],  # primeras 10
+                "extremos": tides.get("extremes", [])[:10],  # picos altos/bajos
+            }
+
+    # Sin WorldTides: predicción armónica local si el lugar está calibrado
+    prediccion = mareas.predecir(lugar["name"], start_time)
+    if prediccion is not None:
+        return prediccion
+    return {"mareas": [], "extremos": []}
+
+
+def _luna(lugar):
+    resp = cliente_http.get(
+        MOON_URL, proveedor='ipgeolocation', params={'apiKey': MOON_API_KEY, 'lat': lugar['lat'], 'long': lugar['lon']},
+        timeout=(cliente_http.TIMEOUT_CONEXION, TIMEOUT_LUNA),
+    )
+    if resp.status_code != 200:
+        return {"luna": "No disponible"}
+    return {"luna": FASES_LUNARES.get(resp.json().get("moon_phase"), "No disponible")}
+
+
+def consultar(lugar):
+    """Consulta las tres fuentes en paralelo. Devuelve el dict `data` de la página."""
+    data = {
+        "mareas": [],
+        "viento": {},
+        "clima": "",
+        "temperatura": 0,
+        "luna": "No disponible",
+        "mejor_horario": "No disponible",
+        "extremos": [],
+        "error": None,
+    }
+    futuros = [_executor.submit(fuente, lugar) for fuente in (_clima, _mareas, _luna)]
+    for futuro in futuros:
+        try:
+            parcial = futuro.result()
+        except Exception as e:
+            parcial = {"error": str(e)}
+        if parcial.get("error") and data["error"]:
+            parcial = {k: v for k, v in parcial.items() if k != "error"}
+        data.update(parcial)
+
+    # 🎣 Mejor horario de pesca
+    if data["mareas"]:
+        primera_marea = data["mareas"][0].get("date", "")
+        data["mejor_horario"] = f"Cerca de {primera_marea} (aproximado)"
+    return data
+
+
+def refrescar(lugar):
+    """Consulta y guarda en cache. Con error no pisa datos previos buenos."""
+    data = consultar(lugar)
+    clave = _cache_key(lugar)
+    if data["error"]:
+        logger.warning(f"Tiempo {lugar['name']}: {data['error']}")
+        anterior = cache.get(clave)
+        if anterior and not anterior["data"]["error"]:
+            return anterior
+        entrada = {"data": data, "generado": time.time(), "fresco": FRESCO_CON_ERROR}
+    else:
+        entrada = {"data": data, "generado": time.time(), "fresco": FRESCO}
+    cache.set(clave, entrada, MAX_ANTIGUEDAD)
+    return entrada
+
+
+def _refrescar_en_segundo_plano(lugar):
+    clave_lock = f"{_cache_key(lugar)}:refrescando"
+    # cache.add es atómico: un solo refresco por lugar a la vez
+    if not cache.add(clave_lock, True, TIMEOUT_MAREAS * 2):
+        return
+
+    def tarea():
+        try:
+            refrescar(lugar)
+        except Exception:
+            logger.exception(f"Error refrescando el tiempo de {lugar['name']}")
+        finally:
+            cache.delete(clave_lock)
+
+    threading.Thread(target=tarea, name='tiempo-refresco', daemon=True).start()
+
+
+def obtener(lugar):
+    """Devuelve (data, datetime de generación) sirviendo desde cache si se puede"""
+    entrada = cache.get(_cache_key(lugar))
+    if entrada is None:
+        entrada = refrescar(lugar)
+    elif time.time() - entrada["generado"] > entrada["fresco"]:
+        _refrescar_en_segundo_plano(lugar)
+    return entrada["data"], datetime.fromtimestamp(entrada["generado"])
+
+
+def refrescar_todos():
+    """Refresca todos los lugares en paralelo. Devuelve cuántos quedaron sin error."""
+    # Pool propio: `refrescar` ya usa `_executor` para las tres fuentes
+    with ThreadPoolExecutor(max_workers=len(COASTS_RIVERS), thread_name_prefix='tiempo-lugares') as executor:
+        entradas = list(executor.map(refrescar, COASTS_RIVERS))
+    return sum(1 for entrada in entradas if not entrada["data"]["error"])
@@ -6,6 +6,7 @@ from .views import (
     ver_carrito, agregar_al_carrito, actualizar_carrito,
     eliminar_del_carrito, vaciar_carrito, carrito_count,
     checkout, mis_pedidos, pedido_detalle,
+    imagen_producto, imagen_cacheada,
     time_view
 )
 
@@ -30,5 +31,8 @@ urlpatterns = [
     path("checkout/", checkout, name="checkout"),
     path("pedidos/", mis_pedidos, name="mis_pedidos"),
     path("pedidos/<int:pedido_id>/", pedido_detalle, name="pedido_detalle"),
+    path("imagenes/producto/<int:producto_id>/<str:variante>/", imagen_producto, name="imagen_producto"),
+    path("imagenes/<str:hash_contenido>/<str:variante>/", imagen_cacheada, name="imagen_cacheada"),
+    
     path("tiempo/", time_view, name="tiempo"),
 ]
@@ -1,33 +1,39 @@
 import json
-import os
 import logging
 from datetime import datetime
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.utils.decorators import method_decorator
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 from django.contrib import messages
-from django.http import JsonResponse
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.http import FileResponse, Http404, HttpResponseRedirect, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from django.db import transaction
+from django.db.models import DecimalField, F, Sum
 from django.core.mail import EmailMessage
 from django.template.loader import render_to_string
 from django.conf import settings
 
-import requests
-from rest_framework import viewsets, permissions
+from rest_framework import viewsets, permissions, filters
 
 from .models import Producto, Carrito, CarritoItem
 from .serializers import ProductoSerializer
 from .forms import ProductoForm
-from telegram_bot.utils import enviar_pedido_telegram
+from .search import buscar_productos
+from .pagination import ORDENES_KEYSET, ProductoCursorPagination, paginar_keyset
+from .facets import obtener_facetas, invalidar_facetas
+from .carrito_cache import obtener_estado_carrito
+from .notificaciones import encolar_pedido
+from . import imagenes, tiempo
+from .tiempo import COASTS_RIVERS
 
 logger = logging.getLogger(__name__)
 
 
-def enviar_email_pedido(pedido, accion, request):
+def enviar_email_pedido(pedido, accion, site_url):
     
     try:
         # Configurar título y mensaje según la acción
@@ -61,7 +67,7 @@ def enviar_email_pedido(pedido, accion, request):
             'pedido': pedido,
             'titulo_email': config['titulo'],
             'mensaje_email': config['mensaje'],
-            'site_url': request.build_absolute_uri('/'),
+            'site_url': site_url,
         }
         
         # Renderizar template de email
@@ -92,9 +98,13 @@ def enviar_email_pedido(pedido, accion, request):
 
 
 class ProductoViewSet(viewsets.ModelViewSet):
-    queryset = Producto.objects.all()
+    queryset = Producto.objects.select_related('seller')
     serializer_class = ProductoSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = ProductoCursorPagination
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ['created_at', 'price']
+    ordering = ['-created_at', '-id']
 
 
 def admin_required(user):
@@ -169,21 +179,20 @@ def tienda_index(request):
     # Filtros de búsqueda
     search_query = request.GET.get('search', '')
     marca_filter = request.GET.get('marca', '')
+    categoria_filter = request.GET.get('categoria', '')
     precio_min = request.GET.get('precio_min', '')
     precio_max = request.GET.get('precio_max', '')
     orden = request.GET.get('orden', 'recientes')
     
     if search_query:
-        from django.db.models import Q
-        productos_list = productos_list.filter(
-            Q(title__icontains=search_query) | 
-            Q(description__icontains=search_query) |
-            Q(marca__icontains=search_query)
-        )
+        productos_list = buscar_productos(productos_list, search_query)
     
     if marca_filter:
         productos_list = productos_list.filter(marca__iexact=marca_filter)
     
+    if categoria_filter:
+        productos_list = productos_list.filter(categoria=categoria_filter)
+    
     if precio_min:
         try:
             productos_list = productos_list.filter(price__gte=float(precio_min))
@@ -196,40 +205,39 @@ def tienda_index(request):
         except ValueError:
             pass
     
-    # Ordenamiento
-    if orden == 'precio_asc':
-        productos_list = productos_list.order_by('price')
-    elif orden == 'precio_desc':
-        productos_list = productos_list.order_by('-price')
-    elif orden == 'recientes':
-        productos_list = productos_list.order_by('-created_at')
-    elif orden == 'nombre':
-        productos_list = productos_list.order_by('title')
+    # Ordenamiento (la relevancia solo existe si hay búsqueda)
+    if orden not in ORDENES_KEYSET or (orden == 'relevancia' and not search_query):
+        orden = 'recientes'
     
-    # Optimización: obtener marcas en una sola consulta
-    marcas_disponibles = Producto.objects.filter(
-        active=True, stock__gt=0
-    ).values_list('marca', flat=True).distinct().order_by('marca')
+    # Facetas cacheadas (marcas, categorías, sus conteos y rangos de precio)
+    facetas = obtener_facetas()
+    hay_filtros = any([search_query, marca_filter, categoria_filter, precio_min, precio_max])
     
-    paginator = Paginator(productos_list, 12)
-    page = request.GET.get('page')
-    
-    try:
-        productos = paginator.page(page)
-    except PageNotAnInteger:
-        productos = paginator.page(1)
-    except EmptyPage:
-        productos = paginator.page(paginator.num_pages)
+    # Paginación por cursor: sin OFFSET, costo constante en páginas profundas
+    productos = paginar_keyset(
+        productos_list, ORDENES_KEYSET[orden], request.GET.get('cursor'), por_pagina=12
+    )
     
     context = {
         'productos': productos,
         'search_query': search_query,
         'marca_filter': marca_filter,
+        'categoria_filter': categoria_filter,
         'precio_min': precio_min,
         'precio_max': precio_max,
         'orden': orden,
-        'marcas_disponibles': marcas_disponibles,
-        'total_resultados': paginator.count,
+        'marcas_disponibles': [f['marca'] for f in facetas['marcas']],
+        'facetas': facetas,
+        'rangos_precio': [
+            {**rango, 'activo': (precio_min, precio_max) == (
+                str(rango['precio_min'] or ''), str(rango['precio_max'] or '')
+            )}
+            for rango in facetas['rangos_precio']
+        ],
+        'hay_filtros': hay_filtros,
+        # Sin filtros el total sale de las facetas; con filtros es un
+        # callable para que el COUNT(*) solo corra si el template lo usa
+        'total_resultados': productos_list.count if hay_filtros else facetas['total'],
     }
     
     return render(request, "tienda/index.html", context)
@@ -318,10 +326,107 @@ def vaciar_carrito(request):
     return redirect('tienda:ver_carrito')
 
 
+def _etag_carrito(request):
+    if request.user.is_authenticated:
+        return f'"carrito-{request.user.pk}-{obtener_estado_carrito(request.user.pk)["version"]}"'
+
+
+def _modificacion_carrito(request):
+    if request.user.is_authenticated:
+        return obtener_estado_carrito(request.user.pk)['updated_at']
+
+
 @login_required
+@condition(etag_func=_etag_carrito, last_modified_func=_modificacion_carrito)
 def carrito_count(request):
-    carrito = get_or_create_carrito(request.user)
-    return JsonResponse({'count': carrito.total_items})
+    # Desde cache; si el ETag coincide, `condition` ya respondió 304
+    response = JsonResponse({'count': obtener_estado_carrito(request.user.pk)['count']})
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def imagen_producto(request, producto_id, variante):
+    """
+    Imagen de un producto que todavía no tiene variantes locales: redirige
+    al origen sin esperar y las genera en segundo plano. Las próximas
+    páginas ya renderizan la URL local.
+    """
+    if variante not in imagenes.VARIANTES:
+        raise Http404
+    producto = get_object_or_404(
+        Producto.objects.only('id', 'title', 'image', 'categoria', 'imagen_hash'), pk=producto_id
+    )
+    if producto.imagen_hash:
+        response = HttpResponseRedirect(
+            reverse('tienda:imagen_cacheada', args=[producto.imagen_hash, variante])
+        )
+    else:
+        imagenes.procesar_en_segundo_plano(producto.pk)
+        response = HttpResponseRedirect(producto.url_imagen_origen())
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def imagen_cacheada(request, hash_contenido, variante):
+    """Sirve una variante local; WebP si el navegador lo acepta"""
+    if variante not in imagenes.VARIANTES or not imagenes.PATRON_HASH.match(hash_contenido):
+        raise Http404
+    extension = imagenes.elegir_formato(request.headers.get('Accept'))
+    ruta = imagenes.ruta_variante(hash_contenido, variante, extension)
+    try:
+        archivo = open(ruta, 'rb')
+    except FileNotFoundError:
+        raise Http404
+    response = FileResponse(archivo, content_type=imagenes.FORMATOS[extension][1])
+    # El nombre incluye el hash del contenido: nunca cambia
+    patch_cache_control(response, public=True, max_age=60 * 60 * 24 * 365, immutable=True)
+    response['Vary'] = 'Accept'
+    return response
+
+
+def _crear_pedido(carrito, user, direccion_envio, telefono, notas):
+    """
+    Crea el pedido a partir del carrito descontando stock por conjuntos.
+    Debe llamarse dentro de una transacción.
+    
+    El descuento es un UPDATE condicional por producto (stock >= cantidad),
+    en orden de id para que dos checkouts concurrentes tomen los locks en el
+    mismo orden. Si alguno no alcanza, se lanza ValueError y todo se revierte.
+    """
+    from .models import Pedido, PedidoItem
+    
+    items = list(carrito.items.select_related('producto').order_by('producto_id'))
+    for item in items:
+        descontado = Producto.objects.filter(
+            pk=item.producto_id, stock__gte=item.cantidad
+        ).update(stock=F('stock') - item.cantidad)
+        if not descontado:
+            raise ValueError(f'Stock insuficiente para {item.producto.title}')
+    
+    total = carrito.items.aggregate(
+        total=Sum(F('cantidad') * F('producto__price'), output_field=DecimalField())
+    )['total']
+    pedido = Pedido.objects.create(
+        user=user,
+        total=total,
+        direccion_envio=direccion_envio,
+        telefono=telefono,
+        notas=notas,
+        estado='pendiente'
+    )
+    PedidoItem.objects.bulk_create([
+        PedidoItem(
+            pedido=pedido,
+            producto_id=item.producto_id,
+            cantidad=item.cantidad,
+            precio_unitario=item.producto.price
+        )
+        for item in items
+    ])
+    
+    # Los UPDATE directos no disparan señales de Producto
+    transaction.on_commit(invalidar_facetas)
+    return pedido
 
 
 @login_required
@@ -348,50 +453,22 @@ def checkout(request):
         
         try:
             with transaction.atomic():
-                for item in items:
-                    if item.cantidad > item.producto.stock:
-                        raise ValueError(f'Stock insuficiente para {item.producto.title}')
-                
-                from .models import Pedido, PedidoItem
-                pedido = Pedido.objects.create(
-                    user=request.user,
-                    total=carrito.total_price,
-                    direccion_envio=direccion_envio,
-                    telefono=telefono,
-                    notas=notas,
-                    estado='pendiente'
-                )
-                
-                for item in items:
-                    PedidoItem.objects.create(
-                        pedido=pedido,
-                        producto=item.producto,
-                        cantidad=item.cantidad,
-                        precio_unitario=item.producto.price
-                    )
-                    
-                    item.producto.stock -= item.cantidad
-                    item.producto.save()
+                pedido = _crear_pedido(carrito, request.user, direccion_envio, telefono, notas)
                 
                 carrito.clear()
                 
-                # Enviar notificaciones
-                email_enviado = enviar_email_pedido(pedido, 'creado', request)
-                telegram_enviado = enviar_pedido_telegram(request.user, pedido, 'creado')
+                # Las notificaciones se envían fuera del request (outbox)
+                canales = encolar_pedido(pedido, 'creado', request.build_absolute_uri('/'))
                 
                 # Mensajes de confirmación
-                if email_enviado and telegram_enviado:
-                    messages.success(request, f'¡Pedido #{pedido.id} creado exitosamente! Te hemos enviado confirmaciones por email y Telegram. 📧🤖')
-                elif email_enviado:
-                    messages.success(request, f'¡Pedido #{pedido.id} creado exitosamente! Te hemos enviado un email de confirmación. 📧')
-                    if hasattr(request.user, 'profile') and request.user.profile.telegram_chat_id:
-                        messages.info(request, 'No se pudo enviar por Telegram. Revisa tu vinculación.')
-                elif telegram_enviado:
-                    messages.success(request, f'¡Pedido #{pedido.id} creado exitosamente! Te hemos enviado confirmación por Telegram. 🤖')
-                    messages.info(request, 'No pudimos enviar el email de confirmación.')
+                if 'email' in canales and 'telegram' in canales:
+                    messages.success(request, f'¡Pedido #{pedido.id} creado exitosamente! Te enviaremos confirmaciones por email y Telegram. 📧🤖')
+                elif 'email' in canales:
+                    messages.success(request, f'¡Pedido #{pedido.id} creado exitosamente! Te enviaremos un email de confirmación. 📧')
+                elif 'telegram' in canales:
+                    messages.success(request, f'¡Pedido #{pedido.id} creado exitosamente! Te enviaremos confirmación por Telegram. 🤖')
                 else:
                     messages.success(request, f'¡Pedido #{pedido.id} creado exitosamente!')
-                    messages.info(request, 'No pudimos enviar las notificaciones, pero tu pedido está confirmado.')
                 
                 return redirect('tienda:pedido_detalle', pedido_id=pedido.id)
                 
@@ -433,107 +510,18 @@ def pedido_detalle(request, pedido_id):
     return render(request, 'tienda/pedido_detalle.html', context)
 
 
-# APIs desde variables de entorno
-OPENWEATHER_API_KEY = os.getenv('OPENWEATHER_API_KEY')
-WORLD_TIDES_API_KEY = os.getenv('WORLD_TIDES_API_KEY') 
-MOON_API_KEY = os.getenv('MOON_API_KEY')
-
-# Lista de costas y ríos argentinos
-COASTS_RIVERS = [
-    {"name": "Mar del Plata", "lat": -38.005, "lon": -57.5426},
-    {"name": "Puerto Madryn", "lat": -42.7699, "lon": -65.0382},
-    {"name": "Villa Gesell", "lat": -37.264, "lon": -56.970},
-    {"name": "Mar de Ajó", "lat": -36.460, "lon": -56.735},
-    {"name": "San Bernardo", "lat": -36.630, "lon": -56.722},
-    {"name": "Río Paraná - Rosario", "lat": -32.9468, "lon": -60.6393},
-    {"name": "Río Uruguay - Colón", "lat": -32.203, "lon": -58.170},
-    {"name": "Río de la Plata - Buenos Aires", "lat": -34.6037, "lon": -58.3816},
-]
-
 def time_view(request):
     selected = request.GET.get("lugar", "Mar del Plata")
     lugar = next((c for c in COASTS_RIVERS if c["name"] == selected), COASTS_RIVERS[0])
-    lat, lon = lugar["lat"], lugar["lon"]
-
-    data = {
-        "mareas": [],
-        "viento": {},
-        "clima": "",
-        "temperatura": 0,
-        "luna": "No disponible",
-        "mejor_horario": "No disponible",
-        "extremos": [],
-        "error": None
-    }
-
-    try:
-        # 🌦 Clima y viento
-        weather_url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&units=metric&lang=es&appid={OPENWEATHER_API_KEY}"
-        weather_resp = requests.get(weather_url, timeout=5)
-        if weather_resp.status_code == 200:
-            weather = weather_resp.json()
-            data["viento"] = {
-                "velocidad": weather.get("wind", {}).get("speed", 0),
-                "direccion": weather.get("wind", {}).get("deg", 0)
-            }
-            data["clima"] = weather.get("weather", [{}])[0].get("description", "")
-            data["temperatura"] = weather.get("main", {}).get("temp", 0)
-        else:
-            data["error"] = f"Error OpenWeather: {weather_resp.status_code}"
-
-        # 🌊 Mareas - API corregida
-        from datetime import datetime, timedelta
-        start_time = datetime.now()
-        
-        tides_url = f"https://www.worldtides.info/api/v3?heights&lat={lat}&lon={lon}&start={int(start_time.timestamp())}&length=86400&key={WORLD_TIDES_API_KEY}"
-        tides_resp = requests.get(tides_url, timeout=10)
-        if tides_resp.status_code == 200:
-            tides = tides_resp.json()
-            data["mareas"] = tides.get("heights", [])[:10]  # primeras 10
-            data["extremos"] = tides.get("extremes", [])[:10]  # picos altos/bajos
-        else:
-            # Datos simulados si falla la API
-            data["mareas"] = [
-                {"dt": int((start_time + timedelta(hours=i)).timestamp()), "height": 1.2 + (i % 4) * 0.3} 
-                for i in range(0, 24, 3)
-            ]
-            data["extremos"] = [
-                {"dt": int((start_time + timedelta(hours=6)).timestamp()), "height": 2.1, "type": "High"},
-                {"dt": int((start_time + timedelta(hours=12)).timestamp()), "height": 0.3, "type": "Low"}
-            ]
-
-        # 🌙 Fase de la luna
-        moon_url = f"https://api.ipgeolocation.io/astronomy?apiKey={MOON_API_KEY}&lat={lat}&long={lon}"
-        moon_resp = requests.get(moon_url, timeout=5)
-        if moon_resp.status_code == 200:
-            moon_data = moon_resp.json()
-            FASES_LUNARES = {
-                "NEW_MOON": "Luna Nueva 🌑",
-                "WAXING_CRESCENT": "Luna Creciente 🌒",
-                "FIRST_QUARTER": "Cuarto Creciente 🌓",
-                "WAXING_GIBBOUS": "Gibosa Creciente 🌔",
-                "FULL_MOON": "Luna Llena 🌕",
-                "WANING_GIBBOUS": "Gibosa Menguante 🌖",
-                "LAST_QUARTER": "Cuarto Menguante 🌗",
-                "WANING_CRESCENT": "Luna Menguante 🌘",
-            }
-            fase = moon_data.get("moon_phase")
-            data["luna"] = FASES_LUNARES.get(fase, "No disponible")
-        else:
-            data["luna"] = "No disponible"
 
-        # 🎣 Mejor horario de pesca
-        if data["mareas"]:
-            primera_marea = data["mareas"][0].get("date", "")
-            data["mejor_horario"] = f"Cerca de {primera_marea} (aproximado)"
-
-    except Exception as e:
-        data["error"] = str(e)
+    # Desde cache (ver tienda/tiempo.py); solo consulta las APIs si no hay datos
+    data, actualizado = tiempo.obtener(lugar)
 
     context = {
         "lugar": lugar,
         "ciudad": selected,
         "fecha": datetime.now(),
+        "actualizado": actualizado,
         "data": data,
         "coasts_rivers": COASTS_RIVERS,
         "mareas_json": json.dumps(data["mareas"]),
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:40
+
+from django.conf import settings
+from django.db import DatabaseError, migrations, transaction
+
+# Búsqueda por email en los admins (pedidos, perfiles): Django resuelve
+# `icontains` en PostgreSQL como UPPER(col::text) LIKE UPPER(%s), así que el
+# índice trigram va sobre esa misma expresión. Antes lo creaba
+# tienda/0016 con otro nombre; se reemplaza para que quede en esta app.
+INDICE = 'usuarios_user_email_trgm'
+INDICE_ANTERIOR = 'tienda_user_email_trgm'
+
+
+def crear_indice_email(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DatabaseError:
+        # Sin permisos para la extensión: la búsqueda funciona igual, sin índice
+        return
+    tabla = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDICE_ANTERIOR}')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDICE} ON {tabla} USING GIN (UPPER(email::text) gin_trgm_ops)'
+    )
+
+
+def eliminar_indice_email(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDICE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0004_profile_direccion_profile_empresa_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice_email, eliminar_indice_email),
+    ]